@@ -1,5 +1,4 @@
 from flask import Flask
-from config import Config
 from app.extensions import db, mail
 import pymysql
 import logging
@@ -10,11 +9,13 @@ import os
 pymysql.install_as_MySQLdb()
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
 
-    # 1. 加载配置
-    app.config.from_object(Config)
+    # 1. 加载配置 (测试和部分脚本传入自己的配置类，默认读取 config.py)
+    if config is None:
+        from config import Config as config
+    app.config.from_object(config)
 
     # 2. 初始化插件
     db.init_app(app)
@@ -44,10 +45,18 @@ def create_app():
     # 🔥 新增：配置日志系统
     _configure_logging(app)
 
+    # 4. 启动发件箱的发送线程 (MAIL_OUTBOX_WORKERS = 0 时不启动)
+    from app.services.email_service import start_workers
+    start_workers(app)
+
     return app
 
 
 def _configure_logging(app):
+    # 测试时不写日志文件
+    if app.testing:
+        return
+
     # 如果 logs 文件夹不存在，创建一个
     if not os.path.exists('logs'):
         os.mkdir('logs')
@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, session, flash
+from flask import Blueprint, render_template, redirect, url_for, session, flash, jsonify
 from app.extensions import db
-from app.models import User, Post, HealthRecord, HealthPlan, Comment, PostLike
+from app.models import User, Post, HealthRecord, HealthPlan, Comment, PostLike, HealthDailyRollup, HealthPeriodRollup, AIJob, DeviceSyncBatch
 from app.decorators import login_required
+from app.services.post_service import PostService
+from app.services.search_service import SearchService
+from app.services.cache_service import cache_stats
+from app.services.resilience import get_metrics
 
 bp = Blueprint('admin', __name__)
 
@@ -18,6 +22,18 @@ def dashboard():
     # 🔥 修正点：文件名改为 admin_dashboard.html
     return render_template('admin/admin_dashboard.html', users=users)
 
+@bp.route('/admin/cache_stats')
+@login_required
+def cache_stats_view():
+    """AI 响应缓存的命中统计 (当前 worker 进程)"""
+    return jsonify(cache_stats())
+
+@bp.route('/admin/ai_metrics')
+@login_required
+def ai_metrics():
+    """AI 调用容错层的实时指标：排队数、进行中的调用、熔断状态、重试预算 (当前 worker 进程)"""
+    return jsonify(get_metrics())
+
 @bp.route('/admin/toggle_admin/<int:user_id>')
 @login_required
 def toggle_admin(user_id):
@@ -43,14 +59,27 @@ def toggle_ban(user_id):
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     if user.id != session['user_id']:
+        # 先记下该用户评论/点赞过的帖子，删除后修正这些帖子的计数
+        own_post_ids = [pid for (pid,) in db.session.query(Post.id).filter_by(user_id=user_id)]
+        touched_post_ids = [pid for (pid,) in db.session.query(Comment.post_id).filter_by(user_id=user_id)] + \
+                           [pid for (pid,) in db.session.query(PostLike.post_id).filter_by(user_id=user_id)]
+
         # 级联删除相关数据，防止外键报错
         HealthRecord.query.filter_by(user_id=user_id).delete()
+        HealthDailyRollup.query.filter_by(user_id=user_id).delete()
+        HealthPeriodRollup.query.filter_by(user_id=user_id).delete()
         HealthPlan.query.filter_by(user_id=user_id).delete()
+        AIJob.query.filter_by(user_id=user_id).delete()
+        DeviceSyncBatch.query.filter_by(user_id=user_id).delete()
         Post.query.filter_by(user_id=user_id).delete()
         Comment.query.filter_by(user_id=user_id).delete()
         PostLike.query.filter_by(user_id=user_id).delete()
         db.session.delete(user)
         db.session.commit()
+        if touched_post_ids:
+            PostService.reconcile_counters(touched_post_ids)
+        for post_id in own_post_ids:
+            SearchService.remove_post(post_id)
     return redirect(url_for('admin.dashboard'))
 
 @bp.route('/admin/toggle_posting/<int:user_id>')
@@ -71,6 +100,7 @@ def delete_post(post_id):
     try:
         db.session.delete(post)
         db.session.commit()
+        SearchService.remove_post(post_id)
         flash('帖子已删除')
     except Exception as e:
         db.session.rollback()
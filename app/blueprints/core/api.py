@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify, session, request
-from app.blueprints.health.service import RecordService
+from app.blueprints.health.service import RecordService, DeviceSyncService
 from app.extensions import db
 from app.models import HealthRecord, User
+from app.services.rollup_service import RollupService
+from app.services.validators import validate_device
 from datetime import datetime
+import json
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -19,8 +22,11 @@ def upload_data():
     if file.filename == '':
         return jsonify({'status': 'error', 'message': '未选择文件'}), 400
 
-    # 调用 Service
-    result = RecordService.parse_csv(file.stream)
+    # 默认只解析第一行用于回填表单；import=1 时批量导入全部记录
+    if request.values.get('import'):
+        result = RecordService.import_csv(session['user_id'], file.stream)
+    else:
+        result = RecordService.parse_csv(file.stream)
 
     if result['status'] == 'error':
         return jsonify(result), 400
@@ -36,97 +42,15 @@ def upload_health_data():
 
     try:
         data = request.json
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({
                 'status': 'error', 
                 'message': '数据获取失败，请稍后再试'
             }), 400
 
-        # 验证数据格式和范围
-        errors = []
-        
-        # 验证步数
-        if 'steps' in data:
-            try:
-                steps_val = int(data['steps'])
-                if steps_val < 0 or steps_val > 100000:
-                    errors.append('步数数据异常')
-            except (ValueError, TypeError):
-                errors.append('步数格式错误')
-        
-        # 体重不需要验证，因为会直接从数据库的user表读取
-        
-        # 验证体脂率
-        if 'body_fat' in data:
-            try:
-                bf_val = float(data['body_fat'])
-                if bf_val < 3 or bf_val > 60:
-                    errors.append('体脂率数据异常')
-            except (ValueError, TypeError):
-                errors.append('体脂率格式错误')
-        
-        # 验证血糖
-        if 'blood_glucose' in data:
-            try:
-                bg_val = float(data['blood_glucose'])
-                if bg_val < 2 or bg_val > 30:
-                    errors.append('血糖数据异常')
-            except (ValueError, TypeError):
-                errors.append('血糖格式错误')
-        
-        # 验证卡路里
-        if 'calories' in data:
-            try:
-                cal_val = int(data['calories'])
-                if cal_val < 0 or cal_val > 10000:
-                    errors.append('卡路里数据异常')
-            except (ValueError, TypeError):
-                errors.append('卡路里格式错误')
-        
-        # 验证睡眠
-        if 'sleep' in data:
-            try:
-                sleep_val = float(data['sleep'])
-                if sleep_val < 0 or sleep_val > 24:
-                    errors.append('睡眠时长数据异常')
-            except (ValueError, TypeError):
-                errors.append('睡眠时长格式错误')
-        
-        # 验证心率
-        if 'heart_rate' in data:
-            try:
-                hr_val = int(data['heart_rate'])
-                if hr_val < 30 or hr_val > 250:
-                    errors.append('心率数据异常')
-            except (ValueError, TypeError):
-                errors.append('心率格式错误')
-        
-        # 验证血压高压
-        if 'blood_pressure_high' in data:
-            try:
-                bp_high = int(data['blood_pressure_high'])
-                if bp_high < 60 or bp_high > 250:
-                    errors.append('高压数据异常')
-            except (ValueError, TypeError):
-                errors.append('高压格式错误')
-        
-        # 验证血压低压
-        if 'blood_pressure_low' in data:
-            try:
-                bp_low = int(data['blood_pressure_low'])
-                if bp_low < 40 or bp_low > 150:
-                    errors.append('低压数据异常')
-            except (ValueError, TypeError):
-                errors.append('低压格式错误')
-        
-        # 验证血压逻辑关系
-        if 'blood_pressure_high' in data and 'blood_pressure_low' in data:
-            try:
-                if int(data['blood_pressure_high']) <= int(data['blood_pressure_low']):
-                    errors.append('血压数据异常：高压必须大于低压')
-            except (ValueError, TypeError):
-                pass  # 已经在上面报错了
-        
+        # 验证数据格式和范围 (体重不需要验证，因为会直接从数据库的user表读取)
+        values, errors = validate_device(data)
+
         # 如果有验证错误，返回异常提示
         if errors:
             return jsonify({
@@ -147,41 +71,17 @@ def upload_health_data():
         # 获取今日日期
         today = datetime.now().date()
 
-        # 查找今天是否已经有记录
-        record = HealthRecord.query.filter_by(
-            user_id=session['user_id'],
-            date=today
-        ).first()
-
-        # 如果今天还没记录，就创建一个新的
-        if not record:
-            record = HealthRecord(user_id=session['user_id'], date=today)
-            db.session.add(record)
-
-        # 更新数据（模拟从智能设备同步）
-        # 注意：智能设备可以同步步数、卡路里、睡眠、心率、血压、体脂、血糖
-        # 体重直接从数据库的user表读取，不从前端模拟数据中获取
-        if 'steps' in data:
-            record.steps = int(data['steps'])
-        if 'calories' in data:
-            record.calories = int(data['calories'])
-        if 'sleep' in data:
-            record.sleep_hours = float(data['sleep'])
-        if 'heart_rate' in data:
-            record.heart_rate = int(data['heart_rate'])
-        if 'blood_pressure_high' in data:
-            record.blood_pressure_high = int(data['blood_pressure_high'])
-        if 'blood_pressure_low' in data:
-            record.blood_pressure_low = int(data['blood_pressure_low'])
+        # 智能设备可以同步步数、卡路里、睡眠、心率、血压、体脂、血糖
         # 体重直接从用户设置中读取，不从前端模拟数据中获取
-        record.weight = user.weight
-        if 'body_fat' in data:
-            record.body_fat = float(data['body_fat'])
-        if 'blood_glucose' in data:
-            record.blood_glucose = float(data['blood_glucose'])
+        values['weight'] = user.weight
 
+        # 一条 upsert 写入今天的记录：手机和手环同时同步也只有一条记录，步数/卡路里取较大值，其余以本次为准
+        RecordService.upsert_records(session['user_id'], {today: values}, merge=True)
+        RollupService.refresh(session['user_id'], today)
         db.session.commit()
-        
+
+        record = HealthRecord.query.filter_by(user_id=session['user_id'], date=today).first()
+
         return jsonify({
             'status': 'success',
             'message': '智能设备数据同步成功',
@@ -204,4 +104,59 @@ def upload_health_data():
         return jsonify({
             'status': 'error',
             'message': '无法获取数据，请检查网络连接'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@api_bp.route('/upload_health_data/batch', methods=['POST'])
+def upload_health_data_batch():
+    """
+    智能设备批量同步接口：设备缓存的多天读数一次上传
+    请求体为 JSON 数组、{"batch_id": ..., "readings": [...]}，或 NDJSON (Content-Type: application/x-ndjson，每行一条)
+    每条读数：{"timestamp": "2024-05-01T08:00:00+08:00" 或 Unix 时间戳 (也可以只给 "date"), "steps": ..., ...}
+    批次号可放在请求体、X-Batch-Id 请求头或 batch_id 参数中，重复提交同一批次直接返回第一次的结果
+    """
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': '请先登录'}), 401
+
+    readings, batch_id = _read_sync_payload()
+    if readings is None:
+        return jsonify({'status': 'error', 'message': '数据获取失败，请稍后再试'}), 400
+    if batch_id is not None and (isinstance(batch_id, bool) or not isinstance(batch_id, (str, int))
+                                 or not 0 < len(str(batch_id)) <= 64):
+        return jsonify({'status': 'error', 'message': '批次号格式错误'}), 400
+
+    try:
+        result, status_code = DeviceSyncService.sync(session['user_id'], readings,
+                                                      str(batch_id) if batch_id is not None else None)
+        return jsonify(result), status_code
+    except Exception as e:
+        db.session.rollback()
+        print(f"Batch Sync Error: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': '无法获取数据，请检查网络连接'
+        }), 500
+
+
+def _read_sync_payload():
+    """解析批量同步的请求体，返回 (读数列表, 批次号)；格式不对时读数列表为 None"""
+    batch_id = request.headers.get('X-Batch-Id') or request.args.get('batch_id')
+
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        readings = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                readings.append(json.loads(line))
+            except ValueError:
+                readings.append(None)  # 这一条按格式错误返回，不影响其他行
+        return readings, batch_id
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        batch_id = data.get('batch_id', batch_id)
+        data = data.get('readings')
+    if not isinstance(data, list):
+        return None, batch_id
+    return data, batch_id
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash
 from app.decorators import login_required
 from app.services.stats_service import StatsService
+from app.services.rollup_service import RollupService
 
 # === 🔥 修改点：在这里直接定义 Blueprint ===
 bp = Blueprint('main', __name__)
@@ -45,34 +46,29 @@ def report_preview():
     from datetime import datetime
 
     user = User.query.get(user_id)
-    # 获取最近 30 条记录
-    records = HealthRecord.query.filter_by(user_id=user_id).order_by(HealthRecord.date.desc()).limit(30).all()
+    last_rec = HealthRecord.query.filter_by(user_id=user_id).order_by(HealthRecord.date.desc()).first()
 
     # ✅ 修复点1：没有数据时，跳转回仪表盘并提示，防止 streak_days 报错
-    if not records:
+    if not last_rec:
         flash("暂无健康数据，请先记录或同步数据后再生成报告。", "warning")
         return redirect(url_for('main.dashboard'))
 
-    last_rec = records[0]
+    # === 🔥 直接读取最近 30 个打卡日的日汇总 (由 RollupService 增量维护)，不再扫描原始记录 ===
+    rollups = RollupService.get_daily(user_id, limit=30)[::-1]
+    dates = [r.day.strftime('%m-%d') for r in rollups]
 
-    # === 🔥 修复点2：处理数据中的 None 值 (防止 TypeError) ===
-    dates = [r.date.strftime('%m-%d') for r in records][::-1]
+    # 没有有效值的日期记为 0，和原来的图表口径保持一致
+    weights = [round(r.weight_sum / r.weight_count, 1) if r.weight_count else 0 for r in rollups]
+    steps = [(r.steps_sum or 0) for r in rollups]
 
-    # 把 None 转换成 0，防止同步数据后体重为空导致报错
-    weights = [(r.weight or 0) for r in records][::-1]
-    steps = [(r.steps or 0) for r in records][::-1]
+    # 平均体重/步数/睡眠 (汇总表只累计有效值，0 和空值不会拉低平均值)
+    summary = RollupService.summarize(rollups)
+    avg_weight = summary['avg_weight']
+    avg_steps = summary['avg_steps']
+    avg_sleep = summary['avg_sleep']
 
-    # 计算平均体重 (排除 0 值，否则平均值会偏低)
-    valid_weights = [w for w in weights if w > 0]
-    avg_weight = round(sum(valid_weights) / len(valid_weights), 1) if valid_weights else 0
-
-    # 计算平均步数
-    valid_steps = [s for s in steps if s > 0]
-    avg_steps = int(sum(valid_steps) / len(valid_steps)) if valid_steps else 0
-
-    # 睡眠数据处理 (已经包含 None 过滤)
-    valid_sleeps = [r.sleep_hours for r in records if r.sleep_hours]
-    avg_sleep = round(sum(valid_sleeps) / len(valid_sleeps), 1) if valid_sleeps else 0
+    # 本周/上周/本月/上月的平均值直接读周/月汇总表
+    periods = RollupService.recent_periods(user_id, datetime.now().date())
 
     # BMI 计算 (防止 last_rec.weight 为 None)
     bmi = 0
@@ -80,8 +76,8 @@ def report_preview():
 
     # 获取当前有效体重 (如果最新的一条没体重，就找最近一次有的)
     current_weight = last_rec.weight
-    if not current_weight and valid_weights:
-        current_weight = valid_weights[-1]
+    if not current_weight:
+        current_weight = next((w for w in reversed(weights) if w > 0), None)
 
     if user.height and current_weight:
         h_m = user.height / 100
@@ -108,5 +104,6 @@ def report_preview():
                            dates=dates,
                            weights=weights,
                            steps=steps,
+                           periods=periods,
                            latest_plan=latest_plan,
                            generate_date=datetime.now().strftime('%Y年%m月%d日'))
\ No newline at end of file
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, request, jsonify, session
+from flask import Blueprint, render_template, request, jsonify, session, Response, stream_with_context
 from app.services.plan_service import PlanService
 from app.services.assessment_service import AssessmentService
+from app.services.job_service import JobService, QueueFullError
 from app.decorators import login_required
 from app.models import HealthPlan, PlanTask, User  # 🔥 引入了新的 PlanTask 模型和 User
 from app.extensions import db
@@ -38,25 +39,107 @@ def chat():
     if not user_input:
         return jsonify({'status': 'error', 'message': '内容不能为空'})
 
-    try:
-        # 调用 Service，透传 history
-        result = PlanService.generate_health_plan(
-            user_id=user_id,
-            user_message=user_input,
-            history=history,
-            save_as_plan=save_flag
-        )
+    # async=1 时提交后台任务，立即返回 job_id
+    if _wants_async():
+        return _enqueue('chat', _chat_job, user_id, user_input, history, save_flag)
 
-        return jsonify({
-            'status': 'success',
-            'reply': result['reply'],
-            'updated_plan': result['updated_plan']
-        })
+    try:
+        return jsonify(_chat_job(user_id, user_input, history, save_flag))
     except Exception as e:
         print(f"AI Service Error: {e}")
         return jsonify({'status': 'error', 'reply': 'AI 助手暂时有点累，请稍后再试。'})
 
 
+def _chat_job(user_id, user_input, history, save_flag):
+    # 调用 Service，透传 history
+    result = PlanService.generate_health_plan(
+        user_id=user_id,
+        user_message=user_input,
+        history=history,
+        save_as_plan=save_flag
+    )
+
+    return {
+        'status': 'success',
+        'reply': result['reply'],
+        'updated_plan': result['updated_plan'],
+        'prompt_tokens': result['prompt_tokens']
+    }
+
+
+@bp.route('/plan/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """
+    流式对话 (Server-Sent Events)：
+    event: delta  -> {"text": 新增的回复文本}，AI 每输出一段就推送一次
+    event: done   -> {"status", "reply", "updated_plan"}，AI 输出结束、计划保存之后推送
+    event: error  -> {"status": "error", "reply": 提示信息}
+    """
+    data = request.get_json() or {}
+    user_input = data.get('message')
+    history = data.get('history', [])
+
+    if not user_input:
+        return jsonify({'status': 'error', 'message': '内容不能为空'})
+
+    save_flag = data.get('save', False) or ("计划" in user_input)
+    user_id = session['user_id']
+
+    def generate():
+        try:
+            for event, payload in PlanService.stream_health_plan(
+                    user_id=user_id,
+                    user_message=user_input,
+                    history=history,
+                    save_as_plan=save_flag):
+                if event == 'delta':
+                    yield _sse('delta', {'text': payload})
+                else:
+                    yield _sse('done', {'status': 'success', **payload})
+        except Exception as e:
+            print(f"AI Stream Error: {e}")
+            db.session.rollback()
+            yield _sse('error', {'status': 'error', 'reply': 'AI 助手暂时有点累，请稍后再试。'})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 关闭 Nginx 的响应缓冲，否则事件会被攒到最后一起发出
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@bp.route('/plan/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """
+    查询后台任务状态：state 为 pending / running / done / error，
+    结束后 result 为与同步接口相同的返回内容
+    """
+    job = JobService.get(job_id, session['user_id'])
+    if not job:
+        return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+    return jsonify(JobService.to_dict(job))
+
+
+def _wants_async():
+    data = request.get_json(silent=True) or {}
+    return request.args.get('async') in ('1', 'true') or data.get('async') is True
+
+
+def _enqueue(kind, func, *args):
+    """提交后台任务，返回 202 和 job_id；同样的评估/快速计划请求执行中时返回已有的 job_id"""
+    try:
+        job = JobService.submit(session['user_id'], kind, func, *args)
+    except QueueFullError:
+        return jsonify({'status': 'error', 'message': '服务繁忙，请稍后再试。'}), 503
+    return jsonify(JobService.to_dict(job)), 202
+
+
 @bp.route('/plan/toggle_task', methods=['POST'])
 @login_required
 def toggle_task():
@@ -99,6 +182,8 @@ def get_assessment():
             return jsonify(saved_assessment)
         
         # 如果没有保存的评估，生成新的
+        if _wants_async():
+            return _enqueue('assessment', AssessmentService.generate_health_assessment, user_id)
         assessment = AssessmentService.generate_health_assessment(user_id)
         return jsonify(assessment)
     except Exception as e:
@@ -110,11 +195,29 @@ def get_assessment():
         }), 500
 
 
+@bp.route('/plan/assessment/score', methods=['GET'])
+@login_required
+def quick_score():
+    """只用本地规则计算健康分数和指标等级（不调用 AI，立即返回；建议和总结另行生成）"""
+    user_id = session['user_id']
+    try:
+        return jsonify(AssessmentService.quick_score(user_id))
+    except Exception as e:
+        print(f"Quick Score Error: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': '健康评分失败，请稍后重试',
+            'health_score': 0
+        }), 500
+
+
 @bp.route('/plan/assessment/regenerate', methods=['POST'])
 @login_required
 def regenerate_assessment():
     """重新生成健康状态评估（强制生成新的评估）"""
     user_id = session['user_id']
+    if _wants_async():
+        return _enqueue('assessment', AssessmentService.generate_health_assessment, user_id)
     try:
         assessment = AssessmentService.generate_health_assessment(user_id)
         return jsonify(assessment)
@@ -191,25 +294,11 @@ def generate_quick_plan():
         
         user_message = goal_messages.get(goal_type, goal_messages['maintain'])
         
-        # 调用PlanService生成计划
-        result = PlanService.generate_health_plan(
-            user_id=user_id,
-            user_message=user_message,
-            history=None,
-            save_as_plan=True  # 强制保存为计划
-        )
-        
-        if result.get('updated_plan'):
-            return jsonify({
-                'status': 'success',
-                'message': '计划生成成功',
-                'reply': result.get('reply', '')
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': '计划生成失败，请稍后重试'
-            }), 500
+        if _wants_async():
+            return _enqueue('quick_plan', _quick_plan_job, user_id, user_message)
+
+        result = _quick_plan_job(user_id, user_message)
+        return jsonify(result), (200 if result['status'] == 'success' else 500)
             
     except Exception as e:
         print(f"Generate Quick Plan Error: {e}")
@@ -219,6 +308,27 @@ def generate_quick_plan():
         }), 500
 
 
+def _quick_plan_job(user_id, user_message):
+    # 调用PlanService生成计划
+    result = PlanService.generate_health_plan(
+        user_id=user_id,
+        user_message=user_message,
+        history=None,
+        save_as_plan=True  # 强制保存为计划
+    )
+    
+    if result.get('updated_plan'):
+        return {
+            'status': 'success',
+            'message': '计划生成成功',
+            'reply': result.get('reply', '')
+        }
+    return {
+        'status': 'error',
+        'message': '计划生成失败，请稍后重试'
+    }
+
+
 @bp.route('/plan/add_task', methods=['POST'])
 @login_required
 def add_task():
@@ -1,165 +1,52 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, make_response, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from app.extensions import db
 from app.models import HealthRecord, User
 from app.decorators import login_required
+from app.services.rollup_service import RollupService
+from app.services.validators import validate_form, form_error_message, FORM_FIELDS
+from app.pagination import keyset_paginate
+from .service import RecordService
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import csv
 import io
+import zlib
 
 # === 🔥 修改点：在这里定义 Blueprint ===
 # 注意：我们这里叫它 bp，方便统一习惯
 bp = Blueprint('record', __name__)
 
+# 历史记录每页条数
+RECORD_PAGE_SIZE = 30
+
+# 导出 CSV 的列 (表头, 字段)，只查询这些字段
+EXPORT_COLUMNS = [
+    ('日期', HealthRecord.date),
+    ('体重(kg)', HealthRecord.weight),
+    ('体脂率(%)', HealthRecord.body_fat),
+    ('步数', HealthRecord.steps),
+    ('饮水量(ml)', HealthRecord.water_intake),
+    ('卡路里', HealthRecord.calories),
+    ('睡眠(h)', HealthRecord.sleep_hours),
+    ('血糖(mmol/L)', HealthRecord.blood_glucose),
+    ('心率(bpm)', HealthRecord.heart_rate),
+    ('高压', HealthRecord.blood_pressure_high),
+    ('低压', HealthRecord.blood_pressure_low),
+    ('备注', HealthRecord.note),
+]
+# 导出时每次从数据库游标读取的行数
+EXPORT_CHUNK_SIZE = 1000
 
-# === 🔥 新增：数据验证函数 ===
-def validate_health_data(form_data):
-    """
-    验证健康数据的合理性
-    返回: (is_valid, error_message)
-    """
-    errors = []
-    
-    # 1. 验证体重 (20-300 kg，必填)
-    weight = form_data.get('weight')
-    if not weight or weight.strip() == '':
-        errors.append("体重为必填项")
-    else:
-        try:
-            weight_val = float(weight)
-            if weight_val <= 0:
-                errors.append("体重必须大于0")
-            elif weight_val < 20 or weight_val > 300:
-                errors.append("体重必须在 20-300 kg 之间")
-        except ValueError:
-            errors.append("体重格式不正确")
-    
-    # 2. 验证体脂率 (3-60%)
-    body_fat = form_data.get('body_fat')
-    if body_fat:
-        try:
-            bf_val = float(body_fat)
-            if bf_val < 3 or bf_val > 60:
-                errors.append("体脂率必须在 3-60% 之间")
-            elif bf_val < 0:
-                errors.append("体脂率不能为负数")
-        except ValueError:
-            errors.append("体脂率格式不正确")
-    
-    # 3. 验证步数 (0-100000)
-    steps = form_data.get('steps')
-    if steps:
-        try:
-            steps_val = int(steps)
-            if steps_val < 0:
-                errors.append("步数不能为负数")
-            elif steps_val > 100000:
-                errors.append("步数不能超过 100000")
-        except ValueError:
-            errors.append("步数必须是整数")
-    
-    # 4. 验证卡路里 (0-10000)
-    calories = form_data.get('calories')
-    if calories:
-        try:
-            cal_val = int(calories)
-            if cal_val < 0:
-                errors.append("卡路里不能为负数")
-            elif cal_val > 10000:
-                errors.append("卡路里不能超过 10000")
-        except ValueError:
-            errors.append("卡路里必须是整数")
-    
-    # 5. 验证饮水量 (0-10000 ml)
-    water = form_data.get('water_intake')
-    if water:
-        try:
-            water_val = int(water)
-            if water_val < 0:
-                errors.append("饮水量不能为负数")
-            elif water_val > 10000:
-                errors.append("饮水量不能超过 10000 ml")
-        except ValueError:
-            errors.append("饮水量必须是整数")
-    
-    # 6. 验证血糖 (2-30 mmol/L)
-    glucose = form_data.get('blood_glucose')
-    if glucose:
-        try:
-            glucose_val = float(glucose)
-            if glucose_val < 2 or glucose_val > 30:
-                errors.append("血糖必须在 2-30 mmol/L 之间")
-            elif glucose_val < 0:
-                errors.append("血糖不能为负数")
-        except ValueError:
-            errors.append("血糖格式不正确")
-    
-    # 7. 验证睡眠时长 (0-24 小时)
-    sleep = form_data.get('sleep_hours')
-    if sleep:
-        try:
-            sleep_val = float(sleep)
-            if sleep_val < 0 or sleep_val > 24:
-                errors.append("睡眠时长必须在 0-24 小时之间")
-        except ValueError:
-            errors.append("睡眠时长格式不正确")
-    
-    # 8. 验证心率 (30-250 bpm)
-    heart_rate = form_data.get('heart_rate')
-    if heart_rate:
-        try:
-            hr_val = int(heart_rate)
-            if hr_val < 30 or hr_val > 250:
-                errors.append("心率必须在 30-250 bpm 之间")
-            elif hr_val < 0:
-                errors.append("心率不能为负数")
-        except ValueError:
-            errors.append("心率必须是整数")
-    
-    # 9. 验证血压高压 (60-250 mmHg)
-    bp_high = form_data.get('bp_high')
-    if bp_high:
-        try:
-            bp_high_val = int(bp_high)
-            if bp_high_val < 60 or bp_high_val > 250:
-                errors.append("高压必须在 60-250 mmHg 之间")
-            elif bp_high_val < 0:
-                errors.append("高压不能为负数")
-        except ValueError:
-            errors.append("高压必须是整数")
-    
-    # 10. 验证血压低压 (40-150 mmHg)
-    bp_low = form_data.get('bp_low')
-    if bp_low:
-        try:
-            bp_low_val = int(bp_low)
-            if bp_low_val < 40 or bp_low_val > 150:
-                errors.append("低压必须在 40-150 mmHg 之间")
-            elif bp_low_val < 0:
-                errors.append("低压不能为负数")
-        except ValueError:
-            errors.append("低压必须是整数")
-    
-    # 11. 验证血压逻辑关系（高压应该大于低压）
-    if bp_high and bp_low:
-        try:
-            if int(bp_high) <= int(bp_low):
-                errors.append("高压必须大于低压")
-        except ValueError:
-            pass  # 已经在上面报错了
-    
-    if errors:
-        return False, "输入无效，请重新输入：" + "；".join(errors)
-    
-    return True, ""
 
 @bp.route('/record', methods=['GET', 'POST'])
 @login_required
 def index():
     if request.method == 'POST':
         # 🔥 1. 先验证数据
-        is_valid, error_msg = validate_health_data(request.form)
-        if not is_valid:
-            flash(error_msg)
+        values, errors = validate_form(request.form)
+        if errors:
+            flash(form_error_message(errors))
             return redirect(url_for('record.index'))
         
         # 2. 验证日期格式
@@ -170,36 +57,30 @@ def index():
             flash("输入无效，请重新输入：日期格式错误")
             return redirect(url_for('record.index'))
 
-        # 3. 数据验证通过，创建记录
+        # 3. 数据验证通过，写入记录：只写入填写了的字段
+        # 这一天已有记录 (例如设备已经同步了步数、睡眠) 时，留空的字段保留原值，不会被清空或写成 0
+        filled = {column: values[column] for key, column in FORM_FIELDS.items()
+                  if (request.form.get(key) or '').strip()}
+        if (request.form.get('note') or '').strip():
+            filled['note'] = request.form['note']
         try:
-            new_record = HealthRecord(
-                user_id=session['user_id'],
-                date=record_date,
-                weight=float(request.form.get('weight')),
-                steps=int(request.form.get('steps') or 0),
-                calories=int(request.form.get('calories') or 0),
-                body_fat=float(request.form.get('body_fat') or 0) if request.form.get('body_fat') else None,
-                water_intake=int(request.form.get('water_intake') or 0) if request.form.get('water_intake') else None,
-                blood_glucose=float(request.form.get('blood_glucose') or 0) if request.form.get('blood_glucose') else None,
-                note=request.form.get('note'),
-                sleep_hours=float(request.form.get('sleep_hours') or 0) if request.form.get('sleep_hours') else None,
-                heart_rate=int(request.form.get('heart_rate') or 0) if request.form.get('heart_rate') else None,
-                blood_pressure_high=int(request.form.get('bp_high') or 0) if request.form.get('bp_high') else None,
-                blood_pressure_low=int(request.form.get('bp_low') or 0) if request.form.get('bp_low') else None
-            )
-            db.session.add(new_record)
+            RecordService.upsert_records(session['user_id'], {record_date: filled})
+            RollupService.refresh(session['user_id'], record_date)
             db.session.commit()
             flash("记录已保存")
         except Exception as e:
+            db.session.rollback()
             flash("输入无效，请重新输入：保存失败")
             return redirect(url_for('record.index'))
         
         return redirect(url_for('record.index'))
 
+    # 只渲染最近一页，更早的记录由前端通过 /record/history 按游标加载
     user = User.query.get(session['user_id'])
-    user_records = HealthRecord.query.filter_by(user_id=session['user_id']).order_by(HealthRecord.date.desc()).all()
+    history = _load_history_page(session['user_id'], '')
 
-    return render_template('health/record.html', nickname=session.get('nickname'), records=user_records, user=user, edit_record=None)
+    return render_template('health/record.html', nickname=session.get('nickname'), records=history.items,
+                           next_cursor=history.next_cursor, user=user, edit_record=None)
 
 @bp.route('/record/edit/<int:record_id>')
 @login_required
@@ -209,10 +90,47 @@ def edit_view(record_id):
         flash("您无权编辑此记录")
         return redirect(url_for('record.index'))
 
+    # 编辑页只查询目标记录，历史列表由前端异步加载
     user = User.query.get(session['user_id'])
-    user_records = HealthRecord.query.filter_by(user_id=session['user_id']).order_by(HealthRecord.date.desc()).all()
 
-    return render_template('health/record.html', nickname=session.get('nickname'), records=user_records, user=user, edit_record=target_record)
+    return render_template('health/record.html', nickname=session.get('nickname'), records=[],
+                           next_cursor=None, history_deferred=True, user=user, edit_record=target_record)
+
+
+@bp.route('/record/history')
+@login_required
+def history():
+    """历史记录接口：按 (日期, id) 游标返回下一页记录 (JSON)"""
+    page = _load_history_page(session['user_id'], request.args.get('cursor', ''))
+    return jsonify({
+        'status': 'success',
+        'records': [_record_to_dict(r) for r in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+
+def _load_history_page(user_id, cursor):
+    """按 (日期, id) 倒序取一页历史记录"""
+    query = HealthRecord.query.filter_by(user_id=user_id)
+    return keyset_paginate(query, [HealthRecord.date, HealthRecord.id], cursor=cursor, limit=RECORD_PAGE_SIZE)
+
+
+def _record_to_dict(r):
+    return {
+        'id': r.id,
+        'date': str(r.date),
+        'weight': r.weight,
+        'body_fat': r.body_fat,
+        'steps': r.steps,
+        'water_intake': r.water_intake,
+        'calories': r.calories,
+        'sleep_hours': r.sleep_hours,
+        'blood_glucose': r.blood_glucose,
+        'heart_rate': r.heart_rate,
+        'blood_pressure_high': r.blood_pressure_high,
+        'blood_pressure_low': r.blood_pressure_low,
+        'note': r.note
+    }
 
 @bp.route('/record/update/<int:record_id>', methods=['POST'])
 @login_required
@@ -222,40 +140,32 @@ def update(record_id):
         return redirect(url_for('record.index'))
 
     # 1. 先验证数据
-    is_valid, error_msg = validate_health_data(request.form)
-    if not is_valid:
-        flash(error_msg)
+    values, errors = validate_form(request.form)
+    if errors:
+        flash(form_error_message(errors))
         return redirect(url_for('record.edit_view', record_id=record_id))
 
+    old_date = record.date
     try:
         # 2. 验证日期格式
         record.date = datetime.strptime(request.form.get('date'), '%Y-%m-%d').date()
         
         # 3. 更新数据
-        record.weight = float(request.form.get('weight'))
-        record.steps = int(request.form.get('steps') or 0)
-        record.calories = int(request.form.get('calories') or 0)
-        bf = request.form.get('body_fat')
-        record.body_fat = float(bf) if bf else None
-        wi = request.form.get('water_intake')
-        record.water_intake = int(wi) if wi else None
-        bg = request.form.get('blood_glucose')
-        record.blood_glucose = float(bg) if bg else None
+        for column, value in values.items():
+            setattr(record, column, value)
         record.note = request.form.get('note')
-        s_val = request.form.get('sleep_hours')
-        record.sleep_hours = float(s_val) if s_val else None
-        hr_val = request.form.get('heart_rate')
-        record.heart_rate = int(hr_val) if hr_val else None
-        bp_h = request.form.get('bp_high')
-        record.blood_pressure_high = int(bp_h) if bp_h else None
-        bp_l = request.form.get('bp_low')
-        record.blood_pressure_low = int(bp_l) if bp_l else None
 
+        # 日期可能被修改，新旧两天的汇总都要刷新
+        RollupService.refresh(record.user_id, old_date, record.date)
         db.session.commit()
         flash("修改已保存")
     except ValueError:
         flash("输入无效，请重新输入：日期格式错误")
         return redirect(url_for('record.edit_view', record_id=record_id))
+    except IntegrityError:
+        db.session.rollback()
+        flash("输入无效，请重新输入：该日期已有记录")
+        return redirect(url_for('record.edit_view', record_id=record_id))
     except Exception as e:
         flash("输入无效，请重新输入：保存失败")
         return redirect(url_for('record.edit_view', record_id=record_id))
@@ -265,17 +175,62 @@ def update(record_id):
 @bp.route('/record/export')
 @login_required
 def export():
-    records = HealthRecord.query.filter_by(user_id=session['user_id']).order_by(HealthRecord.date.desc()).all()
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['日期', '体重(kg)', '体脂率(%)', '步数', '饮水量(ml)', '卡路里', '睡眠(h)', '血糖(mmol/L)', '心率(bpm)', '高压', '低压', '备注'])
-    for r in records:
-        cw.writerow([r.date, r.weight, r.body_fat, r.steps, r.water_intake, r.calories, r.sleep_hours, r.blood_glucose, r.heart_rate, r.blood_pressure_high, r.blood_pressure_low, r.note])
-    output = make_response(si.getvalue().encode('utf-8-sig'))
+    """
+    流式导出 CSV：服务端游标分块读取，边查边写，内存占用与记录数量无关
+    可选参数 start / end (YYYY-MM-DD) 限定日期范围；客户端支持时使用 gzip 压缩
+    """
+    stmt = select(*[col for _, col in EXPORT_COLUMNS]).where(HealthRecord.user_id == session['user_id'])
+
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start:
+            stmt = stmt.where(HealthRecord.date >= datetime.strptime(start, '%Y-%m-%d').date())
+        if end:
+            stmt = stmt.where(HealthRecord.date <= datetime.strptime(end, '%Y-%m-%d').date())
+    except ValueError:
+        flash("输入无效，请重新输入：日期格式错误")
+        return redirect(url_for('record.index'))
+
+    stmt = stmt.order_by(HealthRecord.date.desc()).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+    use_gzip = request.accept_encodings['gzip'] > 0
+    body = _csv_stream(stmt)
+    if use_gzip:
+        body = _gzip_stream(body)
+
+    output = Response(stream_with_context(body), mimetype='text/csv')
     output.headers["Content-Disposition"] = "attachment; filename=health_data.csv"
-    output.headers["Content-type"] = "text/csv"
+    output.headers["Vary"] = "Accept-Encoding"
+    if use_gzip:
+        output.headers["Content-Encoding"] = "gzip"
     return output
 
+
+def _csv_stream(stmt):
+    """逐块生成 CSV 字节流，UTF-8 BOM 只在开头写一次 (方便 Excel 识别中文)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue().encode('utf-8-sig')
+
+    for rows in db.session.execute(stmt).partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip_stream(chunks):
+    """把字节流增量压缩成 gzip 格式"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
 @bp.route('/record/delete/<int:record_id>')
 @login_required
 def delete(record_id):
@@ -284,6 +239,7 @@ def delete(record_id):
         flash("您无权删除此记录")
         return redirect(url_for('record.index'))
     db.session.delete(record)
+    RollupService.refresh(record.user_id, record.date)
     db.session.commit()
     flash("记录已删除")
     return redirect(url_for('record.index'))
\ No newline at end of file
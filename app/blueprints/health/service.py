@@ -1,72 +1,409 @@
+import codecs
 import csv
 import io
+import json
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import HealthRecord, User, DeviceSyncBatch
+from app.services.rollup_service import RollupService
+from app.services.validators import validate_rows, form_error_message
+
+# 字段映射表：CSV中文名 -> 表单字段名
+CSV_FIELD_MAP = {
+    '日期': 'date',
+    '体重(kg)': 'weight',
+    '体脂率(%)': 'body_fat',
+    '步数': 'steps',
+    '饮水量(ml)': 'water_intake',
+    '卡路里': 'calories',
+    '睡眠(h)': 'sleep_hours',
+    '血糖(mmol/L)': 'blood_glucose',
+    '心率(bpm)': 'heart_rate',
+    '高压': 'bp_high',
+    '低压': 'bp_low',
+    '备注': 'note'
+}
+
+# 按顺序尝试的编码
+ENCODINGS = ['utf-8-sig', 'gbk', 'gb18030', 'big5']
+
+# 只用文件开头这么多字节判断编码，不把整个文件读进内存
+SNIFF_BYTES = 64 * 1024
+
+# 批量导入时每批校验/写入的行数 (每批提交一次)
+IMPORT_BATCH_SIZE = 1000
+
+# 返回给前端的逐行错误最多条数
+MAX_REPORTED_ERRORS = 100
+
+# 累计型字段：同一天多次同步 (多个设备) 时取较大值，其余字段以最后一次同步为准
+SYNC_MAX_FIELDS = ('steps', 'calories')
+
+# 一次批量同步最多的读数条数
+SYNC_MAX_READINGS = 10000
+
+
+class _ReplayStream(io.RawIOBase):
+    """先吐出已经读过的开头字节，再接着读原始流，用来在嗅探编码后从头解析"""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
 
 
 class RecordService:
     @staticmethod
     def parse_csv(file_stream):
         """
-        解析上传的 CSV 文件流
+        解析上传的 CSV 文件流，只读取第一行数据用于回填表单
         返回: {'status': 'success/error', 'data': ...}
         """
         try:
-            bytes_content = file_stream.read()
-            if not bytes_content:
-                return {'status': 'error', 'message': '文件内容为空'}
-
-            # 简单的防错检查
-            if bytes_content.startswith(b'PK\x03\x04'):
-                return {'status': 'error', 'message': '❌ 格式错误：请上传 CSV 文件'}
-
-            text_content = None
-            # 尝试不同的编码格式解码
-            encodings = ['utf-8-sig', 'gbk', 'gb18030', 'big5']
-            for enc in encodings:
-                try:
-                    text_content = bytes_content.decode(enc)
-                    break
-                except UnicodeDecodeError:
+            reader, error = RecordService._open_csv(file_stream)
+            if error:
+                return {'status': 'error', 'message': error}
+
+            # 取第一行数据作为回填示例
+            target_row = next(reader, None)
+            if target_row is None:
+                return {'status': 'error', 'message': '没有数据行'}
+
+            data = {}
+            for csv_key, db_key in CSV_FIELD_MAP.items():
+                val = (target_row.get(csv_key) or '').strip()
+                data[db_key] = val
+
+            return {'status': 'success', 'data': data, 'message': '✅ 成功导入'}
+
+        except UnicodeDecodeError:
+            return {'status': 'error', 'message': '❌ 文件编码无法识别，请另存为 CSV UTF-8'}
+        except Exception as e:
+            return {'status': 'error', 'message': f'系统错误: {str(e)}'}
+
+    @staticmethod
+    def import_csv(user_id, file_stream, batch_size=IMPORT_BATCH_SIZE):
+        """
+        批量导入 CSV 中的全部记录
+        边解码边解析，每 batch_size 行校验一次并按 (user_id, 日期) 写入，内存占用与文件大小无关
+        同一天已有记录时覆盖该记录，没有则新建；校验失败的行跳过并返回行号和原因
+        每批记录和这些日期的日汇总在同一个事务里提交；中途出错 (例如文件后面有无法解码的字节) 时
+        已经提交的批次保留，错误结果里同样带上 imported / failed
+        返回: {'status', 'message', 'imported', 'failed', 'errors': [{'row', 'message'}]}
+        """
+        imported = 0
+        failed = 0
+        errors = []
+        pending = []
+
+        def flush():
+            """按列校验积攒的一批行，合法的行按日期写入，连同日汇总一起提交"""
+            nonlocal imported, failed
+            if not pending:
+                return
+            values, row_errors = validate_rows([form for _, form in pending])
+            batch = {}
+            for i, (row_num, form) in enumerate(pending):
+                if i in row_errors:
+                    record_date, message = None, form_error_message(row_errors[i])
+                else:
+                    record_date, message = RecordService._parse_date(form['date'])
+                if message:
+                    failed += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({'row': row_num, 'message': message})
                     continue
 
-            if text_content is None:
-                return {'status': 'error', 'message': '❌ 文件编码无法识别，请另存为 CSV UTF-8'}
+                # 同一批里同一天出现多次时以后出现的为准
+                batch.pop(record_date, None)
+                batch[record_date] = {**values[i], 'note': form['note'] or None}
 
-            stream = io.StringIO(text_content, newline=None)
-            reader = csv.DictReader(stream)
+            if batch:
+                RecordService.upsert_records(user_id, batch)
+                # 只刷新这一批涉及的日期，不重建用户的全部历史
+                RollupService.refresh(user_id, *batch)
+                db.session.commit()
+                imported += len(batch)
+            pending.clear()
+
+        try:
+            reader, error = RecordService._open_csv(file_stream)
+            if error:
+                return {'status': 'error', 'message': error}
 
-            if reader.fieldnames:
-                # 去除表头可能的空格
-                reader.fieldnames = [name.strip() for name in reader.fieldnames]
+            # 表头占第 1 行，数据从第 2 行开始，与 Excel 中看到的行号一致
+            for row_num, row in enumerate(reader, start=2):
+                pending.append((row_num, {db_key: (row.get(csv_key) or '').strip()
+                                          for csv_key, db_key in CSV_FIELD_MAP.items()}))
+                if len(pending) >= batch_size:
+                    flush()
+            flush()
 
-            rows = list(reader)
-            if not rows:
+            if not imported and not failed:
                 return {'status': 'error', 'message': '没有数据行'}
+            if not imported:
+                return {'status': 'error', 'message': f'❌ 导入失败：{failed} 行数据无效',
+                        'imported': 0, 'failed': failed, 'errors': errors}
 
-            # 取第一行数据作为回填示例
-            target_row = rows[0]
-
-            # 字段映射表：CSV中文名 -> 数据库字段名
-            field_map = {
-                '日期': 'date',
-                '体重(kg)': 'weight',
-                '体脂率(%)': 'body_fat',
-                '步数': 'steps',
-                '饮水量(ml)': 'water_intake',
-                '卡路里': 'calories',
-                '睡眠(h)': 'sleep_hours',
-                '血糖(mmol/L)': 'blood_glucose',
-                '心率(bpm)': 'heart_rate',
-                '高压': 'bp_high',
-                '低压': 'bp_low',
-                '备注': 'note'
-            }
+            message = f'✅ 成功导入 {imported} 条记录'
+            if failed:
+                message += f'，{failed} 行数据无效已跳过'
+            return {'status': 'success', 'message': message,
+                    'imported': imported, 'failed': failed, 'errors': errors}
 
-            data = {}
-            for csv_key, db_key in field_map.items():
-                val = target_row.get(csv_key, '').strip()
-                data[db_key] = val
+        except UnicodeDecodeError:
+            db.session.rollback()
+            return RecordService._import_failed('❌ 文件编码无法识别，请另存为 CSV UTF-8', imported, failed, errors)
+        except Exception as e:
+            db.session.rollback()
+            return RecordService._import_failed(f'系统错误: {str(e)}', imported, failed, errors)
 
-            return {'status': 'success', 'data': data, 'message': '✅ 成功导入'}
+    @staticmethod
+    def _import_failed(message, imported, failed, errors):
+        """导入中途出错：已经提交的批次不会回滚，告诉用户导入了多少条"""
+        if imported:
+            message += f'（出错前已导入 {imported} 条记录，可以修正文件后重新导入，同一天的记录会被覆盖）'
+        return {'status': 'error', 'message': message, 'imported': imported, 'failed': failed, 'errors': errors}
 
-        except Exception as e:
-            return {'status': 'error', 'message': f'系统错误: {str(e)}'}
\ No newline at end of file
+    @staticmethod
+    def upsert_records(user_id, rows, merge=False):
+        """
+        按 (user_id, 日期) 批量写入记录，rows 为 {日期: 字段值}
+        依赖 (user_id, date) 唯一约束，一条 INSERT ... ON DUPLICATE KEY UPDATE (SQLite 为 ON CONFLICT DO UPDATE)
+        完成插入或更新，多个设备并发同步同一天也不会产生重复记录
+        merge=False：rows 中给出的字段直接覆盖，没有给出的字段保留原值 (CSV 导入、手动录入只传填写了的字段)
+        merge=True：设备同步的合并规则，步数/卡路里取较大值，其余字段以本次上传为准，没有上传的字段保留原值
+        调用方负责 commit
+        """
+        if not rows:
+            return
+
+        fields = sorted({field for values in rows.values() for field in values})
+        now = datetime.utcnow()
+        params = [{'user_id': user_id, 'date': d, 'updated_at': now, **{field: values.get(field) for field in fields}}
+                  for d, values in rows.items()]
+        db.session.execute(RecordService._upsert_statement(fields, merge), params)
+
+    @staticmethod
+    def _upsert_statement(fields, merge):
+        """按数据库方言生成 upsert 语句，冲突时只更新 fields 中的字段"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            stmt = mysql_insert(HealthRecord)
+            new = stmt.inserted
+        else:
+            # 本地开发用的 SQLite
+            stmt = sqlite_insert(HealthRecord)
+            new = stmt.excluded
+        greatest = func.greatest if dialect == 'mysql' else func.max
+
+        values = {}
+        for field in fields:
+            old_value, new_value = getattr(HealthRecord, field), getattr(new, field)
+            if not merge:
+                values[field] = new_value
+            elif field in SYNC_MAX_FIELDS:
+                # 两边都可能为空：空值不参与比较
+                values[field] = greatest(func.coalesce(old_value, new_value), func.coalesce(new_value, old_value))
+            else:
+                values[field] = func.coalesce(new_value, old_value)
+        values['updated_at'] = new.updated_at
+
+        if dialect == 'mysql':
+            return stmt.on_duplicate_key_update(values)
+        return stmt.on_conflict_do_update(index_elements=['user_id', 'date'], set_=values)
+
+    @staticmethod
+    def _open_csv(file_stream):
+        """
+        只读取开头一段字节来判断编码，然后把整个流包装成按需解码的 DictReader
+        返回: (reader, error_message)
+        """
+        prefix = file_stream.read(SNIFF_BYTES)
+        if not prefix:
+            return None, '文件内容为空'
+
+        # 简单的防错检查
+        if prefix.startswith(b'PK\x03\x04'):
+            return None, '❌ 格式错误：请上传 CSV 文件'
+
+        encoding = RecordService._sniff_encoding(prefix)
+        if encoding is None:
+            return None, '❌ 文件编码无法识别，请另存为 CSV UTF-8'
+
+        text = io.TextIOWrapper(io.BufferedReader(_ReplayStream(prefix, file_stream)),
+                                encoding=encoding, newline='')
+        reader = csv.DictReader(text)
+
+        if reader.fieldnames:
+            # 去除表头可能的空格
+            reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+        return reader, None
+
+    @staticmethod
+    def _sniff_encoding(prefix):
+        """用增量解码器试解开头的字节 (final=False，允许末尾截断半个字符)"""
+        for enc in ENCODINGS:
+            try:
+                codecs.getincrementaldecoder(enc)().decode(prefix, final=False)
+                return enc
+            except UnicodeDecodeError:
+                continue
+        return None
+
+    @staticmethod
+    def _parse_date(value):
+        """解析 CSV 中的日期，返回 (日期, 错误信息)"""
+        for fmt in ('%Y-%m-%d', '%Y/%m/%d'):
+            try:
+                return datetime.strptime(value, fmt).date(), None
+            except ValueError:
+                continue
+        return None, "输入无效，请重新输入：日期格式错误"
+
+
+class DeviceSyncService:
+    @staticmethod
+    def sync(user_id, readings, batch_id=None):
+        """
+        批量同步设备读数 (可以跨越多天)
+        一次遍历校验全部读数，按时间顺序把同一天的读数合并 (同一字段以最后一次读数为准，步数/卡路里取较大值)，
+        再用一条 upsert 按天写入 health_record (与已有记录按同样的规则合并)；
+        与单条同步接口一致，只有今天的记录写入用户设置中的体重，其他日期不改动已有的体重
+        提供 batch_id 时同一批次只处理一次，重复提交直接返回第一次的结果
+        返回: (结果, HTTP 状态码)，结果包含 accepted / rejected / days / errors: [{'index', 'message'}]
+        """
+        if batch_id:
+            replay = DeviceSyncService._find_batch(user_id, batch_id)
+            if replay:
+                return replay
+
+        user = User.query.get(user_id)
+        if not user or not user.weight:
+            return {
+                'status': 'error',
+                'message': '无法获取健康数据，请检查设置',
+                'details': '请在账户设置页面设置您的体重'
+            }, 400
+
+        if len(readings) > SYNC_MAX_READINGS:
+            return {'status': 'error', 'message': f'单次最多同步 {SYNC_MAX_READINGS} 条数据'}, 413
+
+        # 字段按列一次校验，时间逐条解析
+        values, field_errors = validate_rows([r if isinstance(r, dict) else {} for r in readings], 'device')
+
+        valid = []
+        errors = []
+        for index, reading in enumerate(readings):
+            if not isinstance(reading, dict):
+                errors.append({'index': index, 'message': '数据格式错误'})
+                continue
+            reading_time, time_error = DeviceSyncService._parse_time(reading)
+            reading_errors = ([time_error] if time_error else []) + field_errors.get(index, [])
+            if not reading_errors and not values[index]:
+                reading_errors.append('没有可同步的数据')
+
+            if reading_errors:
+                errors.append({'index': index, 'message': '；'.join(reading_errors)})
+            else:
+                valid.append((reading_time, index, values[index]))
+
+        # 按时间顺序合并，同一天同一字段以最后一次读数为准 (时间相同时按提交顺序)，步数/卡路里取较大值
+        days = {}
+        for reading_time, _, values in sorted(valid, key=lambda item: (item[0], item[1])):
+            day = days.setdefault(reading_time.date(), {})
+            for column, value in values.items():
+                if column in SYNC_MAX_FIELDS and day.get(column) is not None:
+                    value = max(day[column], value)
+                day[column] = value
+        # 体重不从设备读取：与单条同步接口一样，今天的记录取用户设置中的体重
+        # 以前的日期不写体重 (合并时保留原值)，不能用现在的体重覆盖当天手动记录的体重
+        today = datetime.now().date()
+        if today in days:
+            days[today]['weight'] = user.weight
+
+        result = {
+            'status': 'success' if valid else 'error',
+            'accepted': len(valid),
+            'rejected': len(errors),
+            'days': [str(day) for day in sorted(days)],
+            'errors': errors
+        }
+        if valid:
+            result['message'] = f'智能设备数据同步成功：{len(valid)} 条数据，共 {len(days)} 天'
+            if errors:
+                result['message'] += f'，{len(errors)} 条数据异常已跳过'
+        else:
+            result['message'] = '获取的数据异常，请检查设备或稍后重试'
+        status_code = 200 if valid else 400
+
+        try:
+            if days:
+                RecordService.upsert_records(user_id, days, merge=True)
+                RollupService.refresh(user_id, *days)
+            if batch_id:
+                db.session.add(DeviceSyncBatch(user_id=user_id, batch_id=batch_id,
+                                               result=json.dumps([result, status_code], ensure_ascii=False)))
+            db.session.commit()
+        except IntegrityError:
+            # 同一批次的并发重试：另一个请求已经提交，本次的写入全部回滚，返回那一次的结果
+            db.session.rollback()
+            replay = DeviceSyncService._find_batch(user_id, batch_id) if batch_id else None
+            if not replay:
+                raise
+            return replay
+
+        return result, status_code
+
+    @staticmethod
+    def _find_batch(user_id, batch_id):
+        batch = DeviceSyncBatch.query.filter_by(user_id=user_id, batch_id=batch_id).first()
+        if not batch or not batch.get_result():
+            return None
+        result, status_code = batch.get_result()
+        return {**result, 'replayed': True}, status_code
+
+    @staticmethod
+    def _parse_time(reading):
+        """
+        读数时间：timestamp 为 ISO 8601 字符串或 Unix 时间戳 (秒)，或者只给 date (YYYY-MM-DD)
+        带时区的时间换算成服务器本地时间，与单条同步接口按本地日期记录一致
+        返回 (datetime, 错误信息)
+        """
+        value = reading.get('timestamp')
+        try:
+            if value is None and reading.get('date') is not None:
+                reading_time = datetime.strptime(str(reading['date']), '%Y-%m-%d')
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                reading_time = datetime.fromtimestamp(value)
+            elif isinstance(value, str):
+                reading_time = datetime.fromisoformat(value)
+                if reading_time.tzinfo:
+                    reading_time = reading_time.astimezone().replace(tzinfo=None)
+            else:
+                return None, '缺少时间'
+        except (ValueError, TypeError, OverflowError, OSError):
+            return None, '时间格式错误'
+
+        if reading_time.date() > datetime.now().date():
+            return None, '日期不能晚于今天'
+        return reading_time, None
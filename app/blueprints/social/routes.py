@@ -2,10 +2,16 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from app.extensions import db
 from app.models import User, Post, PostLike, Comment
 from app.decorators import login_required
-from sqlalchemy import or_  # 🔥 引入 or_ 用于组合查询条件
+from app.services.post_service import PostService
+from app.services.search_service import SearchService
+from app.pagination import keyset_paginate
+from sqlalchemy.orm import joinedload, selectinload
 
 bp = Blueprint('community', __name__)
 
+# 社区每页帖子数
+FEED_PAGE_SIZE = 10
+
 
 @bp.route('/community', methods=['GET', 'POST'])
 @login_required
@@ -32,6 +38,7 @@ def index():
             new_post = Post(user_id=user.id, title=title, content=content, is_announcement=is_announcement)
             db.session.add(new_post)
             db.session.commit()
+            SearchService.index_post(new_post)
             flash('发布成功！')
         except Exception as e:
             db.session.rollback()
@@ -43,52 +50,102 @@ def index():
 
     # === 🔥 修改点：搜索与分页逻辑 ===
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     search_query = request.args.get('q', '').strip()  # 获取搜索关键词
-    per_page = 10
-
-    # 1. 建立基础查询对象
-    query = Post.query
 
-    # 2. 如果有搜索词，增加过滤条件 (标题 或 内容 包含关键词)
+    pagination = None
+    next_cursor = None
     if search_query:
-        query = query.filter(
-            or_(
-                Post.title.ilike(f'%{search_query}%'),  # ilike 表示忽略大小写
-                Post.content.ilike(f'%{search_query}%')
-            )
-        )
-
-    # 3. 执行排序和分页
-    # 排序：先按是否公告(置顶)降序，再按时间降序
-    pagination = query.order_by(Post.is_announcement.desc(), Post.created_at.desc()) \
-        .paginate(page=page, per_page=per_page, error_out=False)
+        # 1. 有搜索词：交给搜索服务 (全文索引/倒排索引)，结果按相关度排序，按页码翻页
+        pagination = SearchService.search(search_query, page=page, per_page=FEED_PAGE_SIZE,
+                                          options=_feed_load_options())
+        posts = pagination.items
+    else:
+        # 2. 没有搜索词：按 (置顶, 时间, id) 游标翻页，翻到多深都只查一页数据
+        feed_page = _load_feed_page(cursor)
+        posts = feed_page.items
+        next_cursor = feed_page.next_cursor
 
-    posts = pagination.items
+    # 3. 点赞数直接读 post.like_count，"我是否点过赞"用一条查询覆盖整页帖子
+    liked_post_ids = _load_liked_post_ids([p.id for p in posts], user.id)
 
     return render_template('social/community.html',
                            nickname=user.nickname,
                            posts=posts,
                            pagination=pagination,
+                           cursor=cursor,
+                           next_cursor=next_cursor,
+                           liked_post_ids=liked_post_ids,
                            user=user,
                            current_user=user,
                            search_query=search_query)  # 🔥 把搜索词传回前端，用于回显
 
 
+@bp.route('/community/feed')
+@login_required
+def feed():
+    """无限滚动接口：按游标返回下一页帖子 (JSON)"""
+    feed_page = _load_feed_page(request.args.get('cursor', ''))
+    liked_post_ids = _load_liked_post_ids([p.id for p in feed_page.items], session['user_id'])
+
+    return jsonify({
+        'status': 'success',
+        'posts': [_post_to_dict(p, p.id in liked_post_ids) for p in feed_page.items],
+        'next_cursor': feed_page.next_cursor
+    })
+
+
+def _feed_load_options():
+    """作者、评论及评论作者一次性预加载，避免模板里逐条触发查询 (N+1)"""
+    return (
+        joinedload(Post.user),
+        selectinload(Post.comments).joinedload(Comment.user)
+    )
+
+
+def _load_feed_page(cursor):
+    """按 (是否公告, 发布时间, id) 倒序取一页帖子"""
+    query = Post.query.options(*_feed_load_options())
+    return keyset_paginate(query, [Post.is_announcement, Post.created_at, Post.id],
+                           cursor=cursor, limit=FEED_PAGE_SIZE)
+
+
+def _post_to_dict(post, liked):
+    return {
+        'id': post.id,
+        'title': post.title,
+        'content': post.content,
+        'created_at': post.created_at.strftime('%m-%d %H:%M') if post.created_at else None,
+        'is_announcement': post.is_announcement,
+        'like_count': post.like_count,
+        'comment_count': post.comment_count,
+        'liked': liked,
+        'author': {
+            'id': post.user_id,
+            'nickname': post.user.nickname,
+            'avatar_url': post.user.avatar_url
+        },
+        'comments': [{'nickname': c.user.nickname, 'content': c.content} for c in post.comments]
+    }
+
+
+def _load_liked_post_ids(post_ids, user_id):
+    """批量获取当前用户在这一页里点过赞的帖子 id"""
+    if not post_ids:
+        return set()
+
+    return {
+        post_id for (post_id,) in db.session.query(PostLike.post_id)
+        .filter(PostLike.post_id.in_(post_ids), PostLike.user_id == user_id)
+    }
+
+
 @bp.route('/post/<int:post_id>/like', methods=['POST'])
 @login_required
 def like_post(post_id):
-    user_id = session['user_id']
-    post = Post.query.get_or_404(post_id)
-    existing_like = PostLike.query.filter_by(user_id=user_id, post_id=post_id).first()
-
-    liked = False
-    if existing_like:
-        db.session.delete(existing_like)
-    else:
-        db.session.add(PostLike(user_id=user_id, post_id=post_id))
-        liked = True
-    db.session.commit()
-    return jsonify({'status': 'success', 'liked': liked, 'count': post.likes.count()})
+    Post.query.get_or_404(post_id)
+    liked, count = PostService.toggle_like(session['user_id'], post_id)
+    return jsonify({'status': 'success', 'liked': liked, 'count': count})
 
 
 @bp.route('/post/<int:post_id>/comment', methods=['POST'])
@@ -103,7 +160,7 @@ def add_comment(post_id):
     
     # 异常事件流2：处理系统错误
     try:
-        db.session.add(Comment(user_id=session['user_id'], post_id=post_id, content=content))
+        PostService.add_comment(session['user_id'], post_id, content)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -124,6 +181,7 @@ def delete_post(post_id):
     try:
         db.session.delete(post)
         db.session.commit()
+        SearchService.remove_post(post_id)
         flash('帖子已删除')
     except Exception as e:
         db.session.rollback()
@@ -153,6 +211,7 @@ def edit_post(post_id):
             post.title = title
             post.content = content
             db.session.commit()
+            SearchService.index_post(post)
             flash('帖子修改成功！')
             return redirect(url_for('community.index'))
         except Exception as e:
@@ -1,4 +1,5 @@
 from app.extensions import db
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from datetime import datetime
 from flask import url_for
 import json
@@ -43,6 +44,9 @@ class User(db.Model):
 
 class PostLike(db.Model):
     __tablename__ = 'post_like'
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'user_id', name='uq_post_like_post_id_user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
@@ -50,6 +54,9 @@ class PostLike(db.Model):
 
 class Comment(db.Model):
     __tablename__ = 'comment'
+    __table_args__ = (
+        db.Index('ix_comment_post_id_created_at', 'post_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -59,12 +66,18 @@ class Comment(db.Model):
 
 class Post(db.Model):
     __tablename__ = 'post'
+    __table_args__ = (
+        db.Index('ix_post_is_announcement_created_at', 'is_announcement', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_announcement = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    is_announcement = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # 🔥 冗余计数：点赞/评论时用原子 UPDATE 维护，避免每次 COUNT
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     comments = db.relationship('Comment', backref='post', lazy=True, cascade="all, delete-orphan",
                                order_by="Comment.created_at.asc()")
     likes = db.relationship('PostLike', backref='post', lazy='dynamic', cascade="all, delete-orphan")
@@ -75,6 +88,10 @@ class Post(db.Model):
 
 class HealthRecord(db.Model):
     __tablename__ = 'health_record'
+    __table_args__ = (
+        # 每个用户每天只有一条记录，设备同步/导入按 (user_id, date) 做 upsert
+        db.UniqueConstraint('user_id', 'date', name='uq_health_record_user_id_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, default=datetime.utcnow)
@@ -92,9 +109,56 @@ class HealthRecord(db.Model):
     blood_pressure_high = db.Column(db.Integer)
     blood_pressure_low = db.Column(db.Integer)
 
+    # 最后一次写入的时间 (手动录入、导入、设备同步都会更新)，用于判断健康评估是否过期
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# === 健康数据汇总表 (由 RollupService 增量维护，报告页直接读取) ===
+class HealthDailyRollup(db.Model):
+    __tablename__ = 'health_daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_health_daily_rollup_user_id_day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    record_count = db.Column(db.Integer, default=0)
+    # 只累计有效值 (体重/步数 > 0，睡眠非空)，与报告页的平均值口径一致
+    weight_sum = db.Column(db.Float, default=0)
+    weight_count = db.Column(db.Integer, default=0)
+    steps_sum = db.Column(db.Integer, default=0)
+    steps_count = db.Column(db.Integer, default=0)
+    sleep_sum = db.Column(db.Float, default=0)
+    sleep_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class HealthPeriodRollup(db.Model):
+    __tablename__ = 'health_period_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'period', 'period_start', name='uq_health_period_rollup_user_period_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # week(周一开始) / month(每月1号开始)
+    period_start = db.Column(db.Date, nullable=False)
+
+    record_count = db.Column(db.Integer, default=0)
+    weight_sum = db.Column(db.Float, default=0)
+    weight_count = db.Column(db.Integer, default=0)
+    steps_sum = db.Column(db.Integer, default=0)
+    steps_count = db.Column(db.Integer, default=0)
+    sleep_sum = db.Column(db.Float, default=0)
+    sleep_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class HealthPlan(db.Model):
     __tablename__ = 'health_plan'
+    __table_args__ = (
+        db.Index('ix_health_plan_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     goal = db.Column(db.String(100))
@@ -112,6 +176,9 @@ class HealthPlan(db.Model):
 
 class PlanTask(db.Model):
     __tablename__ = 'plan_task'
+    __table_args__ = (
+        db.Index('ix_plan_task_plan_id', 'plan_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     plan_id = db.Column(db.Integer, db.ForeignKey('health_plan.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -161,4 +228,70 @@ class HealthAssessment(db.Model):
             'suggestions': self.get_suggestions(),
             'summary': self.summary,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class AIJob(db.Model):
+    """AI 后台任务：请求只负责提交，结果由后台线程写回，前端轮询 /plan/jobs/<id> 获取"""
+    __tablename__ = 'ai_job'
+    __table_args__ = (
+        db.Index('ix_ai_job_user_id_kind_status', 'user_id', 'kind', 'status'),
+        db.UniqueConstraint('dedup_key', name='uq_ai_job_dedup_key'),
+    )
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # chat / quick_plan / assessment
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending / running / done / error
+    dedup_key = db.Column(db.String(64))  # 执行中的可去重任务：用户+类型+参数的哈希，结束后清空
+    result = db.Column(db.Text)  # JSON格式存储接口返回内容
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)  # 线程开始执行的时间，执行超时从这里算起
+    finished_at = db.Column(db.DateTime)
+
+    def get_result(self):
+        try:
+            return json.loads(self.result) if self.result else None
+        except:
+            return None
+
+
+class DeviceSyncBatch(db.Model):
+    """设备批量同步的批次记录：同一用户重复提交同一个 batch_id 时直接返回第一次的结果"""
+    __tablename__ = 'device_sync_batch'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'batch_id', name='uq_device_sync_batch_user_id_batch_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    batch_id = db.Column(db.String(64), nullable=False)  # 客户端生成的批次号
+    result = db.Column(db.Text().with_variant(MEDIUMTEXT(), 'mysql'))  # JSON格式存储接口返回内容
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_result(self):
+        try:
+            return json.loads(self.result) if self.result else None
+        except:
+            return None
+
+
+class EmailOutbox(db.Model):
+    """待发送邮件：请求里只负责写入这张表，由后台发送线程批量投递，失败按退避时间重试"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30))  # welcome / reset_password
+    recipients = db.Column(db.String(500), nullable=False)  # 多个收件人用逗号分隔
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text().with_variant(MEDIUMTEXT(), 'mysql'), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending / sending / sent / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(32))  # 正在发送的线程领取批次时写入的标记
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    def get_recipients(self):
+        return [r for r in (self.recipients or '').split(',') if r]
@@ -0,0 +1,91 @@
+# app/pagination.py
+"""
+游标 (keyset) 分页工具
+翻页成本只和每页条数有关，不会像 OFFSET 那样越往后越慢，也不需要 COUNT(*)
+"""
+from sqlalchemy import or_, and_, literal
+from datetime import date, datetime
+import base64
+import json
+
+
+class KeysetPage:
+    """一页结果：items 为本页数据，next_cursor 为下一页的游标 (没有下一页时为 None)"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    """把排序键的值编码成不透明的游标字符串"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """
+    解析游标，按列类型还原取值
+    游标无效 (被篡改/格式不对) 时返回 None，调用方按第一页处理
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [_coerce(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_paginate(query, columns, cursor=None, limit=20):
+    """
+    对 query 做游标分页 (columns 为排序列，全部按降序，最后一列必须唯一，例如 id)
+    排序列必须 NOT NULL：NULL 写进游标后无法解析，下一页会回到第一页
+    :param cursor: 上一页返回的 next_cursor，为空表示第一页
+    :return: KeysetPage
+    """
+    values = decode_cursor(cursor, columns)
+    if values is not None:
+        query = query.filter(_after(columns, values))
+
+    rows = query.order_by(*[c.desc() for c in columns]).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return KeysetPage(rows, next_cursor)
+
+
+def _after(columns, values):
+    """
+    生成 "排在游标之后" 的条件 (降序)：
+    c1 < v1 OR (c1 = v1 AND c2 < v2) OR (c1 = v1 AND c2 = v2 AND c3 < v3) ...
+    """
+    # 用 literal 包一层，布尔列也能参与 < 比较 (SQLAlchemy 不允许直接和 True/False 比大小)
+    bounds = [literal(v, c.type) for c, v in zip(columns, values)]
+    clauses = []
+    for i, column in enumerate(columns):
+        equals = [columns[j] == bounds[j] for j in range(i)]
+        clauses.append(and_(*equals, column < bounds[i]))
+    return or_(*clauses)
+
+
+def _coerce(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is bool:
+        return bool(value)
+    return python_type(value)
@@ -1,30 +1,144 @@
 # app/services/ai_service.py
 from openai import OpenAI
 from flask import current_app
+from app.services.resilience import get_policy, ServiceUnavailable
+import atexit
+import httpx
+import threading
 import logging
 
 # 配置 Logger
 logger = logging.getLogger(__name__)
 
-def call_deepseek_advisor(messages):
+# 进程内共享的客户端：(api_key, base_url) -> OpenAI
+# 底层 httpx 连接池保持长连接，多个线程共用同一个客户端是安全的
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    """
+    获取 (首次使用时创建) 当前配置对应的共享客户端
+    连接池大小和超时可通过配置调整：
+    DEEPSEEK_POOL_SIZE / DEEPSEEK_KEEPALIVE / DEEPSEEK_CONNECT_TIMEOUT / DEEPSEEK_TIMEOUT / DEEPSEEK_MAX_RETRIES
+    """
+    config = current_app.config
+    key = (config['DEEPSEEK_API_KEY'], config['DEEPSEEK_BASE_URL'])
+
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _create_client(config)
+                _clients[key] = client
+    return client
+
+
+def close_clients():
+    """关闭所有共享客户端的连接池 (进程退出时自动调用)"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"AI Client Close Error: {e}")
+
+
+atexit.register(close_clients)
+
+
+def _create_client(config):
+    pool_size = config.get('DEEPSEEK_POOL_SIZE', 20)
+    timeout = config.get('DEEPSEEK_TIMEOUT', 60)
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=config.get('DEEPSEEK_KEEPALIVE', 30)
+        ),
+        timeout=httpx.Timeout(timeout, connect=config.get('DEEPSEEK_CONNECT_TIMEOUT', 5))
+    )
+    return OpenAI(
+        api_key=config['DEEPSEEK_API_KEY'],
+        base_url=config['DEEPSEEK_BASE_URL'],
+        max_retries=config.get('DEEPSEEK_MAX_RETRIES', 2),
+        http_client=http_client
+    )
+
+
+def call_deepseek_advisor(messages, user_id=None):
     """
     封装 DeepSeek API 底层调用逻辑
     :param messages: List[Dict], e.g. [{"role": "system", "content": "..."}, ...]
+    :param user_id: 发起调用的用户，用于按用户限制并发
+    经过容错层 (并发限制/截止时间/重试/熔断)，上游不可用时快速返回 None
     """
-    try:
-        client = OpenAI(
-            api_key=current_app.config['DEEPSEEK_API_KEY'],
-            base_url=current_app.config['DEEPSEEK_BASE_URL']
-        )
-
-        response = client.chat.completions.create(
+    def attempt(timeout):
+        response = _client_for_attempt().chat.completions.create(
             model="deepseek-chat",
             messages=messages,  # 🔥 核心修改：直接透传消息列表
             temperature=0.7,
-            response_format={'type': 'json_object'} # 🔥 新增：如果模型支持，强制 JSON 模式（可选，DeepSeek 目前主要靠 Prompt 约束）
+            response_format={'type': 'json_object'}, # 🔥 新增：如果模型支持，强制 JSON 模式（可选，DeepSeek 目前主要靠 Prompt 约束）
+            timeout=timeout
         )
+        _log_usage(response.usage)
         return response.choices[0].message.content
 
+    try:
+        return get_policy().call(attempt, user_id=user_id)
+
+    except ServiceUnavailable as e:
+        logger.warning(f"AI Service Unavailable: {e}")
+        return None
     except Exception as e:
         logger.error(f"AI Service Error: {e}", exc_info=True)
-        return None  # 返回 None 让上层处理错误，而不是返回一段文本
\ No newline at end of file
+        return None  # 返回 None 让上层处理错误，而不是返回一段文本
+
+
+def stream_deepseek_advisor(messages, user_id=None):
+    """
+    流式调用：逐段 yield 模型输出的文本
+    出错时记录日志并向上抛出，由调用方决定如何提示用户 (此时可能已经输出了一部分内容)；
+    容错层拒绝调用时抛出 ServiceUnavailable
+    """
+    def attempt(timeout):
+        stream = _client_for_attempt().chat.completions.create(
+            model="deepseek-chat",
+            messages=messages,
+            temperature=0.7,
+            response_format={'type': 'json_object'},
+            stream=True,
+            timeout=timeout
+        )
+        with stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    try:
+        yield from get_policy().stream(attempt, user_id=user_id)
+
+    except ServiceUnavailable as e:
+        logger.warning(f"AI Stream Unavailable: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"AI Stream Error: {e}", exc_info=True)
+        raise
+
+
+def _log_usage(usage):
+    """记录实际消耗的 token (DeepSeek 会额外返回命中前缀缓存的 token 数)"""
+    if usage is None:
+        return
+    logger.info(f"AI usage: prompt={usage.prompt_tokens} "
+                f"cache_hit={getattr(usage, 'prompt_cache_hit_tokens', None)} "
+                f"completion={usage.completion_tokens}")
+
+
+def _client_for_attempt():
+    # 重试由容错层统一控制 (受重试预算约束)，关闭 SDK 自带的重试
+    return get_client().with_options(max_retries=0)
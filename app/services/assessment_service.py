@@ -1,10 +1,27 @@
 # app/services/assessment_service.py
 from app.models import User, HealthRecord, HealthAssessment
 from app.services.ai_service import call_deepseek_advisor
+from app.services.cache_service import get_cache, make_key
+from app.services.scoring_service import ScoringService, DIMENSIONS
+from app.services.json_extract import parse_ai_json
+from app.services.validators import check_record
 from app.extensions import db
-from datetime import datetime
+from sqlalchemy import func, or_
+from datetime import date, datetime, timedelta
 import json
-import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 评估提示词版本：修改提示词或输出格式时递增，旧的缓存结果随之失效
+ASSESSMENT_PROMPT_VERSION = '2'
+
+# AI 返回的点评、建议和总结的字段要求
+ASSESSMENT_RESPONSE_SCHEMA = {
+    'comments': {'type': dict, 'default': dict},
+    'suggestions': {'type': list, 'required': True, 'items': str},
+    'summary': {'type': str, 'default': ''},
+}
 
 class AssessmentService:
     @staticmethod
@@ -18,90 +35,73 @@ class AssessmentService:
             "status": "success" or "error"
         }
         """
-        user = User.query.get(user_id)
-        if not user:
-            return {"status": "error", "message": "用户不存在"}
-        
-        # 获取最新健康记录
-        last_record = HealthRecord.query.filter_by(user_id=user_id) \
-            .order_by(HealthRecord.date.desc()).first()
-        
-        # 检查数据完整性
-        if not last_record:
-            return {
-                "status": "incomplete",
-                "message": "健康数据不完整，请先记录或同步健康数据",
-                "health_score": 0
-            }
-        
-        # 检查必要数据
-        missing_fields = []
-        if not user.height:
-            missing_fields.append("身高")
-        if not last_record.weight:
-            missing_fields.append("体重")
-        
-        if missing_fields:
-            return {
-                "status": "incomplete",
-                "message": f"健康数据不完整，请补充：{', '.join(missing_fields)}",
-                "health_score": 0,
-                "missing_fields": missing_fields
-            }
-        
-        # 检查数据有效性（异常事件流3：数据来源异常）
-        data_errors = AssessmentService._validate_data_quality(user, last_record)
-        if data_errors:
-            return {
-                "status": "data_error",
-                "message": "数据异常，请检查健康数据来源",
-                "health_score": 0,
-                "errors": data_errors,
-                "suggestion": "建议重新连接健康应用或设备，或手动检查数据"
-            }
-        
+        prepared = AssessmentService.prepare_assessment(user_id)
+        if prepared["status"] != "ready":
+            return prepared
+
+        assessment_data = AssessmentService.request_assessment(prepared)
+        if assessment_data["status"] == "success":
+            # 保存评估结果到数据库
+            AssessmentService._save_assessment_to_db(user_id, assessment_data)
+        return assessment_data
+
+    @staticmethod
+    def quick_score(user_id):
+        """
+        只用本地规则计算健康分数和各指标等级，不调用 AI，可以立即返回
+        数据不完整或异常时返回与 generate_health_assessment 相同的提示结果
+        """
+        user, last_record, problem = AssessmentService._load_assessment_data(user_id)
+        if problem:
+            return problem
+        return {"status": "success", **ScoringService.score(user, last_record)}
+
+    @staticmethod
+    def prepare_assessment(user_id):
+        """
+        读取数据、计算分数并组装评估所需的提示词 (只读数据库，不调用 AI)
+        数据齐全时返回 {"status": "ready", "user_id", "cache_key", "messages", "scores"}，
+        否则返回 incomplete / data_error / error 结果，可直接返回给前端
+        """
+        user, last_record, problem = AssessmentService._load_assessment_data(user_id)
+        if problem:
+            return problem
+
+        # 分数和指标等级由本地规则计算，AI 只负责点评、建议和总结
+        scores = ScoringService.score(user, last_record)
+
         # 构建用户健康档案
         profile_text = AssessmentService._build_health_profile(user, last_record)
-        
+
         # 构建AI提示词
         system_prompt = f"""
-你是一位资深的健康评估专家。请根据用户的健康数据，进行全面的健康状态评估。
+你是一位资深的健康评估专家。用户的健康分数和各项指标等级已经由系统按规则计算好，请在此基础上给出点评和改善建议，不要修改分数和等级。
 
 【用户健康档案】
 {profile_text}
 
+【系统评估结果】
+{AssessmentService._format_scores(scores)}
+
 【评估要求】
-1. 计算综合健康分数（0-100分），考虑以下维度：
-   - 身体成分（BMI、体脂率）：30%
-   - 运动能力（步数、卡路里）：25%
-   - 心血管健康（心率、血压）：20%
-   - 代谢健康（血糖）：15%
-   - 生活习惯（睡眠、饮水）：10%
-
-2. 对各项指标进行评估，给出等级（优秀/良好/需改善/异常）
-   - 评估时必须充分考虑用户的既往病史和健康备注
-   - 如果用户有特定疾病或健康问题，需要在相关指标的comment中提及，并给出相应的注意事项
-
-3. 提供3-5条针对性的健康改善建议
+1. 为每项已评估的指标写一句简短点评
+   - 点评时必须充分考虑用户的既往病史和健康备注
+   - 如果用户有特定疾病或健康问题，需要在相关指标的点评中提及，并给出相应的注意事项
+
+2. 提供3-5条针对性的健康改善建议
    - 建议必须结合用户的既往病史和健康备注
    - 如果用户有特定疾病（如高血压、糖尿病、过敏等），建议必须避开相关风险，并针对性地提供安全可行的改善方案
    - 如果用户有运动限制或饮食禁忌，建议必须严格遵守这些限制
 
-4. 在评估总结中，如果用户有既往病史，需要特别说明如何结合病史进行健康管理
+3. 在评估总结中概括整体健康状况，如果用户有既往病史，需要特别说明如何结合病史进行健康管理
 
 【输出格式要求】
-请务必返回严格的 JSON 格式，不要包含 ```json 代码块标记。格式如下：
+请务必返回严格的 JSON 格式，不要包含 ```json 代码块标记。comments 的键使用上面评估结果中的指标名。格式如下：
 {{
-    "health_score": 85,
-    "assessments": {{
-        "bmi": {{"value": 22.5, "level": "良好", "comment": "BMI在正常范围内"}},
-        "body_fat": {{"value": 20.5, "level": "良好", "comment": "体脂率适中"}},
-        "steps": {{"value": 8500, "level": "需改善", "comment": "建议增加日常活动量"}},
-        "heart_rate": {{"value": 72, "level": "优秀", "comment": "静息心率正常"}},
-        "blood_pressure": {{"value": "120/80", "level": "良好", "comment": "血压正常"}},
-        "blood_glucose": {{"value": 5.2, "level": "良好", "comment": "血糖正常"}},
-        "sleep": {{"value": 7.5, "level": "良好", "comment": "睡眠时长充足"}},
-        "water": {{"value": 1500, "level": "需改善", "comment": "建议增加饮水量"}}
+    "comments": {{
+        "bmi": "BMI在正常范围内，继续保持",
+        "steps": "活动量偏少，建议增加日常步行",
+        "water": "饮水量不足，建议少量多次饮水"
     }},
     "suggestions": [
         "建议每天增加2000ml饮水量，少量多次饮用",
@@ -116,9 +116,32 @@ class AssessmentService:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": "请对我的健康状况进行全面评估，并给出改善建议。"}
         ]
-        
+
+        return {
+            "status": "ready",
+            "user_id": user_id,
+            "cache_key": make_key(ASSESSMENT_PROMPT_VERSION, profile_text),
+            "messages": messages,
+            "scores": scores
+        }
+
+    @staticmethod
+    def request_assessment(prepared):
+        """
+        根据 prepare_assessment 的结果调用 AI 生成点评和建议 (不访问数据库，可在线程池中并发执行)
+        成功时返回带 "status": "success" 的完整评估结果，不负责保存
+        """
+        user_id = prepared["user_id"]
+
+        # 档案内容没变时直接使用缓存的评估结果，不再调用 AI
+        cache = get_cache('assessment')
+        cached = cache.get(prepared["cache_key"])
+        if cached:
+            logger.info(f"Assessment cache hit: user={user_id}")
+            return {**cached, "status": "success", "cached": True}
+
         # 调用AI服务
-        ai_response_text = call_deepseek_advisor(messages)
+        ai_response_text = call_deepseek_advisor(prepared["messages"], user_id=user_id)
         if not ai_response_text:
             return {
                 "status": "error",
@@ -127,24 +150,54 @@ class AssessmentService:
             }
         
         # 解析AI响应
-        assessment_data = AssessmentService._parse_ai_response(ai_response_text)
-        if not assessment_data:
+        narrative = AssessmentService._parse_ai_response(ai_response_text)
+        if not narrative:
             return {
                 "status": "error",
                 "message": "健康评估失败，请稍后重试",
                 "health_score": 0
             }
         
+        assessment_data = AssessmentService._merge_narrative(prepared["scores"], narrative)
+        cache.set(prepared["cache_key"], assessment_data)
         assessment_data["status"] = "success"
-        
-        # 保存评估结果到数据库
-        AssessmentService._save_assessment_to_db(user_id, assessment_data)
-        
         return assessment_data
-    
+
     @staticmethod
-    def _save_assessment_to_db(user_id, assessment_data):
-        """保存评估结果到数据库"""
+    def find_stale_users(active_days=None, limit=None):
+        """
+        查找需要重新生成评估的用户：没有评估记录，或上次评估之后健康记录有写入
+        (按记录的 updated_at 比较，评估当天再修改的记录同样会触发重新评估)
+        active_days: 只包含最近 N 天内有记录的用户；已封禁用户不包含
+        """
+        latest = db.session.query(
+            HealthRecord.user_id.label('user_id'),
+            func.max(HealthRecord.date).label('latest_date'),
+            func.max(HealthRecord.updated_at).label('latest_update')
+        ).group_by(HealthRecord.user_id).subquery()
+
+        query = db.session.query(latest.c.user_id) \
+            .join(User, User.id == latest.c.user_id) \
+            .outerjoin(HealthAssessment, HealthAssessment.user_id == latest.c.user_id) \
+            .filter(or_(User.is_banned.is_(None), User.is_banned.is_(False))) \
+            .filter(or_(
+                HealthAssessment.id.is_(None),
+                latest.c.latest_update > HealthAssessment.updated_at
+            ))
+        if active_days:
+            query = query.filter(latest.c.latest_date >= date.today() - timedelta(days=active_days))
+
+        query = query.order_by(latest.c.user_id)
+        if limit:
+            query = query.limit(limit)
+        return [row.user_id for row in query]
+
+    @staticmethod
+    def _save_assessment_to_db(user_id, assessment_data, commit=True):
+        """
+        保存评估结果到数据库；commit=False 时只加入会话，由调用方批量提交
+        commit=False 时出错直接抛出，由调用方回滚整个事务 (这里回滚会丢掉同一批里还没提交的其他评估)
+        """
         try:
             # 查找用户是否已有评估记录
             existing_assessment = HealthAssessment.query.filter_by(user_id=user_id).first()
@@ -167,8 +220,11 @@ class AssessmentService:
                 )
                 db.session.add(new_assessment)
             
-            db.session.commit()
+            if commit:
+                db.session.commit()
         except Exception as e:
+            if not commit:
+                raise
             print(f"Save Assessment Error: {e}")
             db.session.rollback()
             # 保存失败不影响评估结果的返回
@@ -185,6 +241,88 @@ class AssessmentService:
             print(f"Get Assessment Error: {e}")
             return None
     
+    @staticmethod
+    def _load_assessment_data(user_id):
+        """
+        读取用户和最新健康记录，并检查完整性和有效性
+        返回 (user, record, problem)；problem 不为空时是可直接返回给前端的提示结果
+        """
+        user = User.query.get(user_id)
+        if not user:
+            return None, None, {"status": "error", "message": "用户不存在"}
+        
+        # 获取最新健康记录
+        last_record = HealthRecord.query.filter_by(user_id=user_id) \
+            .order_by(HealthRecord.date.desc()).first()
+        
+        # 检查数据完整性
+        if not last_record:
+            return user, None, {
+                "status": "incomplete",
+                "message": "健康数据不完整，请先记录或同步健康数据",
+                "health_score": 0
+            }
+        
+        # 检查必要数据
+        missing_fields = []
+        if not user.height:
+            missing_fields.append("身高")
+        if not last_record.weight:
+            missing_fields.append("体重")
+        
+        if missing_fields:
+            return user, last_record, {
+                "status": "incomplete",
+                "message": f"健康数据不完整，请补充：{', '.join(missing_fields)}",
+                "health_score": 0,
+                "missing_fields": missing_fields
+            }
+        
+        # 检查数据有效性（异常事件流3：数据来源异常）
+        data_errors = AssessmentService._validate_data_quality(user, last_record)
+        if data_errors:
+            return user, last_record, {
+                "status": "data_error",
+                "message": "数据异常，请检查健康数据来源",
+                "health_score": 0,
+                "errors": data_errors,
+                "suggestion": "建议重新连接健康应用或设备，或手动检查数据"
+            }
+
+        return user, last_record, None
+
+    @staticmethod
+    def _format_scores(scores):
+        """把本地评分结果写成提示词中的文本"""
+        lines = [f"综合健康分数：{scores['health_score']}"]
+        for key, name, weight, metrics in DIMENSIONS:
+            dimension = scores['dimension_scores'][key]
+            if dimension['score'] is None:
+                continue
+            lines.append(f"- {name}（权重{round(weight * 100)}%）：{dimension['score']} 分")
+            for metric in metrics:
+                item = scores['assessments'].get(metric)
+                if item:
+                    lines.append(f"  - {metric}：{item['value']}，{item['level']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _merge_narrative(scores, narrative):
+        """把 AI 给出的点评、建议和总结合并到本地评分结果中，AI 没有点评的指标使用规则自带的说明"""
+        comments = narrative["comments"]
+        assessments = {}
+        for metric, item in scores["assessments"].items():
+            comment = comments.get(metric)
+            assessments[metric] = {**item, "comment": comment if isinstance(comment, str) and comment else item["comment"]}
+
+        return {
+            "health_score": scores["health_score"],
+            "assessments": assessments,
+            "dimension_scores": scores["dimension_scores"],
+            "suggestions": narrative["suggestions"],
+            "summary": narrative["summary"]
+        }
+
     @staticmethod
     def _build_health_profile(user, record):
         """构建用户健康档案文本"""
@@ -225,93 +363,14 @@ class AssessmentService:
     
     @staticmethod
     def _parse_ai_response(full_text):
-        """解析AI返回的JSON响应"""
-        try:
-            # 尝试直接解析
-            data = json.loads(full_text)
-        except json.JSONDecodeError:
-            # 清理可能的代码块标记
-            clean_text = re.sub(r'^```json\s*|\s*```$', '', full_text, flags=re.MULTILINE | re.DOTALL).strip()
-            try:
-                data = json.loads(clean_text)
-            except json.JSONDecodeError:
-                # 如果还是失败，尝试提取JSON部分
-                json_match = re.search(r'\{.*\}', clean_text, re.DOTALL)
-                if json_match:
-                    try:
-                        data = json.loads(json_match.group())
-                    except:
-                        return None
-                else:
-                    return None
-        
-        # 验证必要字段
-        if "health_score" not in data:
-            return None
-        
-        return data
+        """解析AI返回的JSON响应，不符合格式要求时返回 None"""
+        return parse_ai_json(full_text, ASSESSMENT_RESPONSE_SCHEMA)
     
     @staticmethod
     def _validate_data_quality(user, record):
         """
-        验证数据有效性
+        验证数据有效性 (范围与录入/同步时的校验一致)
         返回: 错误列表，如果为空则表示数据正常
         """
-        errors = []
-        
-        # 验证步数 (0-100000)
-        if record.steps is not None:
-            if record.steps < 0 or record.steps > 100000:
-                errors.append(f"步数数据异常：{record.steps}（正常范围：0-100000）")
-        
-        # 验证卡路里 (0-10000)
-        if record.calories is not None:
-            if record.calories < 0 or record.calories > 10000:
-                errors.append(f"卡路里数据异常：{record.calories}（正常范围：0-10000）")
-        
-        # 验证心率 (30-250 bpm)
-        if record.heart_rate is not None:
-            if record.heart_rate < 30 or record.heart_rate > 250:
-                errors.append(f"心率数据异常：{record.heart_rate} bpm（正常范围：30-250）")
-        
-        # 验证血压
-        if record.blood_pressure_high is not None:
-            if record.blood_pressure_high < 60 or record.blood_pressure_high > 250:
-                errors.append(f"血压高压异常：{record.blood_pressure_high} mmHg（正常范围：60-250）")
-        
-        if record.blood_pressure_low is not None:
-            if record.blood_pressure_low < 40 or record.blood_pressure_low > 150:
-                errors.append(f"血压低压异常：{record.blood_pressure_low} mmHg（正常范围：40-150）")
-        
-        # 验证血压逻辑关系
-        if record.blood_pressure_high is not None and record.blood_pressure_low is not None:
-            if record.blood_pressure_high <= record.blood_pressure_low:
-                errors.append(f"血压数据异常：高压({record.blood_pressure_high})必须大于低压({record.blood_pressure_low})")
-        
-        # 验证体重 (20-300 kg)
-        if record.weight is not None:
-            if record.weight < 20 or record.weight > 300:
-                errors.append(f"体重数据异常：{record.weight} kg（正常范围：20-300）")
-        
-        # 验证体脂率 (3-60%)
-        if record.body_fat is not None:
-            if record.body_fat < 3 or record.body_fat > 60:
-                errors.append(f"体脂率数据异常：{record.body_fat}%（正常范围：3-60）")
-        
-        # 验证血糖 (2-30 mmol/L)
-        if record.blood_glucose is not None:
-            if record.blood_glucose < 2 or record.blood_glucose > 30:
-                errors.append(f"血糖数据异常：{record.blood_glucose} mmol/L（正常范围：2-30）")
-        
-        # 验证睡眠 (0-24 小时)
-        if record.sleep_hours is not None:
-            if record.sleep_hours < 0 or record.sleep_hours > 24:
-                errors.append(f"睡眠时长异常：{record.sleep_hours} 小时（正常范围：0-24）")
-        
-        # 验证饮水量 (0-10000 ml)
-        if record.water_intake is not None:
-            if record.water_intake < 0 or record.water_intake > 10000:
-                errors.append(f"饮水量异常：{record.water_intake} ml（正常范围：0-10000）")
-        
-        return errors
+        return check_record(record)
 
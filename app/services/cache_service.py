@@ -0,0 +1,176 @@
+# app/services/cache_service.py
+"""
+AI 响应缓存
+- MemoryCache：进程内 LRU + TTL，只对当前 worker 生效
+- DiskCache：SQLite 文件，多个 worker 共享 (按最近访问时间淘汰)
+值为可 JSON 序列化的对象，键由调用方用 make_key 计算 (内容哈希)
+"""
+from flask import current_app
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_key(*parts):
+    """把若干字符串拼接后取 sha256，作为内容寻址的缓存键"""
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class _Stats:
+    """命中/未命中计数 (每个进程各自统计)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+        }
+
+
+class MemoryCache:
+    def __init__(self, max_entries=1000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (过期时间, value)
+        self._stats = _Stats()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.time():
+                self._data.move_to_end(key)
+                # 返回副本：调用方修改返回的字典不会影响缓存里的值
+                value = copy.deepcopy(entry[1])
+            else:
+                if entry:
+                    del self._data[key]
+                value = None
+        self._stats.record(value is not None)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        return {'backend': 'memory', 'size': size, **self._stats.as_dict()}
+
+
+class DiskCache:
+    def __init__(self, path, max_entries=1000, ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._stats = _Stats()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作单独连接，多线程/多进程之间不共享连接
+        # sqlite3 连接的 with 只负责提交/回滚，不会关闭连接，外面再套一层 closing
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            with conn:
+                yield conn
+
+    def get(self, key):
+        now = time.time()
+        value = None
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row and row[1] > now:
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+                value = json.loads(row[0])
+            elif row:
+                conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+        self._stats.record(value is not None)
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now))
+            conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+            conn.execute('DELETE FROM cache WHERE key IN ('
+                         'SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                         (self.max_entries,))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def stats(self):
+        with self._connect() as conn:
+            size = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        return {'backend': 'disk', 'size': size, **self._stats.as_dict()}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name):
+    """
+    按名称获取缓存实例 (每个进程一个)，配置项以名称大写为前缀，例如 name='assessment'：
+    ASSESSMENT_CACHE_BACKEND ('memory' / 'disk'，默认 memory)
+    ASSESSMENT_CACHE_TTL (秒，默认 1 天) / ASSESSMENT_CACHE_SIZE (默认 1000 条)
+    ASSESSMENT_CACHE_PATH (disk 后端的文件路径，默认 instance/assessment_cache.sqlite3)
+    """
+    with _caches_lock:
+        if name not in _caches:
+            config = current_app.config
+            prefix = name.upper() + '_CACHE_'
+            backend = config.get(prefix + 'BACKEND', 'memory')
+            ttl = config.get(prefix + 'TTL', 86400)
+            size = config.get(prefix + 'SIZE', 1000)
+            if backend == 'disk':
+                path = config.get(prefix + 'PATH') or os.path.join(current_app.instance_path, f'{name}_cache.sqlite3')
+                _caches[name] = DiskCache(path, max_entries=size, ttl=ttl)
+            else:
+                _caches[name] = MemoryCache(max_entries=size, ttl=ttl)
+        return _caches[name]
+
+
+def cache_stats():
+    """所有已创建缓存的命中统计"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
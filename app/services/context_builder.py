@@ -0,0 +1,92 @@
+# app/services/context_builder.py
+"""
+对话上下文组装
+- 固定的系统提示词放在最前面且每次完全相同，便于模型服务端的前缀缓存 (prompt cache) 命中
+- 每个用户不同的档案放在固定前缀之后
+- 历史消息按 token 预算从新到旧保留，超长消息截断
+token 数用本地规则估算 (中日韩文字约 1 字 1 token，其他字符约 4 个 1 token)，用于控制长度和记录成本，不要求精确
+"""
+import math
+import re
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+# 每条消息的固定开销 (角色、分隔符等)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATED_MARK = '…(内容过长已截断)'
+
+# 剩余预算少于这个数时不再放入截断后的消息
+MIN_TRUNCATED_TOKENS = 50
+
+
+def estimate_tokens(text):
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def estimate_messages_tokens(messages):
+    return sum(estimate_tokens(m.get('content')) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def truncate_to_tokens(text, budget):
+    """截断文本使其不超过 budget 个 token (保留开头部分)"""
+    if estimate_tokens(text) <= budget:
+        return text
+    budget -= estimate_tokens(TRUNCATED_MARK)
+    if budget <= 0:
+        return ''
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + TRUNCATED_MARK
+
+
+def trim_history(history, budget, max_messages=6):
+    """
+    从最近的消息开始往前保留，总 token 不超过 budget，最多 max_messages 条
+    只保留 user / assistant 消息；第一条放不下的消息截断后保留，更早的消息直接丢弃
+    """
+    if not history or not isinstance(history, list):
+        return []
+
+    valid = [h for h in history if isinstance(h, dict) and h.get('role') in ('user', 'assistant')
+             and isinstance(h.get('content'), str)]
+
+    kept = []
+    remaining = budget
+    for message in reversed(valid[-max_messages:]):
+        cost = estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+        if cost <= remaining:
+            kept.append({'role': message['role'], 'content': message['content']})
+            remaining -= cost
+            continue
+        # 放不下的消息截断后放入剩余预算 (剩余太少就不放了)，更早的消息不再保留
+        if remaining - MESSAGE_OVERHEAD_TOKENS >= MIN_TRUNCATED_TOKENS:
+            content = truncate_to_tokens(message['content'], remaining - MESSAGE_OVERHEAD_TOKENS)
+            kept.append({'role': message['role'], 'content': content})
+        break
+
+    kept.reverse()
+    return kept
+
+
+def build_messages(system_prefix, profile, history, user_message, history_budget, max_history=6):
+    """
+    组装消息列表，返回 (messages, 估算的 prompt token 数)
+    顺序：固定系统提示词 -> 用户档案 -> 历史消息 -> 本次提问
+    """
+    messages = [{"role": "system", "content": system_prefix}]
+    if profile:
+        messages.append({"role": "system", "content": profile})
+    messages.extend(trim_history(history, history_budget, max_history))
+    messages.append({"role": "user", "content": user_message})
+    return messages, estimate_messages_tokens(messages)
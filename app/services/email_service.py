@@ -1,23 +1,261 @@
-from flask_mail import Message
-from flask import current_app, render_template, url_for
-from app.extensions import mail
-from threading import Thread
+# app/services/email_service.py
+"""
+邮件发送 (发件箱模式)
+- 请求里只负责渲染模板并把邮件写入 email_outbox 表，进程重启或 SMTP 暂时不可用都不会丢邮件
+- 本进程内固定数量的发送线程按批领取到期的邮件，每批只建立一次 SMTP 连接 (mail.connect())
+- 发送失败按指数退避重试，超过次数或服务器明确拒收 (5xx) 时标记为 failed；
+  发送中途进程退出的邮件超时后会被重新领取，因此投递语义是“至少一次”
+- create_app 启动发送线程，进程重启后积压的邮件马上开始投递，不用等新邮件入队
+- 配置 MAIL_OUTBOX_WORKERS = 0 时不启动发送线程，由 send_outbox.py 定时投递
+- 群发 (公告、召回等) 用 send_bulk：模板只编译一次，逐个收件人渲染后按批写入发件箱
+"""
+from flask_mail import Message, BadHeaderError
+from flask.signals import before_render_template, template_rendered
+from flask import current_app, render_template
+from app.extensions import db, mail
+from app.models import EmailOutbox
+from datetime import datetime, timedelta
+from itertools import islice
+from sqlalchemy import and_, or_, insert
 import logging
+import os
+import smtplib
+import threading
+import uuid
 
 # 配置 Logger，确保错误能被记录下来
 logger = logging.getLogger(__name__)
 
-class EmailService:
-    @staticmethod
-    def send_async_email(app, msg):
-        """后台线程：发送邮件"""
+# 只影响当前这一封邮件的错误，连接还能继续发送同一批里的其它邮件
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError,
+                  BadHeaderError, AssertionError)
+
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+_stopping = threading.Event()
+
+
+def start_workers(app):
+    """
+    按 MAIL_OUTBOX_WORKERS 启动固定数量的发送线程 (create_app 中调用，每个进程只启动一次)
+    线程启动后马上处理一轮：重启前积压的邮件、发送中途进程退出 (领取超时) 的邮件都会被投递
+    fork 出来的子进程 (例如 gunicorn --preload) 没有父进程的线程，在子进程里重新启动
+    """
+    global _workers_pid
+    count = app.config.get('MAIL_OUTBOX_WORKERS', 2)
+    if count <= 0:
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        _workers.clear()
+        for i in range(count):
+            worker = threading.Thread(target=_worker_loop, args=(app,), name=f'mail-outbox-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def stop_workers(timeout=10):
+    """停止本进程的发送线程并等待它们处理完手上的一批 (测试结束、进程退出前调用)"""
+    global _workers_pid
+    with _workers_lock:
+        workers = list(_workers)
+        _stopping.set()
+        _wakeup.set()
+        for worker in workers:
+            worker.join(timeout)
+        _workers.clear()
+        _workers_pid = None
+        _stopping.clear()
+        _wakeup.clear()
+
+
+def _wake(app):
+    """有新邮件入队：确保发送线程已经启动，并唤醒等待中的线程"""
+    if app.config.get('MAIL_OUTBOX_WORKERS', 2) > 0:
+        start_workers(app)
+        _wakeup.set()
+
+
+def _worker_loop(app):
+    while not _stopping.is_set():
         with app.app_context():
             try:
-                mail.send(msg)
-                logger.info(f"✅ 邮件已成功发送给: {msg.recipients}")
+                claimed = EmailService.send_pending()
             except Exception as e:
-                # 使用 logger.error 记录详细堆栈信息
-                logger.error(f"❌ 邮件发送失败: {e}", exc_info=True)
+                logger.error(f"❌ 发件箱处理失败: {e}", exc_info=True)
+                db.session.rollback()
+                claimed = 0
+            finally:
+                db.session.remove()
+            poll = app.config.get('MAIL_OUTBOX_POLL', 10)
+
+        # 没有到期的邮件时等待新邮件入队，或者到下一轮轮询 (处理退避重试的邮件)
+        if not claimed:
+            _wakeup.wait(poll)
+            _wakeup.clear()
+
+
+def _is_permanent(error):
+    """服务器明确拒收 (5xx) 或邮件本身不合法，重试也不会成功"""
+    if isinstance(error, (BadHeaderError, AssertionError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class EmailService:
+    @staticmethod
+    def enqueue(kind, recipients, subject, html):
+        """写入发件箱并唤醒发送线程，返回 EmailOutbox"""
+        email = EmailOutbox(kind=kind, recipients=','.join(recipients), subject=subject, html=html,
+                            status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+        db.session.add(email)
+        db.session.commit()
+        _wake(current_app._get_current_object())
+        return email
+
+    @staticmethod
+    def render_many(template_name, recipients, variables=None, **context):
+        """
+        生成器：逐个收件人渲染同一个模板，产出 (user, html)
+        - 模板只查找/编译一次，context processors 和 context 里的公共变量只准备一次
+        - 每个收件人只替换 user 和 variables(user) 返回的变量 (例如重置密码的 token)
+        需要在请求上下文中调用，或者配置 SERVER_NAME，url_for(..., _external=True) 才能生成完整链接
+        """
+        app = current_app._get_current_object()
+        template = app.jinja_env.get_template(template_name)
+        shared = dict(context)
+        app.update_template_context(shared)
+
+        for user in recipients:
+            values = dict(shared, user=user)
+            if variables:
+                values.update(variables(user))
+            # 与 render_template 一样发出渲染信号
+            before_render_template.send(app, template=template, context=values)
+            html = template.render(**values)
+            template_rendered.send(app, template=template, context=values)
+            yield user, html
+
+    @staticmethod
+    def send_bulk(kind, template_name, subject, recipients, variables=None, batch_size=None, **context):
+        """
+        群发邮件，返回写入发件箱的邮件数
+        recipients 可以是生成器 (例如 User.query.yield_per(1000))，正文由 render_many 逐个渲染，
+        每 batch_size 封用一条批量 INSERT 写入发件箱并提交，内存占用与收件人数量无关；
+        每批提交后立即唤醒发送线程，渲染和发送同时进行
+        """
+        batch_size = batch_size or current_app.config.get('MAIL_BULK_BATCH', 1000)
+        app = current_app._get_current_object()
+        rendered = EmailService.render_many(template_name, (user for user in recipients if user.email),
+                                            variables, **context)
+        total = 0
+        while True:
+            now = datetime.utcnow()
+            rows = [{'kind': kind, 'recipients': user.email, 'subject': subject, 'html': html, 'status': 'pending',
+                     'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+                    for user, html in islice(rendered, batch_size)]
+            if not rows:
+                return total
+            db.session.execute(insert(EmailOutbox), rows)
+            db.session.commit()
+            total += len(rows)
+            _wake(app)
+
+    @staticmethod
+    def send_pending(batch_size=None):
+        """领取一批到期的邮件，用同一个 SMTP 连接发送并记录结果，返回领取的邮件数"""
+        emails = EmailService._claim(batch_size or current_app.config.get('MAIL_OUTBOX_BATCH', 50))
+        if not emails:
+            return 0
+
+        try:
+            with mail.connect() as conn:
+                for email, message in EmailService._messages(emails):
+                    try:
+                        conn.send(message)
+                    except MESSAGE_ERRORS as e:
+                        EmailService._retry(email, e)
+                        continue
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+                    email.claimed_by = None
+        except Exception as e:
+            # 连接失败或中途断开：这一批里还没发出去的邮件都按失败处理
+            for email in emails:
+                if email.status == 'sending':
+                    EmailService._retry(email, e)
+        db.session.commit()
+
+        sent = sum(1 for email in emails if email.status == 'sent')
+        logger.info(f"✅ 邮件已发送 {sent}/{len(emails)} 封")
+        return len(emails)
+
+    @staticmethod
+    def _messages(emails):
+        """生成器：发送到哪一封才构造哪一封的 Message"""
+        for email in emails:
+            yield email, Message(subject=email.subject, recipients=email.get_recipients(), html=email.html)
+
+    @staticmethod
+    def _claim(batch_size):
+        """
+        把到期的 pending 邮件和发送超时的 sending 邮件标记为本批次 (claimed_by)，多个线程/进程不会重复领取
+        每次领取都计入一次尝试
+        """
+        now = datetime.utcnow()
+        max_attempts = current_app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        stale = now - timedelta(seconds=current_app.config.get('MAIL_OUTBOX_TIMEOUT', 300))
+
+        # 发送超时且已用完重试次数的邮件不再领取
+        EmailOutbox.query.filter(
+            EmailOutbox.status == 'sending',
+            EmailOutbox.claimed_at < stale,
+            EmailOutbox.attempts >= max_attempts
+        ).update({'status': 'failed', 'claimed_by': None, 'last_error': '发送超时'}, synchronize_session=False)
+
+        due = or_(
+            and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < stale)
+        )
+        ids = [email_id for (email_id,) in
+               db.session.query(EmailOutbox.id).filter(due).order_by(EmailOutbox.id).limit(batch_size)]
+        if not ids:
+            db.session.commit()
+            return []
+
+        # 条件更新：别的线程已经领走的邮件不满足 due，不会被再次领取
+        token = uuid.uuid4().hex
+        EmailOutbox.query.filter(EmailOutbox.id.in_(ids), due).update({
+            'status': 'sending',
+            'claimed_by': token,
+            'claimed_at': now,
+            'attempts': EmailOutbox.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        return EmailOutbox.query.filter_by(claimed_by=token, status='sending').order_by(EmailOutbox.id).all()
+
+    @staticmethod
+    def _retry(email, error):
+        """记录失败原因，按指数退避安排下一次发送，重试次数用完或永久错误时标记为 failed"""
+        email.last_error = str(error)[:500]
+        email.claimed_by = None
+        if _is_permanent(error) or email.attempts >= current_app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5):
+            email.status = 'failed'
+            logger.error(f"❌ 邮件发送失败 (id={email.id}, 第 {email.attempts} 次): {error}")
+            return
+
+        delay = min(current_app.config.get('MAIL_OUTBOX_RETRY_DELAY', 30) * 2 ** (email.attempts - 1),
+                    current_app.config.get('MAIL_OUTBOX_MAX_DELAY', 3600))
+        email.status = 'pending'
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logger.warning(f"邮件发送失败，{delay} 秒后重试 (id={email.id}, 第 {email.attempts} 次): {error}")
 
     @staticmethod
     def send_welcome_email(user):
@@ -25,22 +263,13 @@ class EmailService:
         if not user.email:
             return
 
-        app = current_app._get_current_object()
-
         try:
             # 🔥 核心修改：使用 render_template 渲染 HTML 文件
             # 这样不仅代码整洁，而且在模板中使用的 url_for(..., _external=True) 会自动生成正确的域名链接
             html_body = render_template('email/welcome.html', user=user)
-
-            msg = Message(
-                subject="🎉 欢迎加入 Health Assistant！",
-                recipients=[user.email],
-                html=html_body
-            )
-
-            thread = Thread(target=EmailService.send_async_email, args=(app, msg))
-            thread.start()
+            EmailService.enqueue('welcome', [user.email], "🎉 欢迎加入 Health Assistant！", html_body)
         except Exception as e:
+            db.session.rollback()
             logger.error(f"构建欢迎邮件失败: {e}", exc_info=True)
 
     @staticmethod
@@ -49,19 +278,10 @@ class EmailService:
         if not user.email:
             return
 
-        app = current_app._get_current_object()
-
         try:
             # 🔥 核心修改：传入 token，由模板负责生成链接
             html_body = render_template('email/reset_password.html', user=user, token=token)
-
-            msg = Message(
-                subject="🔒 重置您的密码 - Health Assistant",
-                recipients=[user.email],
-                html=html_body
-            )
-
-            thread = Thread(target=EmailService.send_async_email, args=(app, msg))
-            thread.start()
+            EmailService.enqueue('reset_password', [user.email], "🔒 重置您的密码 - Health Assistant", html_body)
         except Exception as e:
-            logger.error(f"构建重置密码邮件失败: {e}", exc_info=True)
\ No newline at end of file
+            db.session.rollback()
+            logger.error(f"构建重置密码邮件失败: {e}", exc_info=True)
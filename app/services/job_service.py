@@ -0,0 +1,221 @@
+# app/services/job_service.py
+"""
+AI 后台任务队列
+- 接口只负责提交任务并立即返回 job_id，耗时的 AI 调用在进程内的固定大小线程池里执行，
+  不会占满 Web worker；任务状态和结果写在 ai_job 表里，任何 worker 都能查询
+- 幂等的任务 (DEDUP_KINDS) 按 用户 + 类型 + 参数 去重：同样的请求在执行中时重复提交 (例如连点两次按钮)
+  直接返回已有任务；去重靠 ai_job.dedup_key 唯一约束，多个 gunicorn worker 之间同样有效
+- 执行超时 (AI_JOB_TIMEOUT) 从任务开始执行 (started_at) 算起，排队的时间不计入；排队超过
+  AI_JOB_QUEUE_TIMEOUT 仍未执行的任务 (例如进程重启丢失的任务) 标记为失败，之后也不会再执行
+- 任务状态只按 pending → running → done / error 前进：状态用带条件的 UPDATE 修改，
+  已经结束 (包括被判定超时) 的任务不会被执行线程的结果覆盖
+- 已结束的任务保留 AI_JOB_RETENTION_DAYS 天，之后由 cleanup 删除 (执行任务的线程每小时顺带清理一次)
+"""
+from app.models import AIJob
+from app.extensions import db
+from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+# 重复执行结果相同的任务类型；聊天每条消息都要得到回复，不去重
+DEDUP_KINDS = ('assessment', 'quick_plan')
+
+CLEANUP_INTERVAL = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0  # 本进程已提交但还没执行完的任务数
+_last_cleanup = 0.0
+
+
+class QueueFullError(Exception):
+    """排队的任务已达上限"""
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=current_app.config.get('AI_JOB_WORKERS', 4),
+                                           thread_name_prefix='ai-job')
+        return _executor
+
+
+class JobService:
+    @staticmethod
+    def submit(user_id, kind, func, *args, **kwargs):
+        """
+        提交后台任务，func(*args, **kwargs) 在应用上下文中执行，返回值 (dict) 作为任务结果
+        返回 AIJob；DEDUP_KINDS 中的任务以同样的参数正在执行时返回已有任务
+        队列已满时抛出 QueueFullError
+        """
+        global _pending
+
+        dedup_key = JobService._dedup_key(user_id, kind, args, kwargs) if kind in DEDUP_KINDS else None
+        if dedup_key:
+            existing = JobService._find_active(dedup_key)
+            if existing:
+                return existing
+
+        max_pending = current_app.config.get('AI_JOB_MAX_PENDING', 50)
+        with _executor_lock:
+            if _pending >= max_pending:
+                raise QueueFullError()
+            _pending += 1
+
+        job = AIJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind, status='pending', dedup_key=dedup_key)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 另一个 worker 刚刚提交了同样的任务
+            db.session.rollback()
+            JobService._release()
+            existing = JobService._find_active(dedup_key)
+            if existing:
+                return existing
+            raise
+        except Exception:
+            db.session.rollback()
+            JobService._release()
+            raise
+
+        app = current_app._get_current_object()
+        try:
+            _get_executor().submit(JobService._run, app, job.id, func, args, kwargs)
+        except Exception:
+            JobService._release()
+            raise
+        return job
+
+    @staticmethod
+    def get(job_id, user_id):
+        """查询任务 (只能查询自己的任务)，超时未完成的任务标记为失败"""
+        job = AIJob.query.filter_by(id=job_id, user_id=user_id).first()
+        if job and job.status in ACTIVE_STATUSES and JobService._is_stale(job):
+            JobService._expire(job)
+        return job
+
+    @staticmethod
+    def to_dict(job):
+        return {
+            'status': 'success',
+            'job_id': job.id,
+            'kind': job.kind,
+            'state': job.status,
+            'result': job.get_result()
+        }
+
+    @staticmethod
+    def cleanup(days=None):
+        """删除 days 天前创建的任务 (默认 AI_JOB_RETENTION_DAYS)，返回删除的行数"""
+        days = current_app.config.get('AI_JOB_RETENTION_DAYS', 7) if days is None else days
+        deleted = AIJob.query.filter(
+            AIJob.created_at < datetime.utcnow() - timedelta(days=days)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    @staticmethod
+    def _dedup_key(user_id, kind, args, kwargs):
+        payload = json.dumps([user_id, kind, args, kwargs], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _find_active(dedup_key):
+        job = AIJob.query.filter_by(dedup_key=dedup_key).first()
+        if not job:
+            return None
+        # 进程重启等原因遗留的任务标记为失败，释放去重键
+        if JobService._is_stale(job):
+            JobService._expire(job)
+            return None
+        return job
+
+    @staticmethod
+    def _is_stale(job):
+        """执行中的任务从开始执行算起超过 AI_JOB_TIMEOUT，排队的任务从提交算起超过 AI_JOB_QUEUE_TIMEOUT"""
+        now = datetime.utcnow()
+        if job.status == 'running':
+            timeout = current_app.config.get('AI_JOB_TIMEOUT', 300)
+            started_at = job.started_at or job.created_at
+            return started_at is not None and started_at < now - timedelta(seconds=timeout)
+        timeout = current_app.config.get('AI_JOB_QUEUE_TIMEOUT', 3600)
+        return job.created_at is not None and job.created_at < now - timedelta(seconds=timeout)
+
+    @staticmethod
+    def _expire(job):
+        """把超时的任务标记为失败；任务刚好在这期间开始执行或结束时不做修改"""
+        JobService._finish(job.id, job.status, 'error', {'status': 'error', 'message': '任务超时，请稍后重试'})
+        db.session.commit()
+
+    @staticmethod
+    def _run(app, job_id, func, args, kwargs):
+        with app.app_context():
+            try:
+                # 排队期间已被判定超时的任务不再执行
+                started = AIJob.query.filter_by(id=job_id, status='pending').update(
+                    {'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+                if not started:
+                    return
+
+                try:
+                    result = func(*args, **kwargs)
+                    status = 'done'
+                except Exception as e:
+                    logger.error(f"AI Job Error: {e}", exc_info=True)
+                    db.session.rollback()
+                    result = {'status': 'error', 'message': 'AI 助手暂时有点累，请稍后再试。'}
+                    status = 'error'
+
+                if not JobService._finish(job_id, 'running', status, result):
+                    logger.warning(f"AI Job {job_id} 已超时结束，丢弃执行结果")
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"AI Job Save Error: {e}", exc_info=True)
+                db.session.rollback()
+            finally:
+                JobService._release()
+            JobService._maybe_cleanup()
+
+    @staticmethod
+    def _maybe_cleanup():
+        """每个进程每 CLEANUP_INTERVAL 秒最多清理一次过期任务"""
+        global _last_cleanup
+        with _executor_lock:
+            if time.monotonic() - _last_cleanup < CLEANUP_INTERVAL:
+                return
+            _last_cleanup = time.monotonic()
+        try:
+            JobService.cleanup()
+        except Exception as e:
+            logger.error(f"AI Job Cleanup Error: {e}", exc_info=True)
+            db.session.rollback()
+
+    @staticmethod
+    def _finish(job_id, expected, status, result):
+        """任务仍处于 expected 状态时写入结果并结束，返回是否写入 (已经结束的任务不会被覆盖)"""
+        return AIJob.query.filter_by(id=job_id, status=expected).update({
+            'status': status,
+            'result': json.dumps(result, ensure_ascii=False),
+            'finished_at': datetime.utcnow(),
+            'dedup_key': None,  # 任务结束后同样的请求可以再次提交
+        }, synchronize_session=False) > 0
+
+    @staticmethod
+    def _release():
+        global _pending
+        with _executor_lock:
+            _pending -= 1
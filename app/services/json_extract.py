@@ -0,0 +1,118 @@
+# app/services/json_extract.py
+"""
+从 AI 的完整输出中提取 JSON 结果
+- 模型经常在 JSON 前后加说明文字、```json 代码块标记，或者正文里本身带有花括号
+- 一次扫描：先用正则跳到像对象开头的 { (后面紧跟字段名或 })，再只在 { } " \\ 这几个字符上
+  跟踪层级和字符串状态，找到第一个完整的顶层对象再整体解析；正文里的花括号和引号不会被当成 JSON 的一部分
+- 某个 { 一直没闭合 (输出被截断，或者正文里的引号打乱了配对) 时从下一个 { 继续找，后面完整的对象仍然能取到
+- 解析结果再按各自的 schema (聊天计划 / 健康评估) 检查字段和类型
+"""
+import json
+import re
+
+_TOKEN_RE = re.compile(r'[{}"\\]')
+
+# JSON 对象的开头：{ 后面紧跟字段名或 }
+_OBJECT_START_RE = re.compile(r'\{\s*["}]')
+
+# 允许字符串里出现未转义的换行等控制字符 (模型输出中很常见)
+_decoder = json.JSONDecoder(strict=False)
+
+
+def extract_json_object(text):
+    """返回文本中第一个能解析的顶层 JSON 对象 (dict)，没有则返回 None"""
+    if not text:
+        return None
+    pos = 0
+    # 已经确认扫到结尾也不会闭合的 { 的位置，重新找的时候直接跳过，不重复扫描
+    unclosed = set()
+    while True:
+        start, end = _find_object(text, pos, unclosed)
+        if start is None:
+            return None
+        if end is None:
+            # 没闭合：从这个 { 后面的下一个 { 继续找
+            pos = start + 1
+            continue
+        data = _loads(text[start:end])
+        if isinstance(data, dict):
+            return data
+        # 看起来像 JSON 但格式错误，跳过整段继续往后找
+        pos = end
+
+
+def validate(data, schema):
+    """
+    按 schema 检查并整理解析出的对象，只保留 schema 中列出的字段
+    schema: {字段: {"type": 类型, "required": 是否必填, "default": 默认值 (可调用时调用生成), "items": 列表元素允许的类型}}
+    必填字段缺失或类型不对时返回 None；可选字段缺失或类型不对时使用默认值；列表中类型不对的元素直接丢弃
+    """
+    if not isinstance(data, dict):
+        return None
+
+    cleaned = {}
+    for field, rule in schema.items():
+        value = data.get(field)
+        if not isinstance(value, rule['type']):
+            if rule.get('required'):
+                return None
+            default = rule.get('default')
+            value = default() if callable(default) else default
+        elif 'items' in rule:
+            value = [item for item in value if isinstance(item, rule['items'])]
+        cleaned[field] = value
+    return cleaned
+
+
+def parse_ai_json(text, schema):
+    """提取并校验，任何一步失败都返回 None"""
+    return validate(extract_json_object(text), schema)
+
+
+def _find_object(text, pos, unclosed):
+    """
+    从 pos 开始找下一个花括号配对完整的顶层对象，返回 (开始位置, 结束位置)；
+    扫到结尾仍未闭合时返回 (开始位置, None)，没有对象时返回 (None, None)
+    对象外面只找像对象开头的 { (后面紧跟字段名或 })，正文里的 {占位符}、引号都直接跳过
+    unclosed 中的位置直接跳过；没闭合时把扫描中所有没闭合的 { 加进 unclosed
+    (从这些位置重新扫描，字符串状态和层级变化完全相同，同样不会闭合)
+    """
+    match = _OBJECT_START_RE.search(text, pos)
+    while match and match.start() in unclosed:
+        match = _OBJECT_START_RE.search(text, match.start() + 1)
+    if not match:
+        return None, None
+    start = match.start()
+
+    # 还没闭合的 { 的位置，层级就是它的长度
+    opened = []
+    in_string = False
+    skip_until = -1
+    for token in _TOKEN_RE.finditer(text, start):
+        i = token.start()
+        if i < skip_until:
+            # 被反斜杠转义的字符
+            continue
+        c = token.group()
+        if in_string:
+            if c == '\\':
+                skip_until = i + 2
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '{':
+            opened.append(i)
+        elif c == '}':
+            opened.pop()
+            if not opened:
+                return start, i + 1
+    unclosed.update(opened)
+    return start, None
+
+
+def _loads(candidate):
+    try:
+        return _decoder.decode(candidate)
+    except ValueError:
+        return None
@@ -0,0 +1,108 @@
+# app/services/json_stream.py
+"""
+流式 JSON 增量解析
+AI 以 {"reply": "...", "tasks": [...]} 的格式逐段返回，reply 字段在完整 JSON 到达之前就可以边收边显示
+"""
+import json
+
+
+class FieldStreamParser:
+    """
+    逐段喂入 JSON 文本，实时吐出顶层某个字符串字段 (默认 reply) 的解码后内容
+    只做词法层面的状态跟踪 (层级/字符串/转义)，不要求 JSON 已经完整；
+    字段前后的其他内容 (例如 ```json 标记) 会被忽略，完整文本可通过 text 取回再做整体解析
+    """
+
+    def __init__(self, field='reply'):
+        self.field = field
+        self.done = False  # 字段已经读完
+        self._chunks = []
+        self._depth = 0
+        self._in_string = False
+        self._is_key = False
+        self._capturing = False
+        self._expect_value = False
+        self._key = []
+        self._last_key = None
+        self._escape = ''
+        self._high_surrogate = ''
+
+    @property
+    def text(self):
+        """目前为止收到的完整原文"""
+        return ''.join(self._chunks)
+
+    def feed(self, chunk):
+        """喂入一段文本，返回这段文本中新解析出的字段内容 (可能为空字符串)"""
+        self._chunks.append(chunk)
+        out = []
+        for c in chunk:
+            if self._in_string:
+                self._string_char(c, out)
+            else:
+                self._structural_char(c)
+        return ''.join(out)
+
+    def _string_char(self, c, out):
+        if self._escape:
+            self._escape += c
+            if self._escape[1] == 'u' and len(self._escape) < 6:
+                return
+            self._emit(self._decode_escape(self._escape), out)
+            self._escape = ''
+        elif c == '\\':
+            self._escape = c
+        elif c == '"':
+            self._in_string = False
+            if self._is_key:
+                self._last_key = ''.join(self._key)
+                self._is_key = False
+            elif self._capturing:
+                self._capturing = False
+                self.done = True
+        else:
+            self._emit(c, out)
+
+    def _structural_char(self, c):
+        at_top = self._depth == 1
+        if c == '"':
+            self._in_string = True
+            if at_top and not self._expect_value:
+                self._is_key = True
+                self._key = []
+            elif at_top and self._expect_value:
+                self._capturing = self._last_key == self.field and not self.done
+                self._expect_value = False
+        elif c == ':' and at_top:
+            self._expect_value = True
+        elif c == ',' and at_top:
+            self._expect_value = False
+        elif c in '{[':
+            if at_top:
+                self._expect_value = False
+            self._depth += 1
+        elif c in '}]':
+            self._depth = max(self._depth - 1, 0)
+        elif at_top and not c.isspace():
+            # 数字/true/false/null 等标量值
+            self._expect_value = False
+
+    def _emit(self, s, out):
+        if self._is_key:
+            self._key.append(s)
+        elif self._capturing:
+            out.append(s)
+
+    def _decode_escape(self, escape):
+        try:
+            s = json.loads('"' + escape + '"')
+        except ValueError:
+            return ''
+        # 😀 这样的代理对要两段拼起来才是一个字符
+        if '\ud800' <= s <= '\udbff':
+            self._high_surrogate = s
+            return ''
+        if self._high_surrogate and '\udc00' <= s <= '\udfff':
+            s = (self._high_surrogate + s).encode('utf-16', 'surrogatepass').decode('utf-16')
+        self._high_surrogate = ''
+        return s
@@ -1,80 +1,115 @@
 from app.models import User, HealthRecord, HealthPlan, PlanTask # 引入新模型
 from app.extensions import db
-from app.services.ai_service import call_deepseek_advisor
+from app.services.ai_service import call_deepseek_advisor, stream_deepseek_advisor
+from app.services.json_stream import FieldStreamParser
+from app.services.json_extract import parse_ai_json
+from app.services.resilience import ServiceUnavailable
+from app.services.context_builder import build_messages
+from flask import current_app
+from sqlalchemy import insert
 from datetime import datetime
-import json
-import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 固定的系统提示词：不包含任何用户信息，每次请求完全相同，便于模型服务端缓存这段前缀
+CHAT_SYSTEM_PROMPT = """你是一位资深的私人健康管理专家，正在为用户提供咨询。用户档案会在下一条系统消息中给出。
+
+【输出格式要求】
+请务必返回严格的 JSON 格式，不要包含 ```json 代码块标记。格式如下：
+{
+    "reply": "这里写给用户的回复...",
+    "tasks": [
+        {"title": "建议任务1", "done": false},
+        {"title": "建议任务2", "done": false}
+    ]
+}
+如果不需要生成具体任务，tasks 数组请留空。"""
+
+# AI 回复的字段要求 (任务可以是 {"title": ...} 或直接是字符串)
+CHAT_RESPONSE_SCHEMA = {
+    'reply': {'type': str, 'default': '无法解析回复内容'},
+    'tasks': {'type': list, 'default': list, 'items': (dict, str)},
+}
 
 class PlanService:
     @staticmethod
     def generate_health_plan(user_id, user_message, history=None, save_as_plan=False):
+        messages, prompt_tokens = PlanService.build_chat_messages(user_id, user_message, history)
+
+        # 4. 调用 AI (保持不变)
+        ai_response_text = call_deepseek_advisor(messages, user_id=user_id)
+        if not ai_response_text:
+            return {"reply": "服务繁忙，请稍后再试。", "updated_plan": False, "prompt_tokens": prompt_tokens}
+
+        result = PlanService.save_chat_result(user_id, ai_response_text, save_as_plan)
+        result["prompt_tokens"] = prompt_tokens
+        return result
+
+    @staticmethod
+    def stream_health_plan(user_id, user_message, history=None, save_as_plan=False):
+        """
+        流式版本：先逐段 yield ('delta', 回复文本)，AI 输出结束后解析任务并保存，
+        最后 yield ('done', {"reply", "updated_plan", "prompt_tokens"})
+        """
+        messages, prompt_tokens = PlanService.build_chat_messages(user_id, user_message, history)
+        busy = {"reply": "服务繁忙，请稍后再试。", "updated_plan": False, "prompt_tokens": prompt_tokens}
+
+        parser = FieldStreamParser('reply')
+        try:
+            for chunk in stream_deepseek_advisor(messages, user_id=user_id):
+                delta = parser.feed(chunk)
+                if delta:
+                    yield 'delta', delta
+        except ServiceUnavailable:
+            # 上游不可用 (熔断/排队超时)，与非流式接口一样提示服务繁忙
+            yield 'done', busy
+            return
+
+        if not parser.text:
+            yield 'done', busy
+            return
+        result = PlanService.save_chat_result(user_id, parser.text, save_as_plan)
+        result["prompt_tokens"] = prompt_tokens
+        yield 'done', result
+
+    @staticmethod
+    def build_chat_messages(user_id, user_message, history=None):
+        """
+        组装发给 AI 的消息，返回 (messages, 估算的 prompt token 数)
+        固定系统提示词 -> 用户档案 -> 按 token 预算裁剪后的对话历史 -> 本次提问
+        历史预算可通过 CHAT_HISTORY_TOKEN_BUDGET / CHAT_HISTORY_MAX_MESSAGES 配置
+        """
         user = User.query.get(user_id)
         last_record = HealthRecord.query.filter_by(user_id=user.id) \
             .order_by(HealthRecord.date.desc()).first()
 
         # 1. 构建画像 (保持不变)
         profile_text = PlanService._build_profile_text(user, last_record)
+        profile = f"用户【{user.nickname}】正在咨询。\n【用户全维档案】\n{profile_text}"
 
-        # 2. 构建 Prompt (保持不变)
-        system_prompt = f"""
-        你是一位资深的私人健康管理专家。用户【{user.nickname}】正在咨询。
-        【用户全维档案】
-        {profile_text}
-
-        【输出格式要求】
-        请务必返回严格的 JSON 格式，不要包含 ```json 代码块标记。格式如下：
-        {{
-            "reply": "这里写给用户的回复...",
-            "tasks": [
-                {{"title": "建议任务1", "done": false}},
-                {{"title": "建议任务2", "done": false}}
-            ]
-        }}
-        如果不需要生成具体任务，tasks 数组请留空。
-        """
-
-        # 3. 组装消息 (保持不变)
-        messages = [{"role": "system", "content": system_prompt}]
-        if history and isinstance(history, list):
-            valid_history = [h for h in history[-6:] if h.get('role') in ['user', 'assistant']]
-            messages.extend(valid_history)
-        messages.append({"role": "user", "content": user_message})
-
-        # 4. 调用 AI (保持不变)
-        ai_response_text = call_deepseek_advisor(messages)
-        if not ai_response_text:
-            return {"reply": "服务繁忙，请稍后再试。", "updated_plan": False}
+        # 2. 组装消息：历史按 token 预算从新到旧保留
+        messages, prompt_tokens = build_messages(
+            CHAT_SYSTEM_PROMPT,
+            profile,
+            history,
+            user_message,
+            history_budget=current_app.config.get('CHAT_HISTORY_TOKEN_BUDGET', 1500),
+            max_history=current_app.config.get('CHAT_HISTORY_MAX_MESSAGES', 6)
+        )
+        logger.info(f"Chat prompt: user={user_id} messages={len(messages)} tokens≈{prompt_tokens}")
+        return messages, prompt_tokens
 
+    @staticmethod
+    def save_chat_result(user_id, ai_response_text, save_as_plan=False):
+        """解析 AI 的完整输出，有任务 (或要求保存) 时保存为新计划"""
         # 5. 解析结果 (保持不变)
         content_part, tasks_list = PlanService._parse_ai_response(ai_response_text)
 
-        # 6. 保存逻辑 (🔥 重大修改：关系型存储)
+        # 6. 保存逻辑：计划和任务各一条 INSERT 批量写入
         updated_plan = False
         if (tasks_list and len(tasks_list) > 0) or save_as_plan:
-            # 6.1 先创建主计划
-            new_plan = HealthPlan(
-                user_id=user.id,
-                goal="AI 深度定制计划",
-                content=content_part
-                # tasks_json 留空或存个备份均可
-            )
-            db.session.add(new_plan)
-            # 6.2 Flush 以获取 new_plan.id (此时还没提交事务)
-            db.session.flush()
-
-            # 6.3 循环创建子任务
-            for t_data in tasks_list:
-                # 确保解析出的 title 存在
-                title = t_data.get('title') if isinstance(t_data, dict) else str(t_data)
-                if title:
-                    new_task = PlanTask(
-                        plan_id=new_plan.id,
-                        title=title,
-                        is_done=False
-                    )
-                    db.session.add(new_task)
-
-            # 6.4 统一提交
+            PlanService.create_plan_with_tasks(user_id, "AI 深度定制计划", content_part, tasks_list)
             db.session.commit()
             updated_plan = True
 
@@ -83,6 +118,43 @@ class PlanService:
             "updated_plan": updated_plan
         }
 
+    @staticmethod
+    def create_plan_with_tasks(user_id, goal, content, tasks):
+        """
+        批量写入一个计划及其全部任务：计划一条 INSERT，任务一条批量 INSERT (executemany)，
+        不逐个创建 ORM 对象；返回新计划的 id，调用方负责 commit
+        """
+        result = db.session.execute(insert(HealthPlan).values(user_id=user_id, goal=goal, content=content))
+        plan_id = result.inserted_primary_key[0]
+
+        rows = PlanService.task_rows(plan_id, tasks)
+        if rows:
+            db.session.execute(insert(PlanTask), rows)
+        return plan_id
+
+    @staticmethod
+    def task_rows(plan_id, tasks, created_at=None, default_title=None):
+        """
+        把 AI 输出 / 旧 tasks_json 中的任务转换成 plan_task 的批量插入参数
+        任务可以是 {"title": ..., "done": ...} 或直接是字符串；没有标题的任务跳过
+        """
+        created_at = created_at or datetime.utcnow()
+        rows = []
+        for task in tasks or []:
+            if isinstance(task, dict):
+                title, is_done = task.get('title', default_title), bool(task.get('done', False))
+            else:
+                title, is_done = task, False
+            if not title:
+                continue
+            rows.append({
+                'plan_id': plan_id,
+                'title': str(title)[:200],
+                'is_done': is_done,
+                'created_at': created_at
+            })
+        return rows
+
     # ... _build_profile_text 和 _parse_ai_response 辅助方法保持不变 ...
     @staticmethod
     def _build_profile_text(user, record):
@@ -93,15 +165,8 @@ class PlanService:
 
     @staticmethod
     def _parse_ai_response(full_text):
-        try:
-            data = json.loads(full_text)
-        except json.JSONDecodeError:
-            clean_text = re.sub(r'^```json\s*|\s*```$', '', full_text, flags=re.MULTILINE | re.DOTALL).strip()
-            try:
-                data = json.loads(clean_text)
-            except json.JSONDecodeError:
-                return full_text, []
-
-        reply = data.get("reply", "无法解析回复内容")
-        tasks = data.get("tasks", [])
-        return reply, tasks
\ No newline at end of file
+        """解析 AI 的完整输出，返回 (回复, 任务列表)；没有可用的 JSON 时把整段输出当作回复"""
+        data = parse_ai_json(full_text, CHAT_RESPONSE_SCHEMA)
+        if data is None:
+            return full_text, []
+        return data["reply"], data["tasks"]
\ No newline at end of file
@@ -0,0 +1,81 @@
+# app/services/post_service.py
+from app.models import Post, PostLike, Comment
+from app.extensions import db
+from sqlalchemy import func, select, or_
+from sqlalchemy.exc import IntegrityError
+
+
+class PostService:
+    @staticmethod
+    def toggle_like(user_id, post_id):
+        """
+        切换点赞状态：先尝试删除，删不到再插入，不需要先 SELECT
+        计数用原子 UPDATE 维护，避免并发点赞时读后写覆盖
+        返回: (liked, like_count)
+        """
+        removed = PostLike.query.filter_by(user_id=user_id, post_id=post_id) \
+            .delete(synchronize_session=False)
+
+        if removed:
+            liked = False
+            PostService._bump(post_id, like_count=-removed)
+        else:
+            liked = True
+            try:
+                # 唯一约束 (post_id, user_id) 保证同一用户只能点赞一次
+                with db.session.begin_nested():
+                    db.session.add(PostLike(user_id=user_id, post_id=post_id))
+                PostService._bump(post_id, like_count=1)
+            except IntegrityError:
+                # 并发的另一个请求已经点过赞，计数已由它更新
+                pass
+
+        db.session.commit()
+        count = db.session.query(Post.like_count).filter(Post.id == post_id).scalar()
+        return liked, count or 0
+
+    @staticmethod
+    def add_comment(user_id, post_id, content):
+        """添加评论并原子地增加评论计数 (调用方负责 commit)"""
+        comment = Comment(user_id=user_id, post_id=post_id, content=content)
+        db.session.add(comment)
+        PostService._bump(post_id, comment_count=1)
+        return comment
+
+    @staticmethod
+    def reconcile_counters(post_ids=None, chunk_size=1000):
+        """
+        修复计数漂移：按 id 分块，用子查询重新统计 like_count / comment_count
+        只更新与实际数量不一致的帖子，返回被修复的帖子数
+        """
+        like_total = select(func.count(PostLike.id)).where(PostLike.post_id == Post.id).scalar_subquery()
+        comment_total = select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+        drifted = or_(Post.like_count != like_total, Post.comment_count != comment_total)
+
+        if post_ids is not None:
+            ids = sorted(set(post_ids))
+            chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        else:
+            max_id = db.session.query(func.max(Post.id)).scalar() or 0
+            chunks = [(start, start + chunk_size) for start in range(0, max_id + 1, chunk_size)]
+
+        repaired = 0
+        for chunk in chunks:
+            query = Post.query.filter(drifted)
+            if post_ids is not None:
+                query = query.filter(Post.id.in_(chunk))
+            else:
+                query = query.filter(Post.id >= chunk[0], Post.id < chunk[1])
+
+            repaired += query.update(
+                {Post.like_count: like_total, Post.comment_count: comment_total},
+                synchronize_session=False
+            )
+            db.session.commit()
+        return repaired
+
+    @staticmethod
+    def _bump(post_id, **deltas):
+        """原子更新计数：UPDATE post SET col = col + delta WHERE id = ..."""
+        values = {getattr(Post, col): getattr(Post, col) + delta for col, delta in deltas.items()}
+        Post.query.filter(Post.id == post_id).update(values, synchronize_session=False)
@@ -0,0 +1,330 @@
+# app/services/resilience.py
+"""
+AI 调用的容错层
+- 并发限制：全局 + 每个用户各自的并发上限，排队超时直接失败，不让 worker 无限等待
+- 截止时间：每次调用有总时限，每次尝试的超时不超过剩余时间
+- 重试：指数退避 + 随机抖动，并受令牌桶重试预算约束 (上游整体故障时不会因重试放大流量)
+- 熔断：连续失败达到阈值后快速失败，冷却后放行一个探测请求，成功即恢复
+"""
+from flask import current_app
+from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import random
+import threading
+import time
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# 值得重试的错误：超时、连接失败、限流、上游 5xx
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class ServiceUnavailable(Exception):
+    """熔断中 / 排队超时 / 超过截止时间 / 重试预算用尽，调用方应使用"服务繁忙"兜底"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """是否放行本次调用；半开状态下同一时间只放行一个探测请求"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"AI circuit breaker opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """探测请求没有得出结论 (例如参数错误) 时归还探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self._state(), 'consecutive_failures': self._failures}
+
+
+class RetryBudget:
+    """
+    令牌桶重试预算：每次正常调用存入 ratio 个令牌，每次重试消耗 1 个
+    例如 ratio=0.2 表示重试流量最多约为正常流量的 20%，另有每秒 min_per_sec 的保底额度
+    """
+
+    def __init__(self, ratio=0.2, min_per_sec=0.5, capacity=10):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.min_per_sec)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return round(self._tokens, 2)
+
+
+class ConcurrencyLimiter:
+    """全局并发上限 + 每个用户的并发上限，同时统计排队数和进行中的调用数"""
+
+    def __init__(self, max_concurrency=8, per_user=2, queue_timeout=5):
+        self.max_concurrency = max_concurrency
+        self.per_user = per_user
+        self.queue_timeout = queue_timeout
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._user_in_flight = defaultdict(int)
+        self.waiting = 0
+        self.in_flight = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self, user_id, deadline):
+        # 同一用户的并发超过上限时直接拒绝，不占用全局排队位置
+        with self._lock:
+            if user_id is not None and self._user_in_flight[user_id] >= self.per_user:
+                self.rejected += 1
+                raise ServiceUnavailable('too many concurrent requests for user')
+            if user_id is not None:
+                self._user_in_flight[user_id] += 1
+            self.waiting += 1
+
+        acquired = False
+        try:
+            timeout = max(0, min(self.queue_timeout, deadline - time.monotonic()))
+            acquired = self._global.acquire(timeout=timeout)
+            with self._lock:
+                self.waiting -= 1
+                if acquired:
+                    self.in_flight += 1
+                else:
+                    self.rejected += 1
+            if not acquired:
+                raise ServiceUnavailable('queue timeout')
+            yield
+        finally:
+            with self._lock:
+                if acquired:
+                    self.in_flight -= 1
+                if user_id is not None:
+                    self._user_in_flight[user_id] -= 1
+                    if not self._user_in_flight[user_id]:
+                        del self._user_in_flight[user_id]
+            if acquired:
+                self._global.release()
+
+
+class ResiliencePolicy:
+    def __init__(self, config):
+        self.deadline = config.get('AI_DEADLINE', 60)
+        self.attempt_timeout = config.get('AI_ATTEMPT_TIMEOUT', 30)
+        self.max_attempts = config.get('AI_MAX_ATTEMPTS', 3)
+        self.backoff_base = config.get('AI_BACKOFF_BASE', 0.5)
+        self.backoff_cap = config.get('AI_BACKOFF_CAP', 4)
+
+        self.limiter = ConcurrencyLimiter(
+            max_concurrency=config.get('AI_MAX_CONCURRENCY', 8),
+            per_user=config.get('AI_PER_USER_CONCURRENCY', 2),
+            queue_timeout=config.get('AI_QUEUE_TIMEOUT', 5)
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get('AI_BREAKER_THRESHOLD', 5),
+            reset_timeout=config.get('AI_BREAKER_RESET', 30)
+        )
+        self.budget = RetryBudget(
+            ratio=config.get('AI_RETRY_BUDGET_RATIO', 0.2),
+            min_per_sec=config.get('AI_RETRY_BUDGET_MIN_PER_SEC', 0.5)
+        )
+
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+
+    def call(self, attempt, user_id=None):
+        """
+        按策略执行 attempt(timeout)，timeout 为本次尝试可用的秒数
+        返回 attempt 的返回值；失败时抛出最后一次的异常或 ServiceUnavailable
+        """
+        deadline = time.monotonic() + self.deadline
+        self._count('calls')
+        with self._guard(user_id, deadline):
+            return self._attempts(attempt, deadline)
+
+    def stream(self, attempt, user_id=None):
+        """
+        流式版本：attempt(timeout) 返回可迭代的片段
+        只在还没收到任何片段时重试，已经开始输出后出错直接抛出，同样计入熔断器的失败次数
+        出错或调用方提前停止读取时关闭上游的流，并发名额在退出 _guard 时归还
+        """
+        deadline = time.monotonic() + self.deadline
+        self._count('calls')
+        with self._guard(user_id, deadline):
+            def first_chunk(timeout):
+                iterator = iter(attempt(timeout))
+                return iterator, next(iterator, None)
+
+            # 整个流读完才算成功：只看第一个片段的话，总在中途断开的上游永远不会触发熔断
+            iterator, chunk = self._attempts(first_chunk, deadline, record_success=False)
+            try:
+                while chunk is not None:
+                    yield chunk
+                    chunk = next(iterator, None)
+            except Exception:
+                self.breaker.record_failure()
+                self._count('failures')
+                raise
+            else:
+                self.breaker.record_success()
+                self._count('successes')
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close:
+                    close()
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'queue_depth': self.limiter.waiting,
+            'in_flight': self.limiter.in_flight,
+            'max_concurrency': self.limiter.max_concurrency,
+            'breaker': self.breaker.snapshot(),
+            'retry_budget_tokens': self.budget.tokens,
+            'counters': {**counters, 'rejected_busy': self.limiter.rejected},
+        }
+
+    @contextmanager
+    def _guard(self, user_id, deadline):
+        with self.limiter.slot(user_id, deadline):
+            if not self.breaker.allow():
+                self._count('rejected_open_circuit')
+                raise ServiceUnavailable('circuit open')
+            try:
+                yield
+            finally:
+                self.breaker.release_probe()
+
+    def _attempts(self, attempt, deadline, record_success=True):
+        self.budget.deposit()
+        tries = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count('deadline_exceeded')
+                raise ServiceUnavailable('deadline exceeded')
+
+            tries += 1
+            try:
+                result = attempt(min(self.attempt_timeout, remaining))
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                self._count('failures')
+                if tries >= self.max_attempts or self.breaker.state != 'closed':
+                    raise
+                if not self.budget.withdraw():
+                    self._count('retry_budget_exhausted')
+                    raise
+
+                # 全抖动退避，且不超过剩余时间
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (tries - 1)))
+                if time.monotonic() + delay >= deadline:
+                    raise
+                self._count('retries')
+                logger.warning(f"AI call failed ({type(e).__name__}), retry {tries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            if record_success:
+                self.breaker.record_success()
+                self._count('successes')
+            return result
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_policy():
+    """每个进程一个策略实例，首次使用时按当前配置创建"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = ResiliencePolicy(current_app.config)
+        return _policy
+
+
+def reset_policy():
+    """丢弃当前策略 (计数、熔断状态清零)，下次调用时按最新配置重建"""
+    global _policy
+    with _policy_lock:
+        _policy = None
+
+
+def get_metrics():
+    return get_policy().metrics()
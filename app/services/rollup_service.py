@@ -0,0 +1,246 @@
+# app/services/rollup_service.py
+from app.models import User, HealthRecord, HealthDailyRollup, HealthPeriodRollup
+from app.extensions import db
+from sqlalchemy import func, case, insert, or_, and_
+from datetime import timedelta
+
+# 汇总表里的累计字段
+AGGREGATE_FIELDS = ('record_count', 'weight_sum', 'weight_count', 'steps_sum', 'steps_count',
+                    'sleep_sum', 'sleep_count')
+
+# 全量重建时每次读取/插入的日汇总条数
+REBUILD_CHUNK_DAYS = 2000
+
+
+class RollupService:
+    @staticmethod
+    def refresh(user_id, *days):
+        """
+        增量维护：重新计算指定日期的日汇总，以及这些日期所在的周/月汇总
+        只读该用户这些日期的原始记录和所在周/月的日汇总行，不扫描全部历史；
+        日期很多时 (批量导入、设备同步) 按块批量删除/插入，查询数与日期数无关
+        调用方负责 commit (与写入 HealthRecord 放在同一个事务里)
+        """
+        days = sorted({d for d in days if d})
+        if not days:
+            return
+
+        db.session.flush()
+        for i in range(0, len(days), REBUILD_CHUNK_DAYS):
+            chunk = days[i:i + REBUILD_CHUNK_DAYS]
+            HealthDailyRollup.query.filter(HealthDailyRollup.user_id == user_id, HealthDailyRollup.day.in_(chunk)) \
+                .delete(synchronize_session=False)
+            rows = db.session.query(HealthRecord.date, *RollupService._aggregate_columns()) \
+                .filter(HealthRecord.user_id == user_id, HealthRecord.date.in_(chunk)) \
+                .group_by(HealthRecord.date).all()
+            # 当天的记录已全部删除时不会有聚合行，汇总行随上面的删除一起去掉
+            if rows:
+                db.session.execute(insert(HealthDailyRollup), [
+                    {'user_id': user_id, 'day': r.date, **{field: getattr(r, field) or 0 for field in AGGREGATE_FIELDS}}
+                    for r in rows
+                ])
+
+        touched = {p for day in days for p in RollupService._periods_of(day)}
+        RollupService._refresh_periods(user_id, touched)
+
+    @staticmethod
+    def get_daily(user_id, limit=30):
+        """获取最近 limit 个有记录日期的日汇总 (按日期倒序)"""
+        return HealthDailyRollup.query.filter_by(user_id=user_id) \
+            .order_by(HealthDailyRollup.day.desc()).limit(limit).all()
+
+    @staticmethod
+    def get_period(user_id, period, start):
+        """获取某一周/某一月的汇总，没有数据返回 None"""
+        return HealthPeriodRollup.query.filter_by(user_id=user_id, period=period, period_start=start).first()
+
+    @staticmethod
+    def recent_periods(user_id, day):
+        """
+        本周/上周/本月/上月的平均值 (报告页使用)，一次查询读取 4 条周/月汇总
+        返回 [(名称, {'days', 'avg_weight', 'avg_steps', 'avg_sleep'})]，没有数据的周期 days 为 0
+        """
+        week, month = (start for _, start in RollupService._periods_of(day))
+        keys = [
+            ('本周', 'week', week),
+            ('上周', 'week', week - timedelta(days=7)),
+            ('本月', 'month', month),
+            ('上月', 'month', (month - timedelta(days=1)).replace(day=1)),
+        ]
+        rows = HealthPeriodRollup.query.filter(
+            HealthPeriodRollup.user_id == user_id,
+            or_(*[and_(HealthPeriodRollup.period == period, HealthPeriodRollup.period_start == start)
+                  for _, period, start in keys])
+        ).all()
+        found = {(r.period, r.period_start): r for r in rows}
+
+        result = []
+        for label, period, start in keys:
+            rollup = found.get((period, start))
+            rollups = [rollup] if rollup else []
+            result.append((label, {'days': rollup.record_count if rollup else 0,
+                                   **RollupService.summarize(rollups)}))
+        return result
+
+    @staticmethod
+    def summarize(rollups):
+        """把若干汇总行合并成平均值，口径与报告页一致"""
+        totals = {field: sum(getattr(r, field) or 0 for r in rollups) for field in AGGREGATE_FIELDS}
+        return {
+            'avg_weight': round(totals['weight_sum'] / totals['weight_count'], 1) if totals['weight_count'] else 0,
+            'avg_steps': int(totals['steps_sum'] / totals['steps_count']) if totals['steps_count'] else 0,
+            'avg_sleep': round(totals['sleep_sum'] / totals['sleep_count'], 1) if totals['sleep_count'] else 0,
+        }
+
+    @staticmethod
+    def rebuild(chunk_size=200, progress=None):
+        """
+        从 health_record 全量回填汇总表
+        按用户分块：每块先删除旧汇总，再用 GROUP BY 聚合后批量插入，每块提交一次
+        """
+        last_user_id = 0
+        total_users = 0
+        total_days = 0
+
+        while True:
+            user_ids = [uid for (uid,) in db.session.query(User.id)
+                        .filter(User.id > last_user_id)
+                        .order_by(User.id).limit(chunk_size).all()]
+            if not user_ids:
+                break
+
+            days = RollupService._rebuild_users(user_ids)
+            db.session.commit()
+
+            last_user_id = user_ids[-1]
+            total_users += len(user_ids)
+            total_days += days
+            if progress:
+                progress(total_users, total_days)
+
+        return total_users, total_days
+
+    @staticmethod
+    def _rebuild_users(user_ids, chunk_size=REBUILD_CHUNK_DAYS):
+        """
+        删除这些用户的旧汇总，用 GROUP BY 聚合后批量插入，返回写入的日汇总条数
+        日汇总按 (user_id, 日期) 分段读取、分段插入，周/月汇总在内存中累加 (条数只有日汇总的几分之一)
+        """
+        db.session.flush()
+        HealthDailyRollup.query.filter(HealthDailyRollup.user_id.in_(user_ids)) \
+            .delete(synchronize_session=False)
+        HealthPeriodRollup.query.filter(HealthPeriodRollup.user_id.in_(user_ids)) \
+            .delete(synchronize_session=False)
+
+        query = db.session.query(
+            HealthRecord.user_id,
+            HealthRecord.date,
+            *RollupService._aggregate_columns()
+        ).filter(HealthRecord.user_id.in_(user_ids)) \
+            .group_by(HealthRecord.user_id, HealthRecord.date) \
+            .order_by(HealthRecord.user_id, HealthRecord.date)
+
+        total = 0
+        periods = {}
+        last = None
+        while True:
+            page = query
+            if last:
+                page = page.filter(or_(
+                    HealthRecord.user_id > last.user_id,
+                    and_(HealthRecord.user_id == last.user_id, HealthRecord.date > last.date)
+                ))
+            rows = page.limit(chunk_size).all()
+            if not rows:
+                break
+
+            daily = []
+            for r in rows:
+                values = {field: getattr(r, field) or 0 for field in AGGREGATE_FIELDS}
+                daily.append({'user_id': r.user_id, 'day': r.date, **values})
+                for period, start in RollupService._periods_of(r.date):
+                    bucket = periods.setdefault((r.user_id, period, start), dict.fromkeys(AGGREGATE_FIELDS, 0))
+                    for field in AGGREGATE_FIELDS:
+                        bucket[field] += values[field]
+
+            db.session.execute(insert(HealthDailyRollup), daily)
+            total += len(daily)
+            last = rows[-1]
+
+        if periods:
+            db.session.execute(insert(HealthPeriodRollup), [
+                {'user_id': uid, 'period': period, 'period_start': start, **values}
+                for (uid, period, start), values in periods.items()
+            ])
+        return total
+
+    @staticmethod
+    def _aggregate_columns():
+        """聚合表达式：体重/步数只统计 > 0 的值，睡眠只统计非空值"""
+        return (
+            func.count(HealthRecord.id).label('record_count'),
+            func.sum(case((HealthRecord.weight > 0, HealthRecord.weight))).label('weight_sum'),
+            func.count(case((HealthRecord.weight > 0, 1))).label('weight_count'),
+            func.sum(case((HealthRecord.steps > 0, HealthRecord.steps))).label('steps_sum'),
+            func.count(case((HealthRecord.steps > 0, 1))).label('steps_count'),
+            func.sum(case((HealthRecord.sleep_hours > 0, HealthRecord.sleep_hours))).label('sleep_sum'),
+            func.count(case((HealthRecord.sleep_hours > 0, 1))).label('sleep_count'),
+        )
+
+    @staticmethod
+    def _periods_of(day):
+        """返回某天所在的 (week, 周一) 和 (month, 1号)"""
+        return (
+            ('week', day - timedelta(days=day.weekday())),
+            ('month', day.replace(day=1)),
+        )
+
+    @staticmethod
+    def _period_end(period, start):
+        return start + timedelta(days=7) if period == 'week' else \
+            (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    @staticmethod
+    def _refresh_periods(user_id, touched):
+        """
+        重新计算 touched 中的周/月汇总：删除旧行，读取覆盖这些周/月的日汇总在内存中累加后批量插入
+        相邻的周/月合并成连续区间读取，日汇总行只读一遍
+        """
+        for period in ('week', 'month'):
+            starts = sorted(start for p, start in touched if p == period)
+            for i in range(0, len(starts), REBUILD_CHUNK_DAYS):
+                HealthPeriodRollup.query.filter(
+                    HealthPeriodRollup.user_id == user_id,
+                    HealthPeriodRollup.period == period,
+                    HealthPeriodRollup.period_start.in_(starts[i:i + REBUILD_CHUNK_DAYS])
+                ).delete(synchronize_session=False)
+
+        ranges = []
+        for start, end in sorted((start, RollupService._period_end(period, start)) for period, start in touched):
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
+
+        periods = {}
+        for start, end in ranges:
+            rows = db.session.query(
+                HealthDailyRollup.day, *[getattr(HealthDailyRollup, field) for field in AGGREGATE_FIELDS]
+            ).filter(
+                HealthDailyRollup.user_id == user_id,
+                HealthDailyRollup.day >= start,
+                HealthDailyRollup.day < end
+            ).yield_per(REBUILD_CHUNK_DAYS)
+            for r in rows:
+                for key in RollupService._periods_of(r.day):
+                    if key not in touched:
+                        continue
+                    bucket = periods.setdefault(key, dict.fromkeys(AGGREGATE_FIELDS, 0))
+                    for field in AGGREGATE_FIELDS:
+                        bucket[field] += getattr(r, field) or 0
+
+        if periods:
+            db.session.execute(insert(HealthPeriodRollup), [
+                {'user_id': user_id, 'period': period, 'period_start': start, **values}
+                for (period, start), values in periods.items()
+            ])
@@ -0,0 +1,196 @@
+# app/services/scoring_service.py
+"""
+本地健康评分规则
+- 每个指标一张分段表，按取值查表得到等级和说明，等级换算成分数
+- 指标按评估提示词中的五个维度加权：身体成分 30%、运动能力 25%、心血管 20%、代谢 15%、生活习惯 10%
+- 没有数据的指标不参与计算，维度内取已有指标的平均分，维度之间按权重重新归一
+纯查表计算，不访问数据库也不调用 AI
+"""
+from bisect import bisect_right
+
+# 等级对应的分数
+LEVEL_SCORES = {'优秀': 100, '良好': 85, '需改善': 65, '异常': 40}
+
+# 分段表：(下界, 等级, 说明)，按下界升序；取值落在 [本段下界, 下一段下界) 时命中本段
+METRIC_BANDS = {
+    'bmi': [
+        (float('-inf'), '异常', 'BMI过低，体重严重不足'),
+        (16, '需改善', 'BMI偏低，体重不足'),
+        (18.5, '优秀', 'BMI在正常范围内'),
+        (24, '需改善', 'BMI偏高，属于超重'),
+        (28, '异常', 'BMI过高，属于肥胖'),
+    ],
+    'body_fat_male': [
+        (float('-inf'), '需改善', '体脂率偏低'),
+        (6, '优秀', '体脂率适中'),
+        (18, '良好', '体脂率略高'),
+        (25, '需改善', '体脂率偏高'),
+        (30, '异常', '体脂率过高'),
+    ],
+    'body_fat_female': [
+        (float('-inf'), '需改善', '体脂率偏低'),
+        (14, '优秀', '体脂率适中'),
+        (25, '良好', '体脂率略高'),
+        (32, '需改善', '体脂率偏高'),
+        (38, '异常', '体脂率过高'),
+    ],
+    # 未填写性别时使用男女标准的折中
+    'body_fat': [
+        (float('-inf'), '需改善', '体脂率偏低'),
+        (10, '优秀', '体脂率适中'),
+        (22, '良好', '体脂率略高'),
+        (28, '需改善', '体脂率偏高'),
+        (34, '异常', '体脂率过高'),
+    ],
+    'steps': [
+        (float('-inf'), '需改善', '活动量不足，建议增加日常步行'),
+        (5000, '良好', '活动量尚可'),
+        (8000, '优秀', '活动量充足'),
+    ],
+    'calories': [
+        (float('-inf'), '需改善', '运动消耗偏少'),
+        (200, '良好', '运动消耗尚可'),
+        (400, '优秀', '运动消耗充足'),
+    ],
+    'heart_rate': [
+        (float('-inf'), '异常', '静息心率过低'),
+        (40, '需改善', '静息心率偏低'),
+        (50, '良好', '静息心率略低'),
+        (60, '优秀', '静息心率正常'),
+        (80, '良好', '静息心率略高'),
+        (100, '异常', '静息心率过快'),
+    ],
+    'systolic': [
+        (float('-inf'), '需改善', '收缩压偏低'),
+        (90, '优秀', '血压正常'),
+        (120, '良好', '血压正常偏高'),
+        (140, '需改善', '收缩压偏高'),
+        (160, '异常', '收缩压过高'),
+    ],
+    'diastolic': [
+        (float('-inf'), '需改善', '舒张压偏低'),
+        (60, '优秀', '血压正常'),
+        (80, '良好', '血压正常偏高'),
+        (90, '需改善', '舒张压偏高'),
+        (100, '异常', '舒张压过高'),
+    ],
+    'blood_glucose': [
+        (float('-inf'), '异常', '血糖过低'),
+        (3.9, '优秀', '血糖正常'),
+        (5.6, '良好', '血糖正常偏高'),
+        (6.1, '需改善', '血糖偏高'),
+        (7.0, '异常', '血糖过高'),
+    ],
+    'sleep': [
+        (float('-inf'), '需改善', '睡眠时长不足'),
+        (6, '良好', '睡眠时长略少'),
+        (7, '优秀', '睡眠时长充足'),
+        (9, '良好', '睡眠时长略多'),
+        (10, '需改善', '睡眠时间过长'),
+    ],
+    'water': [
+        (float('-inf'), '需改善', '饮水量不足'),
+        (1000, '良好', '饮水量尚可'),
+        (1500, '优秀', '饮水量充足'),
+    ],
+}
+
+# 维度：(键, 名称, 权重, 包含的指标)
+DIMENSIONS = (
+    ('body', '身体成分', 0.30, ('bmi', 'body_fat')),
+    ('activity', '运动能力', 0.25, ('steps', 'calories')),
+    ('cardio', '心血管健康', 0.20, ('heart_rate', 'blood_pressure')),
+    ('metabolic', '代谢健康', 0.15, ('blood_glucose',)),
+    ('lifestyle', '生活习惯', 0.10, ('sleep', 'water')),
+)
+
+# 预先拆出每张表的下界列表，查表时二分查找
+_BOUNDS = {name: [band[0] for band in bands[1:]] for name, bands in METRIC_BANDS.items()}
+
+
+class ScoringService:
+    @staticmethod
+    def classify(table, value):
+        """按分段表查找取值所在的段，返回 (等级, 说明)"""
+        _, level, comment = METRIC_BANDS[table][bisect_right(_BOUNDS[table], value)]
+        return level, comment
+
+    @staticmethod
+    def score(user, record):
+        """
+        计算健康分数和各指标等级
+        返回: {
+            "health_score": 82,
+            "assessments": {"bmi": {"value": 22.5, "level": "优秀", "comment": "..."}, ...},
+            "dimension_scores": {"body": {"name": "身体成分", "weight": 0.3, "score": 92.5}, ...}
+        }
+        """
+        assessments = ScoringService.assess_metrics(user, record)
+
+        dimension_scores = {}
+        total = weight_sum = 0
+        for key, name, weight, metrics in DIMENSIONS:
+            scores = [LEVEL_SCORES[assessments[m]['level']] for m in metrics if m in assessments]
+            dimension_score = round(sum(scores) / len(scores), 1) if scores else None
+            dimension_scores[key] = {"name": name, "weight": weight, "score": dimension_score}
+            if dimension_score is not None:
+                total += dimension_score * weight
+                weight_sum += weight
+
+        return {
+            "health_score": round(total / weight_sum) if weight_sum else 0,
+            "assessments": assessments,
+            "dimension_scores": dimension_scores
+        }
+
+    @staticmethod
+    def assess_metrics(user, record):
+        """逐项查表，没有数据的指标不出现在结果中"""
+        assessments = {}
+
+        def add(metric, table, value, display=None):
+            level, comment = ScoringService.classify(table, value)
+            assessments[metric] = {
+                "value": value if display is None else display,
+                "level": level,
+                "comment": comment
+            }
+
+        if user.height and record.weight:
+            h_m = user.height / 100
+            add('bmi', 'bmi', round(record.weight / (h_m ** 2), 1))
+
+        if record.body_fat is not None:
+            table = {'男': 'body_fat_male', '女': 'body_fat_female'}.get(user.gender, 'body_fat')
+            add('body_fat', table, record.body_fat)
+
+        if record.steps is not None:
+            add('steps', 'steps', record.steps)
+        if record.calories is not None:
+            add('calories', 'calories', record.calories)
+        if record.heart_rate is not None:
+            add('heart_rate', 'heart_rate', record.heart_rate)
+
+        # 血压：收缩压、舒张压分别查表，取较差的一项
+        high, low = record.blood_pressure_high, record.blood_pressure_low
+        if high is not None or low is not None:
+            results = []
+            if high is not None:
+                results.append(ScoringService.classify('systolic', high))
+            if low is not None:
+                results.append(ScoringService.classify('diastolic', low))
+            level, comment = min(results, key=lambda r: LEVEL_SCORES[r[0]])
+            assessments['blood_pressure'] = {
+                "value": f"{high if high is not None else '--'}/{low if low is not None else '--'}",
+                "level": level,
+                "comment": comment
+            }
+
+        if record.blood_glucose is not None:
+            add('blood_glucose', 'blood_glucose', record.blood_glucose)
+        if record.sleep_hours is not None:
+            add('sleep', 'sleep', record.sleep_hours)
+        if record.water_intake is not None:
+            add('water', 'water', record.water_intake)
+
+        return assessments
@@ -0,0 +1,247 @@
+# app/services/search_service.py
+from app.models import Post
+from app.extensions import db
+from flask import current_app
+from sqlalchemy import or_
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import math
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 英文/数字按整词切分，中日韩文字按相邻两字 (bigram) 切分
+_TOKEN_RE = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+# 标题命中的权重高于正文
+TITLE_WEIGHT = 2
+
+
+def tokenize(text):
+    """把文本切成检索词：英文整词小写，中文 bigram (单字成段时保留单字)"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if not _CJK_RE.match(run):
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class SearchPage:
+    """
+    搜索结果分页对象
+    属性与 Flask-SQLAlchemy 的 Pagination 保持一致，模板可以直接复用
+    """
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return math.ceil(self.total / self.per_page) if self.total else 0
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+class SearchBackend(ABC):
+    """搜索后端接口：search 返回 (按相关度排好序的帖子 id 列表, 命中总数)"""
+
+    @abstractmethod
+    def search(self, query, page, per_page):
+        """page 从 1 开始 (SearchService.search 已保证 page >= 1)"""
+
+    def index_post(self, post):
+        """帖子新建/修改后调用，基于数据库索引的后端不需要处理"""
+
+    def remove_post(self, post_id):
+        """帖子删除后调用，基于数据库索引的后端不需要处理"""
+
+
+class LikeSearchBackend(SearchBackend):
+    """原来的 ILIKE '%q%' 方案，作为兜底 (无排序，按置顶和时间倒序)"""
+
+    def search(self, query, page, per_page):
+        q = Post.query.filter(or_(
+            Post.title.ilike(f'%{query}%'),
+            Post.content.ilike(f'%{query}%')
+        ))
+        total = q.count()
+        ids = [pid for (pid,) in q.with_entities(Post.id)
+               .order_by(Post.is_announcement.desc(), Post.created_at.desc())
+               .offset((page - 1) * per_page).limit(per_page)]
+        return ids, total
+
+
+class FulltextSearchBackend(SearchBackend):
+    """MySQL FULLTEXT 索引 (ngram 分词器)，依赖 ft_post_title_content 索引"""
+
+    def search(self, query, page, per_page):
+        from sqlalchemy.dialects.mysql import match
+
+        score = match(Post.title, Post.content, against=query).in_natural_language_mode()
+        total = db.session.query(db.func.count(Post.id)).filter(score > 0).scalar()
+        ids = [pid for (pid,) in db.session.query(Post.id)
+               .filter(score > 0)
+               .order_by(score.desc(), Post.id.desc())
+               .offset((page - 1) * per_page).limit(per_page)]
+        return ids, total
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    进程内倒排索引 (纯 Python)，只适用于单进程部署 (本地开发、SQLite)
+    - 首次搜索时从数据库分批构建，之后在本进程处理的发帖/编辑/删除时增量更新
+    - 索引在每个进程的内存里：多 worker 部署时，其他 worker 处理的编辑和删除不会同步过来，
+      搜索结果和命中总数会过期；生产环境 (MySQL) 请使用 fulltext 后端
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {post_id: 权重}
+        self._doc_tokens = {}  # post_id -> set(token)，删除/更新时使用
+        self._max_id = 0
+        self._built = False
+
+    def search(self, query, page, per_page):
+        tokens = set(tokenize(query))
+        if not tokens:
+            return [], 0
+
+        with self._lock:
+            self._catch_up()
+
+            # 所有检索词都要命中 (与子串匹配的语义接近)，按 tf-idf 打分
+            postings = [self._postings.get(t) for t in tokens]
+            if not all(postings):
+                return [], 0
+            postings.sort(key=len)
+
+            doc_count = len(self._doc_tokens) or 1
+            scores = {}
+            for post_id in postings[0]:
+                if all(post_id in p for p in postings[1:]):
+                    scores[post_id] = sum(p[post_id] * math.log(1 + doc_count / len(p)) for p in postings)
+
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], -pid))
+        start = (page - 1) * per_page
+        return ranked[start:start + per_page], len(ranked)
+
+    def index_post(self, post):
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(post.id)
+            self._add(post.id, post.title, post.content)
+
+    def remove_post(self, post_id):
+        with self._lock:
+            if self._built:
+                self._remove(post_id)
+
+    def _catch_up(self):
+        """首次调用时全量构建，之后只补充 id 比已索引最大 id 更大的帖子"""
+        rows = db.session.query(Post.id, Post.title, Post.content) \
+            .filter(Post.id > self._max_id) \
+            .order_by(Post.id) \
+            .execution_options(yield_per=1000)
+        for post_id, title, content in rows:
+            self._add(post_id, title, content)
+        self._built = True
+
+    def _add(self, post_id, title, content):
+        weights = defaultdict(int)
+        for token in tokenize(title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(content):
+            weights[token] += 1
+
+        for token, weight in weights.items():
+            self._postings[token][post_id] = weight
+        self._doc_tokens[post_id] = set(weights)
+        self._max_id = max(self._max_id, post_id)
+
+    def _remove(self, post_id):
+        for token in self._doc_tokens.pop(post_id, ()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(post_id, None)
+                if not posting:
+                    del self._postings[token]
+
+
+_BACKENDS = {
+    'like': LikeSearchBackend,
+    'fulltext': FulltextSearchBackend,
+    'inverted': InvertedIndexSearchBackend,
+}
+_backend_cache = {}
+_backend_lock = threading.Lock()
+
+
+class SearchService:
+    @staticmethod
+    def get_backend():
+        """
+        按配置 SEARCH_BACKEND 获取搜索后端 (每个进程一个实例)
+        未配置时：MySQL 使用 fulltext，其他数据库 (开发环境) 使用进程内倒排索引
+        """
+        name = current_app.config.get('SEARCH_BACKEND')
+        if not name:
+            name = 'fulltext' if db.engine.dialect.name == 'mysql' else 'inverted'
+
+        with _backend_lock:
+            if name not in _backend_cache:
+                _backend_cache[name] = _BACKENDS[name]()
+            return _backend_cache[name]
+
+    @staticmethod
+    def search(query, page=1, per_page=10, options=()):
+        """
+        搜索帖子，返回 SearchPage (items 为按相关度排序的 Post 对象)
+        options: 加载帖子时附加的 ORM 加载选项 (例如预加载作者/评论)
+        """
+        page = max(page, 1)
+        backend = SearchService.get_backend()
+        try:
+            ids, total = backend.search(query, page, per_page)
+        except Exception as e:
+            # 例如 FULLTEXT 索引尚未创建，退回到 ILIKE，保证搜索可用
+            logger.error(f"Search Backend Error: {e}", exc_info=True)
+            db.session.rollback()
+            ids, total = LikeSearchBackend().search(query, page, per_page)
+
+        posts = Post.query.options(*options).filter(Post.id.in_(ids)).all() if ids else []
+        by_id = {p.id: p for p in posts}
+        items = [by_id[pid] for pid in ids if pid in by_id]
+        return SearchPage(items, page, per_page, total)
+
+    @staticmethod
+    def index_post(post):
+        SearchService.get_backend().index_post(post)
+
+    @staticmethod
+    def remove_post(post_id):
+        SearchService.get_backend().remove_post(post_id)
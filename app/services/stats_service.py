@@ -1,7 +1,15 @@
 # app/services/stats_service.py
 from app.models import User, HealthRecord, HealthPlan
+from app.extensions import db
+from sqlalchemy import func, case
 from datetime import datetime
 
+# 仪表盘图表展示最近多少条记录
+CHART_WINDOW = 14
+
+# 图表需要的体征字段 (只在最近 CHART_WINDOW 条记录里读取)
+CHART_COLUMNS = ('weight', 'sleep_hours', 'heart_rate', 'body_fat', 'water_intake', 'blood_glucose')
+
 
 class StatsService:
     @staticmethod
@@ -9,11 +17,11 @@ class StatsService:
         """获取仪表盘所需的所有统计数据"""
         user = User.query.get(user_id)
 
-        # 1. 获取最近 14 天记录
-        recent_records = HealthRecord.query.filter_by(user_id=user_id) \
-            .order_by(HealthRecord.date.desc()).limit(14).all()
+        # 1. 一次 SQL 查出图表窗口、热力图序列和连签分组
+        rows = StatsService._query_dashboard_rows(user_id)
+
         # 数据库查出来是倒序，转成正序给图表用
-        records = recent_records[::-1]
+        records = [r for r in rows if r.rn <= CHART_WINDOW][::-1]
 
         # 2. 提取图表数据
         chart_data = {
@@ -34,14 +42,10 @@ class StatsService:
 
         # 4. 计算活力值 & 连签
         today_score = StatsService._calculate_vitality_score(user, records)
-        streak_days = StatsService._calculate_streak(user_id)  # 也可以传 records 进去算
+        streak_days = StatsService._calculate_streak(rows)
 
-        # 5. 热力图数据 (获取所有记录)
-        heatmap_data = []
-        all_records = HealthRecord.query.filter_by(user_id=user_id).all()
-        for r in all_records:
-            if r.steps:
-                heatmap_data.append([r.date.strftime('%Y-%m-%d'), r.steps])
+        # 5. 热力图数据 (复用同一批结果，按日期正序)
+        heatmap_data = [[r.date.strftime('%Y-%m-%d'), r.steps] for r in reversed(rows) if r.steps]
 
         return {
             "user": user,
@@ -52,6 +56,40 @@ class StatsService:
             "heatmap_data": heatmap_data
         }
 
+    @staticmethod
+    def _query_dashboard_rows(user_id):
+        """
+        单次查询：按日期倒序返回该用户的所有记录
+        - rn: 行号，只有 rn <= CHART_WINDOW 的行才带体征字段，其余行只读 date/steps
+        - island: gaps-and-islands 分组键 (日期序号 + 日期倒序密集排名)，连续打卡的日期分组键相同
+        """
+        rn = func.row_number().over(order_by=(HealthRecord.date.desc(), HealthRecord.id.desc()))
+        day_rank = func.dense_rank().over(order_by=HealthRecord.date.desc())
+
+        inner = db.session.query(
+            HealthRecord.date,
+            HealthRecord.steps,
+            *[getattr(HealthRecord, name) for name in CHART_COLUMNS],
+            rn.label('rn'),
+            (StatsService._day_number(HealthRecord.date) + day_rank).label('island')
+        ).filter(HealthRecord.user_id == user_id).subquery()
+
+        in_window = inner.c.rn <= CHART_WINDOW
+        return db.session.query(
+            inner.c.date,
+            inner.c.steps,
+            *[case((in_window, inner.c[name])).label(name) for name in CHART_COLUMNS],
+            inner.c.rn,
+            inner.c.island
+        ).order_by(inner.c.rn).all()
+
+    @staticmethod
+    def _day_number(column):
+        """把日期转成连续的天数序号，用于 gaps-and-islands 计算"""
+        if db.engine.dialect.name == 'sqlite':
+            return func.julianday(column)
+        return func.to_days(column)
+
     @staticmethod
     def _calculate_vitality_score(user, records):
         """内部算法：计算今日活力值"""
@@ -90,30 +128,23 @@ class StatsService:
         return min(int(score_move * 0.5 + score_sleep * 0.3 + score_body * 0.2) + bonus, 100)
 
     @staticmethod
-    def _calculate_streak(user_id):
-        """内部算法：计算连续打卡天数"""
-        # 注意：这里需要按日期倒序查所有记录，逻辑需要严谨
-        records = HealthRecord.query.filter_by(user_id=user_id).order_by(HealthRecord.date.desc()).all()
-        if not records: return 0
-
-        streak = 0
-        # 简单算法：检查最近一条是否是今天或昨天
-        # (实际生产中建议用 SQL 窗口函数，这里维持 Python 逻辑)
+    def _calculate_streak(rows):
+        """
+        内部算法：计算连续打卡天数
+        rows 必须是 _query_dashboard_rows 的结果 (按日期倒序，带 island 分组键)
+        """
+        if not rows: return 0
+
+        # 最近一条不是今天或昨天，说明断签了
         today = datetime.now().date()
-        last_date = records[0].date
-
-        if (today - last_date).days > 1:
-            return 0  # 断签了
-
-        streak = 1
-        prev = last_date
-        for r in records[1:]:
-            diff = (prev - r.date).days
-            if diff == 1:
-                streak += 1
-                prev = r.date
-            elif diff == 0:
-                continue  # 同一天多条记录，跳过
-            else:
+        if (today - rows[0].date).days > 1:
+            return 0
+
+        # 与最近一条同属一个 island 的不同日期数，就是连签天数 (同一天多条记录只算一次)
+        island = rows[0].island
+        days = set()
+        for r in rows:
+            if r.island != island:
                 break
-        return streak
\ No newline at end of file
+            days.add(r.date)
+        return len(days)
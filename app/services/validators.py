@@ -0,0 +1,295 @@
+# app/services/validators.py
+"""
+健康数据校验
+- 各指标的类型和合理范围只在 METRICS 中定义一次，手动录入 / CSV 导入、设备同步、评估前的数据检查共用
+- 导入时为每个指标生成校验函数，并按来源 (表单 / 设备) 预先生成错误提示，提示文字与原来各处的一致
+- 批量模式按列校验：每一块先用内置的 map/min/max 整块转换和比较，整块都合法时不再逐个检查，
+  有不合法的值时才在这一块里逐个定位出错的行；单条校验直接调用生成好的校验函数，两者结果一致
+"""
+from functools import partial
+from itertools import filterfalse, repeat
+from operator import itemgetter, methodcaller
+import math
+import operator
+
+# 数据库字段: (类型, 最小值, 最大值, 名称, 单位, 表单提示风格)
+# 表单提示风格：between "必须在 最小-最大 之间"；limit "不能为负数 / 不能超过 最大值"；positive 先检查 "必须大于0"
+METRICS = {
+    'weight': (float, 20, 300, '体重', ' kg', 'positive'),
+    'body_fat': (float, 3, 60, '体脂率', '%', 'between'),
+    'steps': (int, 0, 100000, '步数', '', 'limit'),
+    'calories': (int, 0, 10000, '卡路里', '', 'limit'),
+    'water_intake': (int, 0, 10000, '饮水量', ' ml', 'limit'),
+    'blood_glucose': (float, 2, 30, '血糖', ' mmol/L', 'between'),
+    'sleep_hours': (float, 0, 24, '睡眠时长', ' 小时', 'between'),
+    'heart_rate': (int, 30, 250, '心率', ' bpm', 'between'),
+    'blood_pressure_high': (int, 60, 250, '高压', ' mmHg', 'between'),
+    'blood_pressure_low': (int, 40, 150, '低压', ' mmHg', 'between'),
+}
+
+# 表单 / CSV 的字段名 -> 数据库字段，顺序即错误提示的顺序
+FORM_FIELDS = {
+    'weight': 'weight',
+    'body_fat': 'body_fat',
+    'steps': 'steps',
+    'calories': 'calories',
+    'water_intake': 'water_intake',
+    'blood_glucose': 'blood_glucose',
+    'sleep_hours': 'sleep_hours',
+    'heart_rate': 'heart_rate',
+    'bp_high': 'blood_pressure_high',
+    'bp_low': 'blood_pressure_low',
+}
+
+# 表单必填的字段，以及留空时写入的默认值 (其余字段留空为 None)
+FORM_REQUIRED = ('weight',)
+FORM_DEFAULTS = {'steps': 0, 'calories': 0}
+
+# 表单中与通用格式不同的范围提示 (保持原有文字)
+FORM_RANGE_MESSAGES = {'sleep_hours': '睡眠时长必须在 0-24 小时之间'}
+
+# 智能设备上传的字段名 -> 数据库字段 (体重取用户设置，不从设备读取)
+DEVICE_FIELDS = {
+    'steps': 'steps',
+    'body_fat': 'body_fat',
+    'blood_glucose': 'blood_glucose',
+    'calories': 'calories',
+    'sleep': 'sleep_hours',
+    'heart_rate': 'heart_rate',
+    'blood_pressure_high': 'blood_pressure_high',
+    'blood_pressure_low': 'blood_pressure_low',
+}
+
+# 评估前检查已保存记录的顺序，blood_pressure 为高压/低压的大小关系
+RECORD_CHECK_ORDER = ('steps', 'calories', 'heart_rate', 'blood_pressure_high', 'blood_pressure_low',
+                      'blood_pressure', 'weight', 'body_fat', 'blood_glucose', 'sleep_hours', 'water_intake')
+
+# 评估前检查的提示名称，没有列出的为 "名称数据异常"
+RECORD_CHECK_LABELS = {
+    'blood_pressure_high': '血压高压异常',
+    'blood_pressure_low': '血压低压异常',
+    'sleep_hours': '睡眠时长异常',
+    'water_intake': '饮水量异常',
+}
+
+FORM_ERROR_PREFIX = '输入无效，请重新输入：'
+
+# 批量模式每次整块转换和比较的行数 (块内有不合法的值时只逐个检查这一块)
+COLUMN_BLOCK = 256
+
+# 校验结果的错误类型
+FORMAT, NON_POSITIVE, LOW, HIGH = 'format', 'non_positive', 'low', 'high'
+
+# 设备数据中没有上传的字段
+_MISSING = object()
+
+
+def _compile(cast, low, high):
+    """生成单个值的校验函数：返回 (值, 错误类型)"""
+    def check(raw):
+        try:
+            value = cast(raw)
+        except (ValueError, TypeError, OverflowError):
+            return None, FORMAT
+        if value != value:
+            # NaN 与任何值比较都为 False，单独按格式错误处理
+            return None, FORMAT
+        if value < low:
+            return value, NON_POSITIVE if value <= 0 < low else LOW
+        if value > high:
+            return value, HIGH
+        return value, None
+    return check
+
+
+def _form_messages(column, cast, low, high, label, unit, style):
+    between = FORM_RANGE_MESSAGES.get(column, f'{label}必须在 {low}-{high}{unit} 之间')
+    messages = {
+        FORMAT: f'{label}必须是整数' if cast is int else f'{label}格式不正确',
+        NON_POSITIVE: between, LOW: between, HIGH: between,
+    }
+    if style == 'limit':
+        messages.update({NON_POSITIVE: f'{label}不能为负数', LOW: f'{label}不能为负数', HIGH: f'{label}不能超过 {high}{unit}'})
+    elif style == 'positive':
+        messages[NON_POSITIVE] = f'{label}必须大于0'
+    return messages
+
+
+def _device_messages(label):
+    out_of_range = f'{label}数据异常'
+    return {FORMAT: f'{label}格式错误', NON_POSITIVE: out_of_range, LOW: out_of_range, HIGH: out_of_range}
+
+
+# 导入时生成：数据库字段 -> 校验函数
+_CHECKS = {column: _compile(cast, low, high) for column, (cast, low, high, *_) in METRICS.items()}
+
+# 各来源的配置：(字段名 -> 数据库字段, 错误提示, 没有提供时的值, 必填字段, 留空默认值, 血压关系提示)
+# 表单留空 (空字符串) 视为没有填写；设备数据只要带了这个字段就校验，包括 null
+_SOURCES = {
+    'form': (FORM_FIELDS, {column: _form_messages(column, *spec) for column, spec in METRICS.items()},
+             None, FORM_REQUIRED, FORM_DEFAULTS, '高压必须大于低压'),
+    'device': (DEVICE_FIELDS, {column: _device_messages(label) for column, (_, _, _, label, *_) in METRICS.items()},
+               _MISSING, (), {}, '血压数据异常：高压必须大于低压'),
+}
+
+
+def validate_rows(rows, source='form'):
+    """
+    批量校验：按列检查多行数据 (CSV 导入、设备批量同步)
+    rows: 字典列表，字段名按来源 (form / device) 区分
+    返回 (每行的 {数据库字段: 值}, {行号 (从 0 开始): [错误提示]})
+    表单来源每行包含全部字段 (没填为 None 或默认值)；设备来源只包含上传了的字段；有错误的行的值不可用
+    """
+    fields, messages, missing, required, defaults, bp_message = _SOURCES[source]
+    if not rows:
+        return [], {}
+
+    errors = {}
+    value_columns = {}
+    for key, column in fields.items():
+        # 整列一次取出：每行都带这个字段时 (CSV) 用 itemgetter，否则用 get 取默认值
+        # 表单留空的字段此时还是空字符串，在 _check_column 中当作没有填写
+        try:
+            raw_column = list(map(itemgetter(key), rows))
+        except KeyError:
+            raw_column = list(map(methodcaller('get', key, missing), rows))
+            if missing is not None and raw_column.count(missing) == len(raw_column):
+                # 设备数据里所有行都没有这个字段
+                continue
+
+        if column in required:
+            # 必填字段只有空格也算没填
+            raw_column = [raw if raw and str(raw).strip() else None for raw in raw_column]
+            message = f'{METRICS[column][3]}为必填项'
+            for i, raw in enumerate(raw_column):
+                if raw is None:
+                    errors.setdefault(i, []).append(message)
+
+        values = _check_column(column, raw_column, missing, messages[column], errors)
+        if column in defaults:
+            default = defaults[column]
+            values = [default if value is None else value for value in values]
+        value_columns[column] = values
+
+    # 血压逻辑关系 (两项都是数字时就比较，超出范围也比较)
+    no_values = repeat(missing, len(rows))
+    for i, (high, low) in enumerate(zip(value_columns.get('blood_pressure_high', no_values),
+                                        value_columns.get('blood_pressure_low', no_values))):
+        if high is not missing and low is not missing and high is not None and low is not None and high <= low:
+            errors.setdefault(i, []).append(bp_message)
+
+    columns = list(value_columns)
+    if not columns:
+        values = [{} for _ in rows]
+    elif missing is None:
+        values = list(map(dict, map(zip, repeat(columns), zip(*value_columns.values()))))
+    else:
+        values = [{column: value for column, value in zip(columns, row_values) if value is not missing}
+                  for row_values in zip(*value_columns.values())]
+    return values, errors
+
+
+def validate_form(form):
+    """校验一条手动录入 / CSV 数据，返回 ({数据库字段: 值}, [错误提示])"""
+    return _validate_one(form, 'form')
+
+
+def validate_device(data):
+    """校验一条设备上传的数据，返回 ({数据库字段: 值}, [错误提示])，只包含上传了的字段"""
+    return _validate_one(data, 'device')
+
+
+def form_error_message(errors):
+    """表单的错误提示：多个错误用分号连接"""
+    return FORM_ERROR_PREFIX + '；'.join(errors)
+
+
+def check_record(record):
+    """检查已保存的记录 (评估前)，返回带数值和正常范围的错误提示列表"""
+    errors = []
+    for column in RECORD_CHECK_ORDER:
+        if column == 'blood_pressure':
+            high, low = record.blood_pressure_high, record.blood_pressure_low
+            if high is not None and low is not None and high <= low:
+                errors.append(f'血压数据异常：高压({high})必须大于低压({low})')
+            continue
+        value = getattr(record, column)
+        _, low, high, label, unit, _ = METRICS[column]
+        if value is not None and (value < low or value > high):
+            name = RECORD_CHECK_LABELS.get(column, f'{label}数据异常')
+            errors.append(f'{name}：{value}{unit}（正常范围：{low}-{high}）')
+    return errors
+
+
+def _validate_one(row, source):
+    """单条校验：逐个字段调用预先生成的校验函数，结果与 validate_rows 一致"""
+    fields, messages, missing, required, defaults, bp_message = _SOURCES[source]
+    values = {}
+    errors = []
+    for key, column in fields.items():
+        raw = row.get(key) or None if missing is None else row.get(key, missing)
+        if column in required and (raw is None or not str(raw).strip()):
+            errors.append(f'{METRICS[column][3]}为必填项')
+            raw = None
+        if raw is missing:
+            if missing is None:
+                values[column] = defaults.get(column)
+            continue
+
+        value, error = _CHECKS[column](raw)
+        if error:
+            errors.append(messages[column][error])
+        values[column] = value
+
+    high, low = values.get('blood_pressure_high'), values.get('blood_pressure_low')
+    if high is not None and low is not None and high <= low:
+        errors.append(bp_message)
+    return values, errors
+
+
+def _check_column(column, raw_column, missing, messages, errors):
+    """
+    校验一列：返回值列表 (没有提供的为 missing，格式错误的为 None，超出范围的保留转换后的值)，错误追加到 errors
+    每 COLUMN_BLOCK 行为一块，先整块转换并比较最大最小值；整块合法时直接使用，否则逐个检查找出出错的行
+    表单来源 (missing 为 None) 空字符串也算没有提供
+    """
+    cast, low, high = METRICS[column][:3]
+    check = _CHECKS[column]
+    if missing is None:
+        absent = operator.not_
+    else:
+        absent = partial(operator.is_, missing)
+
+    values = []
+    for start in range(0, len(raw_column), COLUMN_BLOCK):
+        block = raw_column[start:start + COLUMN_BLOCK]
+        complete = all(block) if missing is None else missing not in block
+        present = block if complete else list(filterfalse(absent, block))
+        if not present:
+            values.extend([missing] * len(block))
+            continue
+
+        try:
+            cast_values = list(map(cast, present))
+        except (ValueError, TypeError, OverflowError):
+            cast_values = None
+
+        # NaN 与任何值比较都为 False，min/max 可能跳过它，浮点列还要确认没有 NaN
+        if (cast_values is not None and low <= min(cast_values) and max(cast_values) <= high
+                and (cast is int or not any(map(math.isnan, cast_values)))):
+            if complete:
+                values.extend(cast_values)
+            else:
+                converted = iter(cast_values)
+                values.extend(missing if absent(raw) else next(converted) for raw in block)
+            continue
+
+        for i, raw in enumerate(block, start):
+            if absent(raw):
+                values.append(missing)
+                continue
+            value, error = check(raw)
+            if error:
+                errors.setdefault(i, []).append(messages[error])
+            values.append(value)
+    return values
@@ -56,8 +56,11 @@ function sendMessage() {
     // 3. 显示 AI 正在输入...
     const loadingId = appendLoading();
 
-    // 4. 发送请求 (带上 History)
-    fetch('/plan/chat', {
+    // 4. 发送请求 (带上 History)，以流式方式接收回复，边收边显示
+    let aiBubble = null;
+    let replyText = '';
+
+    fetch('/plan/chat/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -66,23 +69,13 @@ function sendMessage() {
             history: chatHistory.slice(-10)
         })
     })
-    .then(res => res.json())
-    .then(data => {
-        removeLoading(loadingId);
-        if (data.status === 'success') {
-            appendMessage('ai', data.reply);
-
-            // 🔥 记录 AI 回复到历史
-            chatHistory.push({ role: "assistant", content: data.reply });
-
-            if (data.updated_plan) {
-                showToast('✅ 每日清单已同步到仪表盘');
-            }
-        } else {
-            appendMessage('ai', '🚫 ' + data.reply);
-            // 如果出错，把刚才用户的那条记录也弹出来，保持一致性（可选）
-            chatHistory.pop();
+    .then(res => {
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        // 参数校验失败时后端直接返回 JSON
+        if (!(res.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            return res.json().then(data => handleChatEvent('error', { reply: data.message || data.reply }));
         }
+        return readEventStream(res, handleChatEvent);
     })
     .catch(err => {
         console.error(err);
@@ -96,6 +89,76 @@ function sendMessage() {
         userInput.disabled = false;
         userInput.focus();
     });
+
+    function handleChatEvent(event, data) {
+        if (event === 'delta') {
+            // 收到第一段回复时，用回复气泡替换"正在输入"
+            if (!aiBubble) {
+                removeLoading(loadingId);
+                aiBubble = appendMessage('ai', '');
+            }
+            replyText += data.text;
+            renderAiText(aiBubble, replyText);
+        } else if (event === 'done') {
+            removeLoading(loadingId);
+            if (!aiBubble) aiBubble = appendMessage('ai', '');
+            // 以最终解析结果为准 (AI 没按 JSON 格式输出时流式阶段可能什么都没显示)
+            renderAiText(aiBubble, data.reply);
+
+            // 🔥 记录 AI 回复到历史
+            chatHistory.push({ role: "assistant", content: data.reply });
+
+            if (data.updated_plan) {
+                showToast('✅ 每日清单已同步到仪表盘');
+            }
+        } else if (event === 'error') {
+            removeLoading(loadingId);
+            appendMessage('ai', '🚫 ' + data.reply);
+            // 如果出错，把刚才用户的那条记录也弹出来，保持一致性（可选）
+            chatHistory.pop();
+        }
+    }
+}
+
+// 读取 Server-Sent Events 响应流，每解析出一个完整事件就回调 onEvent(event, data)
+function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+
+    function dispatch(block) {
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        if (data) onEvent(event, JSON.parse(data));
+    }
+
+    function pump() {
+        return reader.read().then(({ done, value }) => {
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                dispatch(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+            if (done) {
+                if (buffer.trim()) dispatch(buffer);
+                return;
+            }
+            return pump();
+        });
+    }
+
+    return pump();
+}
+
+function renderAiText(wrapper, text) {
+    const bubble = wrapper.querySelector('.bubble-ai');
+    bubble.innerHTML = (typeof marked !== 'undefined') ? marked.parse(text) : text;
+    scrollToBottom();
 }
 
 function appendMessage(role, text) {
@@ -123,6 +186,7 @@ function appendMessage(role, text) {
 
     chatBox.appendChild(wrapper);
     scrollToBottom();
+    return wrapper;
 }
 
 function appendLoading() {
@@ -0,0 +1,104 @@
+# batch_assessments.py
+from app import create_app, db
+from app.services.assessment_service import AssessmentService
+from app.services.ai_service import close_clients
+from app.services.resilience import get_metrics
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+import logging
+import sys
+import time
+
+app = create_app()
+logger = logging.getLogger(__name__)
+
+
+def _request(prepared):
+    """线程池中执行：调用 AI 生成评估 (不访问数据库)"""
+    with app.app_context():
+        try:
+            return AssessmentService.request_assessment(prepared)
+        except Exception as e:
+            logger.error(f"Batch Assessment Error: user={prepared['user_id']} Error: {e}", exc_info=True)
+            return {"status": "error", "message": "健康评估失败，请稍后重试"}
+
+
+def _submit(pool, user_ids, stats):
+    """读取一批用户的数据并提交 AI 请求，数据不完整的用户直接跳过"""
+    submitted = []
+    for user_id in user_ids:
+        prepared = AssessmentService.prepare_assessment(user_id)
+        if prepared["status"] != "ready":
+            stats['skipped'] += 1
+            continue
+        submitted.append((user_id, pool.submit(_request, prepared)))
+    return submitted
+
+
+def _save(submitted, stats):
+    """等待一批结果并在一个事务里保存；保存或提交失败时回滚，这一批都算失败"""
+    results = []
+    for user_id, future in submitted:
+        result = future.result()
+        if result["status"] != "success":
+            stats['failed'] += 1
+            continue
+        results.append((user_id, result))
+    try:
+        for user_id, result in results:
+            AssessmentService._save_assessment_to_db(user_id, result, commit=False)
+        db.session.commit()
+        stats.update('cached' if result.get('cached') else 'generated' for _, result in results)
+    except Exception as e:
+        logger.error(f"Batch Assessment Save Error: {e}", exc_info=True)
+        db.session.rollback()
+        stats['failed'] += len(results)
+
+
+def run(workers=4, batch_size=20, active_days=30):
+    """
+    为数据有更新的用户预先生成健康评估
+    workers 个线程并发调用 AI (不超过 AI_MAX_CONCURRENCY)，每 batch_size 个用户提交一次；
+    下一批的 AI 请求在保存上一批时已经在执行，线程池不会空等
+    """
+    with app.app_context():
+        workers = max(1, min(workers, app.config.get('AI_MAX_CONCURRENCY', 8)))
+        user_ids = AssessmentService.find_stale_users(active_days=active_days)
+        if not user_ids:
+            print("✅ 所有用户的评估都是最新的")
+            return
+
+        print(f"🚀 {len(user_ids)} 个用户需要更新评估，{workers} 个线程并发生成，每 {batch_size} 个用户提交一次...")
+        stats = Counter()
+        started = time.perf_counter()
+        pending = None
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='assessment') as pool:
+                for start in range(0, len(user_ids), batch_size):
+                    submitted = _submit(pool, user_ids[start:start + batch_size], stats)
+                    if pending is not None:
+                        _save(pending, stats)
+                        _report(stats, started)
+                    pending = submitted
+                if pending is not None:
+                    _save(pending, stats)
+        finally:
+            close_clients()
+
+        elapsed = time.perf_counter() - started
+        done = stats['generated'] + stats['cached']
+        counters = get_metrics()['counters']
+        print(f"✅ 完成！生成 {stats['generated']} 个，命中缓存 {stats['cached']} 个，"
+              f"跳过 (数据不完整) {stats['skipped']} 个，失败 {stats['failed']} 个")
+        print(f"  耗时 {elapsed:.1f}s，{done / elapsed:.2f} 个/秒；"
+              f"AI 重试 {counters.get('retries', 0)} 次，因繁忙被拒绝 {counters.get('rejected_busy', 0)} 次")
+
+
+def _report(stats, started):
+    elapsed = time.perf_counter() - started
+    done = stats['generated'] + stats['cached']
+    print(f"  已完成 {done} 个，失败 {stats['failed']} 个，跳过 {stats['skipped']} 个 ({done / elapsed:.2f} 个/秒)")
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:4]))
@@ -3,7 +3,7 @@ from app import create_app
 from app.extensions import db
 
 # 必须导入 models，这样 SQLAlchemy 才知道有哪些表需要创建
-from app.models import User, HealthRecord, HealthPlan, Post, PostLike, Comment
+from app.models import User, HealthRecord, HealthPlan, Post, PostLike, Comment, HealthDailyRollup, HealthPeriodRollup, AIJob, DeviceSyncBatch, EmailOutbox
 
 app = create_app()
 
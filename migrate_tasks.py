@@ -1,62 +1,67 @@
 # migrate_tasks.py
 from app import create_app, db
 from app.models import HealthPlan, PlanTask
+from app.services.plan_service import PlanService
+from sqlalchemy import exists, insert
 import json
+import sys
 
 app = create_app()
 
 
-def migrate():
+def migrate(chunk_size=500):
+    """
+    把 health_plan.tasks_json 中的旧任务迁移到 plan_task 表
+    按计划 id 分批处理，每批 chunk_size 个计划：只查需要的列，任务一条批量 INSERT，处理完立即提交；
+    已经有任务的计划会被跳过，中断后重新运行会从未迁移的计划继续
+    """
     with app.app_context():
         print("🚀 开始迁移数据...")
 
-        # 1. 查询所有计划
-        plans = HealthPlan.query.all()
-        count = 0
+        # 还没有迁移过 (plan_task 中没有任务) 且 tasks_json 不为空的计划
+        pending = db.session.query(HealthPlan.id, HealthPlan.tasks_json, HealthPlan.created_at).filter(
+            HealthPlan.tasks_json.isnot(None),
+            HealthPlan.tasks_json.notin_(['', '[]']),
+            ~exists().where(PlanTask.plan_id == HealthPlan.id)
+        )
 
-        for plan in plans:
-            # 如果该计划已经在新表里有任务了，跳过（防止重复迁移）
-            if plan.tasks:
-                continue
+        last_id = 0
+        plans = count = 0
+        while True:
+            chunk = pending.filter(HealthPlan.id > last_id).order_by(HealthPlan.id).limit(chunk_size).all()
+            if not chunk:
+                break
 
-            # 2. 读取旧的 JSON 数据
-            if not plan.tasks_json:
-                continue
+            rows = []
+            for plan_id, tasks_json, created_at in chunk:
+                try:
+                    tasks_data = json.loads(tasks_json)
+                except Exception as e:
+                    print(f"❌ 计划 ID {plan_id} 解析失败: {e}")
+                    continue
+                # 兼容处理：有时候存的是字符串，有时候是字典；任务时间使用计划的时间
+                if isinstance(tasks_data, list):
+                    rows.extend(PlanService.task_rows(plan_id, tasks_data, created_at=created_at,
+                                                      default_title='未命名任务'))
 
             try:
-                tasks_data = json.loads(plan.tasks_json)
-
-                # 3. 遍历 JSON，插入到新表
-                if isinstance(tasks_data, list):
-                    for task_dict in tasks_data:
-                        # 兼容处理：有时候存的是字符串，有时候是字典
-                        title = ""
-                        is_done = False
-
-                        if isinstance(task_dict, dict):
-                            title = task_dict.get('title', '未命名任务')
-                            is_done = task_dict.get('done', False)
-                        elif isinstance(task_dict, str):
-                            title = task_dict
-                            is_done = False
-
-                        if title:
-                            new_task = PlanTask(
-                                plan_id=plan.id,
-                                title=title,
-                                is_done=is_done,
-                                created_at=plan.created_at  # 使用计划的时间
-                            )
-                            db.session.add(new_task)
-                            count += 1
+                if rows:
+                    db.session.execute(insert(PlanTask), rows)
+                db.session.commit()
             except Exception as e:
-                print(f"❌ 计划 ID {plan.id} 解析失败: {e}")
+                db.session.rollback()
+                print(f"❌ 计划 ID {chunk[0].id}-{chunk[-1].id} 写入失败: {e}")
+                print("已完成的批次已经提交，修复问题后重新运行即可从这里继续。")
+                sys.exit(1)
+
+            last_id = chunk[-1].id
+            plans += len(chunk)
+            count += len(rows)
+            print(f"  已处理 {plans} 个计划 (到 ID {last_id})，迁移 {count} 个任务")
 
-        # 4. 提交更改
-        db.session.commit()
         print(f"✅ 迁移完成！共迁移了 {count} 个任务。")
         print("现在你可以删除此脚本，并重启 Flask 应用了。")
 
 
 if __name__ == '__main__':
-    migrate()
\ No newline at end of file
+    migrate(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,39 @@
+"""add ai job table
+
+Revision ID: a3d6f0b2c718
+Revises: f19a7c2e5b80
+Create Date: 2026-10-18 19:24:06.531872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d6f0b2c718'
+down_revision = 'f19a7c2e5b80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ai_job',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ai_job', schema=None) as batch_op:
+        batch_op.create_index('ix_ai_job_user_id_kind_status', ['user_id', 'kind', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ai_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_ai_job_user_id_kind_status')
+
+    op.drop_table('ai_job')
@@ -0,0 +1,30 @@
+"""add health record updated at
+
+Revision ID: a4e8d2c6f1b3
+Revises: f3a7c1e9d2b5
+Create Date: 2026-10-19 14:08:17.902245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e8d2c6f1b3'
+down_revision = 'f3a7c1e9d2b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('health_record', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # 已有记录不知道写入时间，取记录日期的零点 (与原来按日期判断评估是否过期的结果一致)
+    midnight = 'datetime(date)' if op.get_bind().dialect.name == 'sqlite' else 'CAST(date AS DATETIME)'
+    op.execute(f"UPDATE health_record SET updated_at = {midnight} WHERE date IS NOT NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('health_record', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
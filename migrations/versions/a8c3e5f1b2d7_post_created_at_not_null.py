@@ -0,0 +1,36 @@
+"""make post.created_at not null for keyset pagination
+
+Revision ID: a8c3e5f1b2d7
+Revises: e6b2d8f4a190
+Create Date: 2026-10-18 23:41:06.582913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c3e5f1b2d7'
+down_revision = 'e6b2d8f4a190'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 游标里 created_at 为 NULL 时解析不出来，前端会回到第一页无限循环
+    # 没有时间的旧帖子取最早一条帖子的时间，排在动态最后 (MySQL 不允许直接子查询同一张表，包一层派生表)
+    op.execute("UPDATE post SET created_at = (SELECT t.earliest FROM (SELECT MIN(created_at) AS earliest "
+               "FROM post) AS t) WHERE created_at IS NULL")
+    op.execute("UPDATE post SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               nullable=True)
@@ -0,0 +1,62 @@
+"""add composite indexes for per-user time-series queries
+
+Revision ID: b7e3f1a9c2d4
+Revises: 746e695fccc2
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f1a9c2d4'
+down_revision = '746e695fccc2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 唯一约束之前先清理重复点赞，只保留每个 (post_id, user_id) 最早的一条
+    op.execute(
+        "DELETE FROM post_like WHERE id NOT IN ("
+        "SELECT id FROM (SELECT MIN(id) AS id FROM post_like GROUP BY post_id, user_id) AS keep_rows)"
+    )
+
+    with op.batch_alter_table('health_record', schema=None) as batch_op:
+        batch_op.create_index('ix_health_record_user_id_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('health_plan', schema=None) as batch_op:
+        batch_op.create_index('ix_health_plan_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('plan_task', schema=None) as batch_op:
+        batch_op.create_index('ix_plan_task_plan_id', ['plan_id'], unique=False)
+
+    with op.batch_alter_table('post_like', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_post_like_post_id_user_id', ['post_id', 'user_id'])
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_post_id_created_at', ['post_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_is_announcement_created_at', ['is_announcement', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_is_announcement_created_at')
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_post_id_created_at')
+
+    with op.batch_alter_table('post_like', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_post_like_post_id_user_id', type_='unique')
+
+    with op.batch_alter_table('plan_task', schema=None) as batch_op:
+        batch_op.drop_index('ix_plan_task_plan_id')
+
+    with op.batch_alter_table('health_plan', schema=None) as batch_op:
+        batch_op.drop_index('ix_health_plan_user_id_created_at')
+
+    with op.batch_alter_table('health_record', schema=None) as batch_op:
+        batch_op.drop_index('ix_health_record_user_id_date')
@@ -0,0 +1,34 @@
+"""add device sync batch table
+
+Revision ID: b94e1d7c3f26
+Revises: a3d6f0b2c718
+Create Date: 2026-10-19 10:12:47.205318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b94e1d7c3f26'
+down_revision = 'a3d6f0b2c718'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('device_sync_batch',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('batch_id', sa.String(length=64), nullable=False),
+        sa.Column('result', sa.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'batch_id', name='uq_device_sync_batch_user_id_batch_id')
+    )
+
+
+def downgrade():
+    op.drop_table('device_sync_batch')
@@ -0,0 +1,78 @@
+"""merge same-day health records and make (user_id, date) unique
+
+Revision ID: c0f4e8a2d6b1
+Revises: b94e1d7c3f26
+Create Date: 2026-10-18 15:42:09.613027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c0f4e8a2d6b1'
+down_revision = 'b94e1d7c3f26'
+branch_labels = None
+depends_on = None
+
+RECORD_FIELDS = ('weight', 'steps', 'calories', 'body_fat', 'water_intake', 'blood_glucose', 'note',
+                 'sleep_hours', 'heart_rate', 'blood_pressure_high', 'blood_pressure_low')
+
+# 累计值取较大值，其余字段取最新一条非空的值 (与设备同步的合并规则一致)
+MAX_FIELDS = ('steps', 'calories')
+
+health_record = sa.table(
+    'health_record',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('date', sa.Date),
+    *[sa.column(field) for field in RECORD_FIELDS]
+)
+
+
+def _merge_duplicates(bind):
+    """同一用户同一天的多条记录合并到 id 最大的一条，其余删除，返回合并的天数"""
+    groups = bind.execute(
+        sa.select(health_record.c.user_id, health_record.c.date)
+        .where(health_record.c.date.isnot(None))
+        .group_by(health_record.c.user_id, health_record.c.date)
+        .having(sa.func.count() > 1)
+    ).all()
+
+    for user_id, day in groups:
+        same_day = sa.and_(health_record.c.user_id == user_id, health_record.c.date == day)
+        rows = bind.execute(sa.select(health_record).where(same_day).order_by(health_record.c.id)).mappings().all()
+
+        merged = {}
+        for row in rows:
+            for field in RECORD_FIELDS:
+                value = row[field]
+                if value is None:
+                    continue
+                if field in MAX_FIELDS and merged.get(field) is not None:
+                    value = max(merged[field], value)
+                merged[field] = value
+
+        keep_id = rows[-1]['id']
+        bind.execute(health_record.update().where(health_record.c.id == keep_id)
+                     .values({field: merged.get(field) for field in RECORD_FIELDS}))
+        bind.execute(health_record.delete().where(same_day, health_record.c.id != keep_id))
+    return len(groups)
+
+
+def upgrade():
+    merged = _merge_duplicates(op.get_bind())
+    if merged:
+        # 汇总表是按合并前的记录算的，迁移完成后运行 python rebuild_rollups.py 重建
+        print(f"merged duplicate health records on {merged} user-days; run rebuild_rollups.py afterwards")
+
+    # 先建唯一约束再删旧索引，user_id 外键始终有可用的索引
+    with op.batch_alter_table('health_record', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_health_record_user_id_date', ['user_id', 'date'])
+        batch_op.drop_index('ix_health_record_user_id_date')
+
+
+def downgrade():
+    with op.batch_alter_table('health_record', schema=None) as batch_op:
+        batch_op.create_index('ix_health_record_user_id_date', ['user_id', 'date'], unique=False)
+        batch_op.drop_constraint('uq_health_record_user_id_date', type_='unique')
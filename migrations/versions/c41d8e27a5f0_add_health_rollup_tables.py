@@ -0,0 +1,127 @@
+"""add health rollup tables
+
+Revision ID: c41d8e27a5f0
+Revises: b7e3f1a9c2d4
+Create Date: 2026-10-18 11:03:47.218553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import timedelta
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8e27a5f0'
+down_revision = 'b7e3f1a9c2d4'
+branch_labels = None
+depends_on = None
+
+
+def _aggregate_columns():
+    return [
+        sa.Column('record_count', sa.Integer(), nullable=True),
+        sa.Column('weight_sum', sa.Float(), nullable=True),
+        sa.Column('weight_count', sa.Integer(), nullable=True),
+        sa.Column('steps_sum', sa.Integer(), nullable=True),
+        sa.Column('steps_count', sa.Integer(), nullable=True),
+        sa.Column('sleep_sum', sa.Float(), nullable=True),
+        sa.Column('sleep_count', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    ]
+
+
+AGGREGATE_FIELDS = ('record_count', 'weight_sum', 'weight_count', 'steps_sum', 'steps_count',
+                    'sleep_sum', 'sleep_count')
+
+# 回填周/月汇总时每次读取的用户数
+BACKFILL_CHUNK_USERS = 200
+
+health_record = sa.table(
+    'health_record',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('weight', sa.Float),
+    sa.column('steps', sa.Integer),
+    sa.column('sleep_hours', sa.Float),
+)
+health_daily_rollup = sa.table(
+    'health_daily_rollup',
+    sa.column('user_id', sa.Integer),
+    sa.column('day', sa.Date),
+    *[sa.column(field) for field in AGGREGATE_FIELDS]
+)
+health_period_rollup = sa.table(
+    'health_period_rollup',
+    sa.column('user_id', sa.Integer),
+    sa.column('period', sa.String),
+    sa.column('period_start', sa.Date),
+    *[sa.column(field) for field in AGGREGATE_FIELDS]
+)
+
+
+def _backfill(bind):
+    """
+    从已有的 health_record 回填汇总表 (口径与 RollupService 一致)，升级后报告页马上有数据
+    日汇总用一条 INSERT ... SELECT ... GROUP BY；周/月汇总按用户分块读取日汇总，在内存中累加后批量插入
+    """
+    r = health_record.c
+    bind.execute(health_daily_rollup.insert().from_select(
+        ['user_id', 'day', *AGGREGATE_FIELDS],
+        sa.select(
+            r.user_id, r.date,
+            sa.func.count(r.id),
+            sa.func.coalesce(sa.func.sum(sa.case((r.weight > 0, r.weight))), 0),
+            sa.func.count(sa.case((r.weight > 0, 1))),
+            sa.func.coalesce(sa.func.sum(sa.case((r.steps > 0, r.steps))), 0),
+            sa.func.count(sa.case((r.steps > 0, 1))),
+            sa.func.coalesce(sa.func.sum(sa.case((r.sleep_hours > 0, r.sleep_hours))), 0),
+            sa.func.count(sa.case((r.sleep_hours > 0, 1))),
+        ).where(r.date.isnot(None)).group_by(r.user_id, r.date)
+    ))
+
+    d = health_daily_rollup.c
+    user_ids = [uid for (uid,) in bind.execute(sa.select(d.user_id).distinct().order_by(d.user_id))]
+    for i in range(0, len(user_ids), BACKFILL_CHUNK_USERS):
+        periods = {}
+        rows = bind.execute(sa.select(d.user_id, d.day, *[d[field] for field in AGGREGATE_FIELDS])
+                            .where(d.user_id.in_(user_ids[i:i + BACKFILL_CHUNK_USERS])))
+        for row in rows:
+            for period, start in (('week', row.day - timedelta(days=row.day.weekday())),
+                                  ('month', row.day.replace(day=1))):
+                bucket = periods.setdefault((row.user_id, period, start), dict.fromkeys(AGGREGATE_FIELDS, 0))
+                for field in AGGREGATE_FIELDS:
+                    bucket[field] += getattr(row, field) or 0
+        if periods:
+            bind.execute(health_period_rollup.insert(), [
+                {'user_id': uid, 'period': period, 'period_start': start, **values}
+                for (uid, period, start), values in periods.items()
+            ])
+
+
+def upgrade():
+    op.create_table('health_daily_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        *_aggregate_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'day', name='uq_health_daily_rollup_user_id_day')
+    )
+    op.create_table('health_period_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        *_aggregate_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'period', 'period_start', name='uq_health_period_rollup_user_period_start')
+    )
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    op.drop_table('health_period_rollup')
+    op.drop_table('health_daily_rollup')
@@ -0,0 +1,35 @@
+"""add post like/comment counters
+
+Revision ID: d5a0c3b8e914
+Revises: c41d8e27a5f0
+Create Date: 2026-10-18 13:25:09.671304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a0c3b8e914'
+down_revision = 'c41d8e27a5f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # 用现有数据回填计数
+    op.execute(
+        "UPDATE post SET "
+        "like_count = (SELECT COUNT(*) FROM post_like WHERE post_like.post_id = post.id), "
+        "comment_count = (SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,28 @@
+"""add ai job dedup key
+
+Revision ID: e6b2d8f4a190
+Revises: d5a1c9e3f702
+Create Date: 2026-10-18 22:14:52.307416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b2d8f4a190'
+down_revision = 'd5a1c9e3f702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ai_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dedup_key', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_ai_job_dedup_key', ['dedup_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('ai_job', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_ai_job_dedup_key', type_='unique')
+        batch_op.drop_column('dedup_key')
@@ -0,0 +1,29 @@
+"""add ngram fulltext index on post title/content
+
+Revision ID: e82f4b6d1c37
+Revises: d5a0c3b8e914
+Create Date: 2026-10-18 14:40:12.904731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e82f4b6d1c37'
+down_revision = 'd5a0c3b8e914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FULLTEXT + ngram 分词器只有 MySQL 支持，其他数据库使用进程内倒排索引
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    op.execute("CREATE FULLTEXT INDEX ft_post_title_content ON post (title, content) WITH PARSER ngram")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    op.drop_index('ft_post_title_content', table_name='post')
@@ -0,0 +1,35 @@
+"""make post.is_announcement not null for keyset pagination
+
+Revision ID: f19a7c2e5b80
+Revises: e82f4b6d1c37
+Create Date: 2026-10-18 15:52:38.116024
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19a7c2e5b80'
+down_revision = 'e82f4b6d1c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 游标分页按 (is_announcement, created_at, id) 比较，NULL 会导致帖子被跳过
+    op.execute("UPDATE post SET is_announcement = 0 WHERE is_announcement IS NULL")
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('is_announcement',
+               existing_type=sa.Boolean(),
+               nullable=False,
+               server_default=sa.false())
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('is_announcement',
+               existing_type=sa.Boolean(),
+               nullable=True,
+               server_default=None)
@@ -0,0 +1,29 @@
+"""add ai job started at
+
+Revision ID: f3a7c1e9d2b5
+Revises: a8c3e5f1b2d7
+Create Date: 2026-10-19 10:26:41.583092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c1e9d2b5'
+down_revision = 'a8c3e5f1b2d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ai_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+
+    # 升级前已经在执行的任务没有开始时间，按创建时间计算超时
+    op.execute("UPDATE ai_job SET started_at = created_at WHERE status = 'running'")
+
+
+def downgrade():
+    with op.batch_alter_table('ai_job', schema=None) as batch_op:
+        batch_op.drop_column('started_at')
@@ -0,0 +1,21 @@
+# rebuild_rollups.py
+from app import create_app
+from app.services.rollup_service import RollupService
+import sys
+
+app = create_app()
+
+
+def rebuild(chunk_size=200):
+    with app.app_context():
+        print("🚀 开始从 health_record 回填汇总表...")
+
+        def report(users, days):
+            print(f"  已处理 {users} 个用户，写入 {days} 条日汇总")
+
+        users, days = RollupService.rebuild(chunk_size=chunk_size, progress=report)
+        print(f"✅ 回填完成！共处理 {users} 个用户，{days} 条日汇总。")
+
+
+if __name__ == '__main__':
+    rebuild(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
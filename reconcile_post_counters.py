@@ -0,0 +1,16 @@
+# reconcile_post_counters.py
+from app import create_app
+from app.services.post_service import PostService
+
+app = create_app()
+
+
+def reconcile():
+    with app.app_context():
+        print("🚀 开始校对帖子点赞/评论计数...")
+        repaired = PostService.reconcile_counters()
+        print(f"✅ 校对完成！共修复了 {repaired} 个帖子的计数。")
+
+
+if __name__ == '__main__':
+    reconcile()
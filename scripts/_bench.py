@@ -0,0 +1,53 @@
+# scripts/_bench.py
+"""
+基准脚本共用的工具：在配置的数据库里创建临时用户、批量写入数据、模拟登录
+临时用户退出时连同其记录、汇总、同步批次和帖子一起删除
+脚本在仓库根目录以模块方式运行，例如 python -m scripts.bench_dashboard 100 1000
+"""
+from app.extensions import db
+from app.models import User, HealthRecord, HealthDailyRollup, HealthPeriodRollup, DeviceSyncBatch, Post
+from contextlib import contextmanager
+from sqlalchemy import insert
+import time
+
+# 基准脚本会写入的、按 user_id 归属的表
+USER_TABLES = (DeviceSyncBatch, HealthDailyRollup, HealthPeriodRollup, HealthRecord, Post)
+
+
+@contextmanager
+def temp_user(app, name, **fields):
+    """创建临时用户并返回 user_id，退出时删除该用户及其数据"""
+    with app.app_context():
+        user = User(username=f'bench_{name}_{int(time.time() * 1000)}', password='-', nickname='bench', **fields)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    try:
+        yield user_id
+    finally:
+        with app.app_context():
+            for model in USER_TABLES:
+                model.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+            User.query.filter_by(id=user_id).delete(synchronize_session=False)
+            db.session.commit()
+
+
+def insert_rows(model, rows, chunk_size=5000):
+    """rows 为字典的可迭代对象 (可以是生成器)，每 chunk_size 行一条批量 INSERT，最后提交"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            db.session.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+    db.session.commit()
+
+
+def login(app, user_id):
+    """返回已登录为 user_id 的测试客户端"""
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'] = user_id
+    return client
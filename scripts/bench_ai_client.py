@@ -0,0 +1,80 @@
+# scripts/bench_ai_client.py
+from app import create_app
+from app.services.ai_service import call_deepseek_advisor, close_clients
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from openai import OpenAI
+import json
+import statistics
+import sys
+import threading
+import time
+
+app = create_app()
+
+STUB_REPLY = json.dumps({
+    'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'deepseek-chat',
+    'choices': [{'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': '{"reply": "ok"}'}}],
+    'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地 OpenAI 兼容接口：任何 POST 都立即返回固定的 chat.completion"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(STUB_REPLY)))
+        self.end_headers()
+        self.wfile.write(STUB_REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+def call_with_new_client(messages):
+    """旧实现：每次调用新建客户端"""
+    client = OpenAI(api_key=app.config['DEEPSEEK_API_KEY'], base_url=app.config['DEEPSEEK_BASE_URL'])
+    try:
+        response = client.chat.completions.create(model="deepseek-chat", messages=messages, temperature=0.7)
+        return response.choices[0].message.content
+    finally:
+        client.close()
+
+
+def measure(label, func, calls):
+    messages = [{"role": "user", "content": "ping"}]
+    func(messages)  # 预热
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        func(messages)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"  {label}: 平均 {statistics.mean(latencies):.2f} ms，"
+          f"p50 {latencies[len(latencies) // 2]:.2f} ms，p95 {latencies[int(len(latencies) * 0.95)]:.2f} ms")
+
+
+def bench(calls=200):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    app.config['DEEPSEEK_API_KEY'] = 'stub'
+    app.config['DEEPSEEK_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+
+    print(f"🚀 本地桩服务 {app.config['DEEPSEEK_BASE_URL']}，每种方式调用 {calls} 次")
+    try:
+        with app.app_context():
+            measure('每次新建客户端', call_with_new_client, calls)
+            measure('共享连接池客户端', call_deepseek_advisor, calls)
+    finally:
+        close_clients()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
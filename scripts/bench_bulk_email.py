@@ -0,0 +1,92 @@
+# scripts/bench_bulk_email.py
+from app import create_app
+from config import Config
+from app.extensions import db
+from app.models import EmailOutbox
+from app.services.email_service import EmailService
+from flask import render_template
+from types import SimpleNamespace
+import sys
+import time
+import tracemalloc
+
+
+class BenchConfig(Config):
+    # 只测渲染和写入发件箱：不启动发送线程，写入的邮件在结束时删除
+    MAIL_OUTBOX_WORKERS = 0
+
+
+app = create_app(BenchConfig)
+
+
+def make_recipients(count):
+    """生成器：模拟逐行读取的收件人，不在内存里保留整张用户表"""
+    for i in range(count):
+        yield SimpleNamespace(email=f'user{i}@example.com', nickname=f'用户{i}')
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cleanup():
+    EmailOutbox.query.filter_by(kind='bench_bulk').delete(synchronize_session=False)
+    db.session.commit()
+
+
+def bench(count=100000, sample=2000):
+    with app.test_request_context():
+        print(f"⏱️ 渲染重置密码邮件 (每封 token 不同)，{sample} 封：")
+        started = time.perf_counter()
+        expected = [render_template('email/reset_password.html', user=user, token=user.email)
+                    for user in make_recipients(sample)]
+        per_template = (time.perf_counter() - started) / sample
+        started = time.perf_counter()
+        rendered = [html for _, html in EmailService.render_many('email/reset_password.html', make_recipients(sample),
+                                                                 variables=lambda user: {'token': user.email})]
+        per_many = (time.perf_counter() - started) / sample
+        if rendered != expected:
+            print("  ❌ render_many 与 render_template 的结果不一致")
+            sys.exit(1)
+        print(f"  render_template：每封 {per_template * 1e6:.1f} µs；render_many：每封 {per_many * 1e6:.1f} µs")
+
+        cleanup()
+        try:
+            print(f"🚀 群发 {count} 封欢迎邮件到发件箱...")
+            started = time.perf_counter()
+            total = EmailService.send_bulk('bench_bulk', 'email/welcome.html', '🎉 欢迎加入 Health Assistant！',
+                                           make_recipients(count))
+            elapsed = time.perf_counter() - started
+            print(f"  send_bulk：{elapsed:.2f} s ({total / elapsed:.0f} 封/秒)")
+
+            # 对比：原来每封邮件 render_template + 单独写入一条
+            started = time.perf_counter()
+            for user in make_recipients(sample):
+                html = render_template('email/welcome.html', user=user)
+                EmailService.enqueue('bench_bulk', [user.email], '🎉 欢迎加入 Health Assistant！', html)
+            per_email = (time.perf_counter() - started) / sample
+            print(f"  逐封渲染并写入：每封 {per_email * 1000:.2f} ms，{count} 封约需 {per_email * count:.0f} s")
+            cleanup()
+
+            # 收件人数量增加 10 倍，峰值内存应该基本不变
+            small = peak_memory(lambda: EmailService.send_bulk(
+                'bench_bulk', 'email/welcome.html', 'bench', make_recipients(count // 10)))
+            cleanup()
+            large = peak_memory(lambda: EmailService.send_bulk(
+                'bench_bulk', 'email/welcome.html', 'bench', make_recipients(count)))
+            print(f"  峰值内存：{count // 10} 封 {small / 1024 / 1024:.1f} MB，{count} 封 {large / 1024 / 1024:.1f} MB")
+            if large > small * 2:
+                print("  ❌ 峰值内存随收件人数量增长")
+                sys.exit(1)
+        finally:
+            cleanup()
+    print("✅ 完成")
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,103 @@
+# scripts/bench_chat_stream.py
+from app import create_app, db
+from app.models import HealthRecord
+from app.services.ai_service import close_clients
+from scripts._bench import temp_user, login
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date
+import json
+import sys
+import threading
+import time
+
+app = create_app()
+
+# 模拟模型输出：按 TOKEN_DELAY 秒一个片段逐段返回
+REPLY = {'reply': '根据您的数据，建议每天保持 8000 步以上的步行，并保证 7 小时睡眠。', 'tasks': []}
+TOKEN_SIZE = 4
+TOKEN_DELAY = 0.05
+
+
+def _chunk(content=None, finish=None):
+    delta = {'content': content} if content is not None else {}
+    return {'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'deepseek-chat',
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地 OpenAI 兼容接口：stream=true 时按固定间隔逐段推送，否则等全部"生成"完再一次性返回"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        text = json.dumps(REPLY, ensure_ascii=False)
+        pieces = [text[i:i + TOKEN_SIZE] for i in range(0, len(text), TOKEN_SIZE)]
+
+        if not body.get('stream'):
+            time.sleep(TOKEN_DELAY * len(pieces))
+            payload = json.dumps({
+                'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'deepseek-chat',
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': text}}],
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for piece in pieces:
+            time.sleep(TOKEN_DELAY)
+            self.wfile.write(f"data: {json.dumps(_chunk(piece))}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(f"data: {json.dumps(_chunk(finish='stop'))}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(client, url):
+    """返回 (首字节时间, 完整响应时间)，单位毫秒"""
+    started = time.perf_counter()
+    response = client.post(url, json={'message': '最近状态怎么样？'}, buffered=False)
+    first = None
+    for chunk in response.response:
+        if chunk and first is None:
+            first = time.perf_counter()
+    response.close()
+    total = time.perf_counter()
+    return (first - started) * 1000, (total - started) * 1000
+
+
+def bench(rounds=5):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    app.config['DEEPSEEK_API_KEY'] = 'stub'
+    app.config['DEEPSEEK_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+
+    print(f"🚀 模拟模型每 {TOKEN_DELAY * 1000:.0f} ms 输出一段，各请求 {rounds} 次")
+    try:
+        with temp_user(app, 'chat', height=170) as user_id:
+            with app.app_context():
+                db.session.add(HealthRecord(user_id=user_id, date=date.today(), weight=60, steps=8000))
+                db.session.commit()
+            client = login(app, user_id)
+            for label, url in (('普通接口 /plan/chat', '/plan/chat'), ('流式接口 /plan/chat/stream', '/plan/chat/stream')):
+                results = [measure(client, url) for _ in range(rounds)]
+                ttfb = sum(r[0] for r in results) / rounds
+                total = sum(r[1] for r in results) / rounds
+                print(f"  {label}: 首字节 {ttfb:.0f} ms，完整响应 {total:.0f} ms")
+    finally:
+        close_clients()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,118 @@
+# scripts/bench_dashboard.py
+from app import create_app, db
+from app.models import User, HealthRecord, HealthPlan
+from app.services.stats_service import StatsService
+from scripts._bench import temp_user, insert_rows
+from datetime import date, timedelta
+from sqlalchemy import event
+import random
+import sys
+import time
+
+app = create_app()
+
+# 断签的位置：最近 STREAK 天连续打卡
+STREAK = 30
+
+
+def legacy_dashboard_data(user_id):
+    """原来的实现：最近 14 条、全部记录 (热力图)、全部记录倒序 (连签) 各查一次，连签在 Python 里逐行计算"""
+    user = User.query.get(user_id)
+    records = HealthRecord.query.filter_by(user_id=user_id) \
+        .order_by(HealthRecord.date.desc()).limit(14).all()[::-1]
+    chart_data = {
+        "dates": [r.date.strftime('%m-%d') for r in records],
+        "weights": [r.weight for r in records],
+        "steps": [r.steps for r in records],
+        "sleep_hours": [r.sleep_hours if r.sleep_hours else None for r in records],
+        "heart_rates": [r.heart_rate if r.heart_rate else None for r in records],
+        "body_fats": [r.body_fat if r.body_fat else None for r in records],
+        "water_intakes": [r.water_intake if r.water_intake else None for r in records],
+        "blood_glucoses": [r.blood_glucose if r.blood_glucose else None for r in records],
+    }
+    latest_plan = HealthPlan.query.filter_by(user_id=user_id).order_by(HealthPlan.created_at.desc()).first()
+    today_score = StatsService._calculate_vitality_score(user, records)
+
+    streak = 0
+    ordered = HealthRecord.query.filter_by(user_id=user_id).order_by(HealthRecord.date.desc()).all()
+    if ordered and (date.today() - ordered[0].date).days <= 1:
+        streak = 1
+        prev = ordered[0].date
+        for r in ordered[1:]:
+            diff = (prev - r.date).days
+            if diff == 1:
+                streak += 1
+                prev = r.date
+            elif diff:
+                break
+
+    heatmap_data = [[r.date.strftime('%Y-%m-%d'), r.steps]
+                    for r in HealthRecord.query.filter_by(user_id=user_id).all() if r.steps]
+    return {"user": user, "chart_data": chart_data, "latest_plan": latest_plan, "today_score": today_score,
+            "streak_days": streak, "heatmap_data": heatmap_data}
+
+
+def make_records(user_id, count):
+    """从今天往前每天一条记录，第 STREAK 天断签"""
+    today = date.today()
+    for i in range(count):
+        yield {
+            'user_id': user_id,
+            'date': today - timedelta(days=i + (1 if i >= STREAK else 0)),
+            'weight': round(random.uniform(55, 75), 1),
+            'steps': random.choice([0, random.randint(1000, 20000)]),
+            'sleep_hours': round(random.uniform(5, 9), 1),
+            'heart_rate': random.randint(55, 100),
+            'water_intake': random.randint(500, 3000),
+        }
+
+
+def measure(fn, user_id, rounds):
+    """返回 (结果, 每次查询数, 平均耗时)"""
+    statements = []
+
+    def on_execute(*args):
+        statements.append(1)
+
+    db.session.expire_all()
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        result = fn(user_id)
+        queries = len(statements)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        db.session.expire_all()
+        fn(user_id)
+    return result, queries, (time.perf_counter() - started) / rounds
+
+
+def comparable(data):
+    return (data['chart_data'], data['today_score'], data['streak_days'], sorted(data['heatmap_data']))
+
+
+def bench(sizes=(100, 1000, 10000), rounds=20):
+    failures = []
+    print(f"⏱️ 仪表盘数据 (每次平均，{rounds} 轮)：")
+    print(f"  {'记录数':>8} {'原实现':>20} {'单次 SQL':>20}")
+    for size in sizes:
+        with temp_user(app, f'dashboard_{size}', height=170, weight=60) as user_id, app.app_context():
+            insert_rows(HealthRecord, make_records(user_id, size))
+            old, old_queries, old_time = measure(legacy_dashboard_data, user_id, rounds)
+            new, new_queries, new_time = measure(StatsService.get_dashboard_data, user_id, rounds)
+            print(f"  {size:>8} {old_time * 1000:>10.1f}ms {old_queries:>2} 条查询"
+                  f" {new_time * 1000:>10.1f}ms {new_queries:>2} 条查询")
+            if comparable(old) != comparable(new):
+                failures.append(f"{size} 条记录时结果与原实现不一致")
+
+    for failure in failures:
+        print(f"  ❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ 结果与原实现一致")
+
+
+if __name__ == '__main__':
+    bench(tuple(int(n) for n in sys.argv[1:]) or (100, 1000, 10000))
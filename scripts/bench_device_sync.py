@@ -0,0 +1,61 @@
+# scripts/bench_device_sync.py
+from app import create_app
+from scripts._bench import temp_user, login
+from datetime import datetime, timedelta
+import json
+import random
+import sys
+import time
+
+app = create_app()
+
+
+def make_readings(count, days=30):
+    """模拟手环缓存的读数：均匀分布在最近 days 天，步数/卡路里为当天累计值"""
+    start = datetime.now().replace(microsecond=0) - timedelta(days=days)
+    step = timedelta(days=days) / count
+    readings = []
+    for i in range(count):
+        ts = start + step * i
+        reading = {'timestamp': ts.isoformat(), 'heart_rate': random.randint(55, 110)}
+        if i % 4 == 0:
+            reading.update(steps=ts.hour * 600 + ts.minute * 10, calories=ts.hour * 20)
+        if i % 50 == 0:
+            reading.update(blood_pressure_high=random.randint(105, 135), blood_pressure_low=random.randint(65, 85))
+        readings.append(reading)
+    return readings
+
+
+def bench(count=10000, single_rounds=200):
+    readings = make_readings(count)
+    print(f"🚀 批量同步 {count} 条读数 (最近 30 天)...")
+    with temp_user(app, 'sync', height=170, weight=60) as user_id:
+        client = login(app, user_id)
+        started = time.perf_counter()
+        response = client.post('/api/upload_health_data/batch', json={'batch_id': 'bench-json', 'readings': readings})
+        elapsed = time.perf_counter() - started
+        result = response.get_json()
+        print(f"  JSON 数组：{elapsed * 1000:.0f} ms ({count / elapsed:.0f} 条/秒)，{result['message']}")
+
+        ndjson = '\n'.join(json.dumps(r) for r in readings)
+        started = time.perf_counter()
+        response = client.post('/api/upload_health_data/batch?batch_id=bench-ndjson', data=ndjson,
+                               content_type='application/x-ndjson')
+        elapsed = time.perf_counter() - started
+        print(f"  NDJSON：{elapsed * 1000:.0f} ms ({count / elapsed:.0f} 条/秒)，{response.get_json()['message']}")
+
+        started = time.perf_counter()
+        response = client.post('/api/upload_health_data/batch', json={'batch_id': 'bench-json', 'readings': readings})
+        elapsed = time.perf_counter() - started
+        print(f"  重复提交同一批次：{elapsed * 1000:.0f} ms，replayed={response.get_json().get('replayed')}")
+
+        # 对比：原单条同步接口每次只能写今天的一条读数
+        started = time.perf_counter()
+        for reading in readings[:single_rounds]:
+            client.post('/api/upload_health_data', json={k: v for k, v in reading.items() if k != 'timestamp'})
+        per_call = (time.perf_counter() - started) / single_rounds
+        print(f"  单条接口：每条 {per_call * 1000:.2f} ms，{count} 条约需 {per_call * count:.1f} s")
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,100 @@
+# scripts/bench_export.py
+from app import create_app
+from app.models import HealthRecord
+from scripts._bench import temp_user, insert_rows, login
+from datetime import date, timedelta
+import csv
+import io
+import random
+import sys
+import time
+import tracemalloc
+
+app = create_app()
+
+# 峰值内存目标 (MB)：流式导出只持有一块数据，与记录数无关
+PEAK_MEMORY_TARGET_MB = 16
+
+
+def legacy_export(user_id):
+    """原来的实现：一次取出全部记录，先写进 StringIO，再整体编码成 bytes"""
+    records = HealthRecord.query.filter_by(user_id=user_id).order_by(HealthRecord.date.desc()).all()
+    si = io.StringIO()
+    cw = csv.writer(si)
+    cw.writerow(['日期', '体重(kg)', '体脂率(%)', '步数', '饮水量(ml)', '卡路里', '睡眠(h)', '血糖(mmol/L)',
+                 '心率(bpm)', '高压', '低压', '备注'])
+    for r in records:
+        cw.writerow([r.date, r.weight, r.body_fat, r.steps, r.water_intake, r.calories, r.sleep_hours,
+                     r.blood_glucose, r.heart_rate, r.blood_pressure_high, r.blood_pressure_low, r.note])
+    return len(si.getvalue().encode('utf-8-sig'))
+
+
+def streaming_export(client, gzip=False):
+    """请求 /record/export 并逐块读取响应 (不缓冲)，返回响应体字节数"""
+    headers = {'Accept-Encoding': 'gzip'} if gzip else {'Accept-Encoding': 'identity'}
+    response = client.get('/record/export', headers=headers, buffered=False)
+    try:
+        return sum(len(chunk) for chunk in response.iter_encoded())
+    finally:
+        response.close()
+
+
+def make_records(user_id, count):
+    today = date.today()
+    for i in range(count):
+        yield {
+            'user_id': user_id,
+            'date': today - timedelta(days=i),
+            'weight': round(random.uniform(55, 75), 1),
+            'steps': random.randint(0, 20000),
+            'calories': random.randint(1200, 3000),
+            'sleep_hours': round(random.uniform(5, 9), 1),
+            'heart_rate': random.randint(55, 100),
+            'water_intake': random.randint(500, 3000),
+            'note': '导出测试',
+        }
+
+
+def measure(fn):
+    """返回 (结果, 耗时, 峰值内存 MB)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn()
+        elapsed = time.perf_counter() - started
+        return result, elapsed, tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench(sizes=(10000, 100000)):
+    failures = []
+    print(f"  {'记录数':>8} {'原实现 (StringIO)':>26} {'流式导出':>26} {'流式 + gzip':>26}")
+    for size in sizes:
+        with temp_user(app, f'export_{size}') as user_id:
+            with app.app_context():
+                insert_rows(HealthRecord, make_records(user_id, size))
+                legacy = measure(lambda: legacy_export(user_id))
+            client = login(app, user_id)
+            plain = measure(lambda: streaming_export(client))
+            gzipped = measure(lambda: streaming_export(client, gzip=True))
+            cells = [f"{elapsed:.2f}s {peak:>6.1f}MB {nbytes / 1024 / 1024:>5.1f}MB"
+                     for nbytes, elapsed, peak in (legacy, plain, gzipped)]
+            print(f"  {size:>8} " + ' '.join(f"{cell:>26}" for cell in cells))
+            failures += [f"{size} 条记录时{label}峰值内存 {peak:.1f} MB，超过 {PEAK_MEMORY_TARGET_MB} MB"
+                         for label, (_, _, peak) in (('流式导出', plain), ('gzip 导出', gzipped))
+                         if peak > PEAK_MEMORY_TARGET_MB]
+            if plain[0] != legacy[0]:
+                failures.append(f"{size} 条记录时导出大小 {plain[0]} 与原实现 {legacy[0]} 不一致")
+    print("  (每格为 耗时、峰值内存、响应体大小)")
+
+    for failure in failures:
+        print(f"  ❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"✅ 流式导出峰值内存不随记录数增长 (≤ {PEAK_MEMORY_TARGET_MB} MB)")
+
+
+if __name__ == '__main__':
+    print("🚀 导出 CSV 的内存占用...")
+    bench(tuple(int(n) for n in sys.argv[1:]) or (10000, 100000))
@@ -0,0 +1,77 @@
+# scripts/bench_import.py
+from app import create_app
+from app.blueprints.health.service import RecordService, CSV_FIELD_MAP
+from scripts._bench import temp_user
+from datetime import date, timedelta
+import csv
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+app = create_app()
+
+# 峰值内存目标 (MB)：导入过程只应持有一批数据，与文件行数无关
+PEAK_MEMORY_TARGET_MB = 64
+
+
+def write_sample_csv(f, rows):
+    """生成 rows 行模拟数据 (每行一天，从今天往前倒推)"""
+    text = open(f.fileno(), 'w', encoding='utf-8-sig', newline='', closefd=False)
+    writer = csv.writer(text)
+    writer.writerow(list(CSV_FIELD_MAP))
+    start = date.today() - timedelta(days=rows)
+    for i in range(rows):
+        writer.writerow([
+            (start + timedelta(days=i)).isoformat(),
+            round(random.uniform(50, 90), 1),
+            round(random.uniform(10, 30), 1),
+            random.randint(0, 20000),
+            random.randint(500, 3000),
+            random.randint(1200, 3000),
+            round(random.uniform(5, 9), 1),
+            round(random.uniform(4, 7), 1),
+            random.randint(55, 100),
+            random.randint(100, 140),
+            random.randint(60, 90),
+            '导入测试',
+        ])
+    text.flush()
+    f.seek(0)
+
+
+def bench(rows=50000):
+    with temp_user(app, 'import', weight=60) as user_id, app.app_context():
+        with tempfile.TemporaryFile() as f:
+            write_sample_csv(f, rows)
+            print(f"🚀 开始导入 {rows} 行...")
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            result = RecordService.import_csv(user_id, f)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        peak_mb = peak / 1024 / 1024
+        print(f"  {result['message']}")
+        print(f"  耗时 {elapsed:.1f}s ({rows / elapsed:.0f} 行/秒)，峰值内存 {peak_mb:.1f} MB")
+        ok = result['status'] == 'success' and result['imported'] == rows \
+            and peak_mb <= PEAK_MEMORY_TARGET_MB
+
+        # 已有大量历史时再导入一行：只刷新这一天所在的汇总，耗时不随历史记录数增长
+        with tempfile.TemporaryFile() as f:
+            write_sample_csv(f, 1)
+            started = time.perf_counter()
+            RecordService.import_csv(user_id, f)
+            print(f"  在 {rows} 条历史上再导入 1 行：{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    if not ok:
+        print(f"❌ 未达到目标 (全部导入且峰值内存 ≤ {PEAK_MEMORY_TARGET_MB} MB)")
+        sys.exit(1)
+    print("✅ 达到目标")
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
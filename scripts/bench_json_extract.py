@@ -0,0 +1,53 @@
+# scripts/bench_json_extract.py
+from app.services.json_extract import extract_json_object
+import json
+import re
+import time
+
+
+def legacy_parse(full_text):
+    """原来的解析方式：整体 json.loads，失败后去掉代码块标记再试，再用贪婪正则截取 {...} 再试"""
+    try:
+        return json.loads(full_text)
+    except json.JSONDecodeError:
+        clean_text = re.sub(r'^```json\s*|\s*```$', '', full_text, flags=re.MULTILINE | re.DOTALL).strip()
+        try:
+            return json.loads(clean_text)
+        except json.JSONDecodeError:
+            json_match = re.search(r'\{.*\}', clean_text, re.DOTALL)
+            if json_match:
+                try:
+                    return json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    return None
+            return None
+
+
+def bench(rounds=20):
+    """大段不规范输出：前后有大量正文和花括号"""
+    reply = {'reply': '建议' * 2000, 'tasks': [{'title': f'任务{i}', 'done': False} for i in range(200)]}
+    body = json.dumps(reply, ensure_ascii=False)
+    prose = '根据您的数据 {说明} 分析如下。' * 4000
+    cases = {
+        '前后都有长正文': prose + body + '\n以上建议仅供参考 {注}' + prose,
+        '大量正文花括号': '{x} ' * 50000 + body,
+        '截断的长输出': '```json\n' + body[:-500],
+        '大量没闭合的 {': '{"' * 20000 + body,
+    }
+
+    print(f"⏱️ 大段不规范输出的解析耗时 (每次平均，{rounds} 轮)：")
+    print(f"  {'场景':<10} {'长度':>8} {'原方式':>10} {'新方式':>10}  结果 (原方式 / 新方式)")
+    for label, text in cases.items():
+        timings = []
+        results = []
+        for parse in (legacy_parse, extract_json_object):
+            started = time.perf_counter()
+            for _ in range(rounds):
+                result = parse(text)
+            timings.append((time.perf_counter() - started) / rounds * 1000)
+            results.append('提取成功' if result == reply else '未提取到')
+        print(f"  {label:<10} {len(text):>8} {timings[0]:>8.2f}ms {timings[1]:>8.2f}ms  {' / '.join(results)}")
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,64 @@
+# scripts/bench_record_page.py
+from app import create_app, db
+from app.models import HealthRecord
+from scripts._bench import temp_user, insert_rows, login
+from datetime import date, timedelta
+import random
+import sys
+import time
+
+app = create_app()
+
+
+def make_records(user_id, count):
+    """从今天往前每天一条记录，步数留空一部分 (页面显示为 "-")"""
+    today = date.today()
+    for i in range(count):
+        yield {
+            'user_id': user_id,
+            'date': today - timedelta(days=i),
+            'weight': round(random.uniform(55, 75), 1),
+            'steps': random.choice([None, random.randint(1000, 20000)]),
+            'blood_glucose': random.choice([None, round(random.uniform(4, 7), 1)]),
+        }
+
+
+def fetch(client, url, rounds):
+    """返回 (响应大小, 平均耗时)"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        response = client.get(url)
+    elapsed = (time.perf_counter() - started) / rounds
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} 返回 {response.status_code}")
+    return len(response.data), elapsed
+
+
+def bench(sizes=(100, 1000, 10000), rounds=10):
+    results = []
+    print(f"⏱️ 记录页响应大小和耗时 (每次平均，{rounds} 轮)：")
+    print(f"  {'历史条数':>8} {'/record':>22} {'/record/edit/<id>':>22} {'/record/history':>22}")
+    for size in sizes:
+        with temp_user(app, f'record_{size}', height=170, weight=60) as user_id:
+            with app.app_context():
+                insert_rows(HealthRecord, make_records(user_id, size))
+                # 编辑最早的一条记录：原来编辑页会把全部历史重新渲染一遍
+                oldest_id = db.session.query(HealthRecord.id).filter_by(user_id=user_id) \
+                    .order_by(HealthRecord.date).limit(1).scalar()
+
+            client = login(app, user_id)
+            row = [fetch(client, url, rounds) for url in
+                   ('/record', f'/record/edit/{oldest_id}', '/record/history')]
+            results.append([nbytes for nbytes, _ in row])
+            print(f"  {size:>8} " + ' '.join(f"{nbytes / 1024:>9.1f}KB {elapsed * 1000:>7.1f}ms" for nbytes, elapsed in row))
+
+    # 每页条数固定，响应大小只随日期、步数等字段的字符数略有浮动
+    growth = [max(sizes_) / min(sizes_) for sizes_ in zip(*results)]
+    if any(g > 1.05 for g in growth):
+        print(f"❌ 响应大小随历史条数增长：{[f'{g:.2f}x' for g in growth]}")
+        sys.exit(1)
+    print("✅ 响应大小与历史条数无关")
+
+
+if __name__ == '__main__':
+    bench(tuple(int(n) for n in sys.argv[1:]) or (100, 1000, 10000))
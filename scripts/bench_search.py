@@ -0,0 +1,76 @@
+# scripts/bench_search.py
+from app import create_app, db
+from app.models import Post
+from app.services.search_service import LikeSearchBackend, FulltextSearchBackend, InvertedIndexSearchBackend
+from scripts._bench import temp_user, insert_rows
+from datetime import datetime, timedelta
+import random
+import sys
+import time
+
+app = create_app()
+
+WORDS = ['跑步', '减肥', '增肌', '睡眠', '饮食', '血压', '心率', '早餐', '晚餐', '喝水', '瑜伽', '游泳',
+         '打卡', '体脂', '蛋白质', '碳水', '拉伸', '散步', '熬夜', '体重', 'running', 'diet', 'yoga', 'sleep']
+
+QUERIES = ['跑步', '减肥 打卡', '蛋白质', 'yoga', '熬夜 心率', '不存在的词']
+
+
+def make_posts(user_id, count, seed=20240601):
+    """每条帖子由随机汉字组成，标题和部分句子里夹杂健康相关的词，检索词的命中率与真实社区接近"""
+    rng = random.Random(seed)
+    filler = [chr(c) for c in range(0x4e00, 0x4e00 + 2000)]
+    now = datetime.utcnow()
+
+    def sentence(words):
+        text = ''.join(rng.choices(filler, k=rng.randint(8, 30)))
+        for word in rng.sample(WORDS, words):
+            pos = rng.randint(0, len(text))
+            text = f'{text[:pos]} {word} {text[pos:]}'
+        return text
+
+    for i in range(count):
+        yield {
+            'user_id': user_id,
+            'title': sentence(1)[:100],
+            'content': '，'.join(sentence(rng.randint(0, 1)) for _ in range(rng.randint(3, 10))),
+            'created_at': now - timedelta(minutes=i),
+            'is_announcement': False,
+            'like_count': 0,
+            'comment_count': 0,
+        }
+
+
+def timed(fn, rounds=5):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - started) / rounds
+
+
+def bench(count=100000):
+    with temp_user(app, 'search') as user_id, app.app_context():
+        print(f"🚀 写入 {count} 条模拟帖子...")
+        insert_rows(Post, make_posts(user_id, count))
+
+        backends = [('ILIKE', LikeSearchBackend())]
+        if db.engine.dialect.name == 'mysql':
+            backends.append(('FULLTEXT', FulltextSearchBackend()))
+        inverted = InvertedIndexSearchBackend()
+        _, build_time = timed(lambda: inverted.search('跑步', 1, 10), rounds=1)
+        print(f"  倒排索引首次构建：{build_time:.2f} s")
+        backends.append(('倒排索引', inverted))
+
+        print(f"  {'查询':<12}" + ''.join(f"{name:>18}" for name, _ in backends))
+        for query in QUERIES:
+            cells = []
+            for name, backend in backends:
+                (_, total), elapsed = timed(lambda: backend.search(query, 1, 10))
+                cells.append(f"{elapsed * 1000:>8.1f}ms {total:>7}")
+            print(f"  {query:<12}" + ''.join(f"{cell:>18}" for cell in cells))
+        print("  (每格为 第一页耗时 和 命中总数；ILIKE 为子串匹配，其他后端要求所有检索词都命中)")
+    print("✅ 完成")
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
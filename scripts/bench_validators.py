@@ -0,0 +1,52 @@
+# scripts/bench_validators.py
+from app.services.validators import validate_rows, validate_form
+import random
+import sys
+import time
+
+
+def make_rows(count, bad_ratio, seed=20240601):
+    """模拟 CSV 导入的行 (字符串)，bad_ratio 比例的行带一个不合法的值"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        row = {
+            'weight': f'{rng.uniform(45, 95):.1f}', 'body_fat': f'{rng.uniform(10, 35):.1f}',
+            'steps': str(rng.randint(0, 20000)), 'calories': str(rng.randint(0, 800)),
+            'water_intake': str(rng.randint(500, 3000)), 'blood_glucose': f'{rng.uniform(4, 7):.1f}',
+            'sleep_hours': f'{rng.uniform(5, 9):.1f}', 'heart_rate': str(rng.randint(55, 100)),
+            'bp_high': str(rng.randint(100, 140)), 'bp_low': str(rng.randint(60, 90)),
+        }
+        if rng.random() < bad_ratio:
+            row[rng.choice(list(row))] = rng.choice(['abc', '-5', '999999', ''])
+        rows.append(row)
+    return rows
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def bench(count=100000):
+    print(f"⏱️ 校验 {count} 行 (每行 10 个指标)：")
+    print(f"  {'数据':<14} {'逐行':>10} {'按列批量':>10} {'批量每行':>10}  不合法行数")
+    for label, bad_ratio in (('全部合法', 0), ('1% 不合法', 0.01), ('20% 不合法', 0.2)):
+        rows = make_rows(count, bad_ratio)
+        single, single_time = timed(lambda: [validate_form(row) for row in rows])
+        (values, errors), batch_time = timed(lambda: validate_rows(rows))
+        # 批量模式与逐行校验的结果必须一致
+        if sum(1 for _, e in single if e) != len(errors):
+            print(f"  ❌ {label}：批量模式与逐行校验的结果不一致")
+            sys.exit(1)
+        print(f"  {label:<14} {single_time * 1000:>8.0f}ms {batch_time * 1000:>8.0f}ms "
+              f"{batch_time / count * 1e6:>8.2f}µs  {len(errors)}")
+
+    readings = [{'steps': i % 20000, 'heart_rate': 60 + i % 40, 'sleep': 7.5} for i in range(count)]
+    _, device_time = timed(lambda: validate_rows(readings, 'device'))
+    print(f"  设备读数 (3 个指标) 按列批量：{device_time * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
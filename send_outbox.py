@@ -0,0 +1,36 @@
+# send_outbox.py
+from app import create_app
+from config import Config
+from app.extensions import db
+from app.models import EmailOutbox
+from app.services.email_service import EmailService
+from sqlalchemy import func
+import sys
+
+
+class OutboxConfig(Config):
+    # 由本脚本投递，不另外启动发送线程
+    MAIL_OUTBOX_WORKERS = 0
+
+
+app = create_app(OutboxConfig)
+
+
+def drain(batch_size=50):
+    """投递发件箱里所有到期的邮件 (MAIL_OUTBOX_WORKERS = 0 时用定时任务运行，或部署后补发积压的邮件)"""
+    with app.app_context():
+        print("🚀 开始投递发件箱...")
+        total = 0
+        while True:
+            claimed = EmailService.send_pending(batch_size)
+            if not claimed:
+                break
+            total += claimed
+            print(f"  已处理 {total} 封")
+
+        counts = dict(db.session.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all())
+        print(f"✅ 投递完成！本次处理 {total} 封，当前状态：{counts}")
+
+
+if __name__ == '__main__':
+    drain(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
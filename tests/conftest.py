@@ -0,0 +1,57 @@
+# tests/conftest.py
+"""
+测试共用的夹具：每个测试使用 tmp_path 下一次性的 SQLite 数据库 (db.create_all 建表)，
+不读取 config.py，不连接真实的 MySQL、SMTP 和 AI 服务
+"""
+from app import create_app
+from app.extensions import db
+from app.models import User
+import itertools
+import pytest
+
+
+class TestingConfig:
+    TESTING = True
+    SECRET_KEY = 'testing'
+    DEEPSEEK_API_KEY = 'testing'
+    DEEPSEEK_BASE_URL = 'http://127.0.0.1:9/v1'  # 不可达的地址，需要 AI 的测试自己启动桩服务
+    MAIL_SUPPRESS_SEND = True
+    MAIL_DEFAULT_SENDER = 'noreply@localhost'
+    MAIL_OUTBOX_WORKERS = 0  # 需要发送线程的测试自己启动
+
+
+@pytest.fixture
+def app(tmp_path):
+    """已推入应用上下文的 app，数据库为临时文件 (多线程并发写入的测试也可以用)"""
+    config = type('Config', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(app):
+    """创建用户：make_user(height=170, ...)，用户名自动编号"""
+    numbers = itertools.count(1)
+
+    def make(**fields):
+        n = next(numbers)
+        user = User(**{'username': f'user{n}', 'password': '-', 'nickname': f'用户{n}', **fields})
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """返回已登录为 user_id 的测试客户端：login(user_id)"""
+    def login(user_id):
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s['user_id'] = user_id
+        return client
+    return login
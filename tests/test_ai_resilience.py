@@ -0,0 +1,202 @@
+# tests/test_ai_resilience.py
+"""对本地桩服务注入故障，检查 AI 调用容错层 (重试、熔断、截止时间、并发上限)"""
+from app.services.ai_service import call_deepseek_advisor, close_clients
+from app.services.resilience import ResiliencePolicy, get_metrics, reset_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import json
+import pytest
+import threading
+import time
+
+OK_REPLY = json.dumps({
+    'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'deepseek-chat',
+    'choices': [{'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': '{"reply": "ok"}'}}],
+}).encode('utf-8')
+
+
+class FaultState:
+    """桩服务的故障注入开关：mode 为 ok / error (返回 500) / slow (延迟 delay 秒) / flaky (每 fail_every 次失败一次)"""
+    lock = threading.Lock()
+    mode = 'ok'
+    delay = 0
+    fail_every = 3
+    hits = 0
+    active = 0
+    max_active = 0
+
+    @classmethod
+    def reset(cls, mode, delay=0):
+        with cls.lock:
+            cls.mode, cls.delay, cls.hits, cls.active, cls.max_active = mode, delay, 0, 0, 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with FaultState.lock:
+            FaultState.hits += 1
+            FaultState.active += 1
+            FaultState.max_active = max(FaultState.max_active, FaultState.active)
+            hit = FaultState.hits
+        try:
+            mode = FaultState.mode
+            if mode == 'slow':
+                time.sleep(FaultState.delay)
+            failed = mode == 'error' or (mode == 'flaky' and hit % FaultState.fail_every == 1)
+            body = b'{"error": {"message": "injected"}}' if failed else OK_REPLY
+            self.send_response(500 if failed else 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with FaultState.lock:
+                FaultState.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+@pytest.fixture
+def stub(app, stub_url):
+    """把 AI 调用指向桩服务：stub(mode, delay=0, **config)"""
+    def configure(mode, delay=0, **config):
+        app.config.update({
+            'DEEPSEEK_API_KEY': 'stub',
+            'DEEPSEEK_BASE_URL': stub_url,
+            'AI_BACKOFF_BASE': 0.05,
+            'AI_BACKOFF_CAP': 0.2,
+            'AI_BREAKER_THRESHOLD': 3,
+            'AI_BREAKER_RESET': 1,
+            'AI_DEADLINE': 10,
+            'AI_ATTEMPT_TIMEOUT': 5,
+            'AI_MAX_CONCURRENCY': 8,
+            'AI_PER_USER_CONCURRENCY': 2,
+            **config,
+        })
+        reset_policy()
+        FaultState.reset(mode, delay)
+
+    yield configure
+    close_clients()
+    reset_policy()
+
+
+def call(app, user_id=None):
+    started = time.perf_counter()
+    with app.app_context():
+        reply = call_deepseek_advisor([{"role": "user", "content": "ping"}], user_id=user_id)
+    return reply, time.perf_counter() - started
+
+
+def test_flaky_upstream_is_retried(app, stub):
+    stub('flaky')
+    results = [call(app) for _ in range(9)]
+    assert all(reply for reply, _ in results)
+    assert get_metrics()['counters'].get('retries', 0) > 0
+
+
+def test_breaker_fails_fast(app, stub):
+    stub('error')
+    for _ in range(3):
+        call(app)
+    hits = FaultState.hits
+    reply, elapsed = call(app)
+    assert get_metrics()['breaker']['state'] == 'open'
+    # 熔断后直接返回兜底，不再访问上游
+    assert reply is None and FaultState.hits == hits and elapsed < 0.05
+
+
+def test_breaker_recovers(app, stub):
+    stub('error')
+    for _ in range(3):
+        call(app)
+    FaultState.mode = 'ok'
+    time.sleep(app.config['AI_BREAKER_RESET'])
+    reply, _ = call(app)
+    assert reply is not None
+    assert get_metrics()['breaker']['state'] == 'closed'
+
+
+def test_deadline(app, stub):
+    stub('slow', delay=3, AI_DEADLINE=1, AI_ATTEMPT_TIMEOUT=1)
+    reply, elapsed = call(app)
+    assert reply is None and elapsed < 1.5
+
+
+def test_global_concurrency_limit(app, stub):
+    stub('slow', delay=0.2, AI_MAX_CONCURRENCY=3, AI_QUEUE_TIMEOUT=10)
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(lambda i: call(app, user_id=i), range(12)))
+    assert all(reply for reply, _ in results)
+    assert FaultState.max_active <= 3
+
+
+def test_per_user_concurrency_limit(app, stub):
+    stub('slow', delay=0.5)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda i: call(app, user_id=1), range(4)))
+    assert sum(1 for reply, _ in results if reply) == 2
+    assert get_metrics()['counters'].get('rejected_busy', 0) == 2
+
+
+class BrokenStream:
+    """先返回一个片段，之后连接中断"""
+
+    def __init__(self):
+        self.sent = False
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.sent:
+            raise ConnectionError('connection dropped')
+        self.sent = True
+        return 'chunk'
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_failure_after_first_chunk_opens_breaker():
+    policy = ResiliencePolicy({'AI_BREAKER_THRESHOLD': 2})
+    streams = []
+
+    def attempt(timeout):
+        streams.append(BrokenStream())
+        return streams[-1]
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            list(policy.stream(attempt, user_id=1))
+    assert policy.metrics()['breaker']['state'] == 'open'
+    assert policy.metrics()['in_flight'] == 0
+    assert all(stream.closed for stream in streams)
+
+
+def test_abandoned_stream_releases_slot():
+    policy = ResiliencePolicy({})
+    chunks = policy.stream(lambda timeout: iter(['a', 'b']), user_id=1)
+    assert next(chunks) == 'a'
+    chunks.close()
+    metrics = policy.metrics()
+    assert metrics['in_flight'] == 0
+    assert metrics['breaker']['consecutive_failures'] == 0
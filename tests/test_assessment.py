@@ -0,0 +1,40 @@
+# tests/test_assessment.py
+from app.blueprints.health.service import RecordService
+from app.extensions import db
+from app.models import HealthAssessment, HealthRecord
+from app.services.assessment_service import AssessmentService
+from datetime import date, datetime, timedelta
+import pytest
+
+
+def test_same_day_edit_marks_user_stale(app, make_user):
+    """评估之后修改当天已有的记录 (日期不变) 也要重新评估"""
+    user = make_user()
+    RecordService.upsert_records(user.id, {date.today(): {'steps': 3000}})
+    db.session.commit()
+    assert AssessmentService.find_stale_users() == [user.id]
+
+    AssessmentService._save_assessment_to_db(user.id, {'health_score': 70})
+    db.session.query(HealthAssessment).update({'updated_at': datetime.utcnow() + timedelta(seconds=1)})
+    db.session.commit()
+    assert AssessmentService.find_stale_users() == []
+
+    db.session.query(HealthRecord).update({'updated_at': datetime.utcnow() + timedelta(seconds=2)})
+    db.session.commit()
+    assert AssessmentService.find_stale_users() == [user.id]
+
+
+def test_deferred_save_error_is_raised(app, make_user, monkeypatch):
+    """commit=False 时保存出错要抛给调用方，不能在这里回滚掉同一批其他的评估"""
+    first, second = make_user(), make_user()
+    AssessmentService._save_assessment_to_db(first.id, {'health_score': 60}, commit=False)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(db.session, 'add', broken)
+    with pytest.raises(RuntimeError):
+        AssessmentService._save_assessment_to_db(second.id, {'health_score': 80}, commit=False)
+    monkeypatch.undo()
+
+    db.session.commit()
+    assert [a.user_id for a in HealthAssessment.query.all()] == [first.id]
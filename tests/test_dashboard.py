@@ -0,0 +1,42 @@
+# tests/test_dashboard.py
+from app.extensions import db
+from app.models import HealthRecord
+from app.services.stats_service import StatsService
+from datetime import date, timedelta
+from sqlalchemy import insert
+import pytest
+
+
+def seed(user_id, days_ago, steps=5000):
+    if not days_ago:
+        return
+    db.session.execute(insert(HealthRecord), [
+        {'user_id': user_id, 'date': date.today() - timedelta(days=n), 'weight': 60 + n % 3, 'steps': steps}
+        for n in days_ago])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('days_ago, streak', [
+    pytest.param([], 0, id='没有记录'),
+    pytest.param(range(30), 30, id='从今天起连续 30 天'),
+    pytest.param(range(1, 8), 7, id='今天还没打卡，从昨天起连续'),
+    pytest.param(range(2, 8), 0, id='前天断签'),
+    pytest.param([*range(5), *range(6, 20)], 5, id='中间断一天'),
+])
+def test_streak(make_user, days_ago, streak):
+    user_id = make_user(height=170, weight=60).id
+    seed(user_id, days_ago)
+    assert StatsService.get_dashboard_data(user_id)['streak_days'] == streak
+
+
+def test_chart_window_and_heatmap(make_user):
+    user_id = make_user(height=170, weight=60).id
+    seed(user_id, range(40))
+    seed(user_id, [45], steps=0)
+    data = StatsService.get_dashboard_data(user_id)
+
+    # 图表只取最近 14 条 (正序)，热力图包含全部有步数的日期
+    expected_dates = [(date.today() - timedelta(days=n)).strftime('%m-%d') for n in range(13, -1, -1)]
+    assert data['chart_data']['dates'] == expected_dates
+    assert [day for day, _ in data['heatmap_data']] == \
+        [(date.today() - timedelta(days=n)).isoformat() for n in range(39, -1, -1)]
@@ -0,0 +1,138 @@
+# tests/test_email_outbox.py
+from app.extensions import db, mail
+from app.models import EmailOutbox
+from app.services.email_service import EmailService, start_workers, stop_workers
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+import socketserver
+import threading
+import time
+
+BATCH_SIZE = 10
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """只实现发送邮件用到的几个命令；reject* 的地址永久拒收 (550)，later* 的地址第一次暂时拒收 (451)"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 test')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 ok')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 ok')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                with server.lock:
+                    deferred = address.startswith('later') and address not in server.deferred
+                    server.deferred.add(address)
+                if address.startswith('reject'):
+                    self.reply('550 no such user')
+                elif deferred:
+                    self.reply('451 try again later')
+                else:
+                    recipients.append(address)
+                    self.reply('250 ok')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages.extend(recipients)
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:  # RSET / NOOP
+                self.reply('250 ok')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+        self.deferred = set()
+
+
+@pytest.fixture
+def smtp(app):
+    """本地 SMTP 服务器，发件箱按 BATCH_SIZE 一批、失败立即重试；测试结束时停止发送线程"""
+    sink = SMTPSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    host, port = sink.server_address
+    app.config.update(MAIL_SERVER=host, MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False,
+                      MAIL_OUTBOX_BATCH=BATCH_SIZE, MAIL_OUTBOX_RETRY_DELAY=0, MAIL_OUTBOX_POLL=1)
+    mail.init_app(app)
+    yield sink
+    stop_workers()
+    sink.shutdown()
+
+
+def user(email):
+    return SimpleNamespace(email=email, nickname=email.split('@')[0])
+
+
+def wait_until_delivered(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not EmailOutbox.query.filter(EmailOutbox.status.in_(('pending', 'sending'))).count():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_backlog_drains_when_workers_start(app, smtp):
+    """进程重启时发件箱里已经积压了邮件：启动发送线程后按批投递，不用等新邮件入队"""
+    # 发送途中进程退出的邮件，领取超时后应被重新领取
+    db.session.add(EmailOutbox(kind='welcome', recipients='stale@example.com', subject='stale', html='<p>stale</p>',
+                               status='sending', attempts=1, claimed_by='gone',
+                               claimed_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    with app.test_request_context():
+        for i in range(30):
+            EmailService.send_welcome_email(user(f'user{i}@example.com'))
+    assert smtp.messages == []
+
+    app.config['MAIL_OUTBOX_WORKERS'] = 2
+    start_workers(app)
+    assert wait_until_delivered()
+
+    db.session.expire_all()
+    assert {email.status for email in EmailOutbox.query} == {'sent'}
+    assert sorted(smtp.messages) == sorted(['stale@example.com'] + [f'user{i}@example.com' for i in range(30)])
+    # 每批复用一个连接，而不是逐封连接
+    assert smtp.connections <= 31 // BATCH_SIZE + 3
+
+
+def test_temporary_and_permanent_rejections(app, smtp):
+    with app.test_request_context():
+        EmailService.send_password_reset_email(user('later@example.com'), 't1')
+        EmailService.send_password_reset_email(user('reject@example.com'), 't2')
+    while EmailService.send_pending():
+        pass
+
+    emails = {email.recipients: email for email in EmailOutbox.query}
+    later, reject = emails['later@example.com'], emails['reject@example.com']
+    assert (later.status, later.attempts) == ('sent', 2)
+    assert (reject.status, reject.attempts) == ('failed', 1)
+    assert smtp.messages == ['later@example.com']
@@ -0,0 +1,54 @@
+# tests/test_feed_queries.py
+"""社区首页/无限滚动/搜索每次请求执行的查询数固定 (与帖子数、评论数、每页条数无关)，不存在 N+1"""
+from app.extensions import db
+from app.models import Post, PostLike, Comment
+from app.blueprints.social import routes as social_routes
+from sqlalchemy import event, insert
+
+QUERY_BUDGET = 6
+
+PAGES = (('社区首页', '/community'), ('无限滚动', '/community/feed'), ('搜索', '/community?q=检查查询数'))
+
+
+def seed(user_ids, posts, comments_per_post):
+    """posts 条帖子，每条帖子由不同用户评论并点赞"""
+    for i in range(posts):
+        post = Post(user_id=user_ids[i % len(user_ids)], title=f'检查查询数 {i}', content='内容',
+                    comment_count=comments_per_post, like_count=comments_per_post)
+        db.session.add(post)
+        db.session.flush()
+        commenters = [user_ids[(i + j + 1) % len(user_ids)] for j in range(comments_per_post)]
+        db.session.execute(insert(Comment), [{'post_id': post.id, 'user_id': uid, 'content': '评论'}
+                                             for uid in commenters])
+        db.session.execute(insert(PostLike), [{'post_id': post.id, 'user_id': uid} for uid in commenters])
+    db.session.commit()
+
+
+def count_queries(client, url):
+    statements = []
+
+    def on_execute(*args):
+        statements.append(1)
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+    assert response.status_code == 200, url
+    return len(statements)
+
+
+def test_query_count_is_constant(make_user, login, monkeypatch):
+    user_ids = [make_user().id for _ in range(30)]
+    client = login(user_ids[0])
+    counts = set()
+    # 帖子总数 (以及每条帖子的评论数) 逐轮增加，每轮再换几种每页条数
+    for posts, comments in ((20, 2), (200, 8)):
+        seed(user_ids, posts, comments)
+        for page_size in (5, 10, 30):
+            monkeypatch.setattr(social_routes, 'FEED_PAGE_SIZE', page_size)
+            result = {label: count_queries(client, url) for label, url in PAGES}
+            assert max(result.values()) <= QUERY_BUDGET, result
+            counts.add(tuple(result.values()))
+    assert len(counts) == 1, counts
@@ -0,0 +1,51 @@
+# tests/test_import.py
+from app.extensions import db
+from app.models import HealthRecord, HealthDailyRollup, HealthPeriodRollup
+from app.blueprints.health.service import RecordService, SNIFF_BYTES
+from app.services.rollup_service import RollupService
+from datetime import date, timedelta
+import io
+
+NOTE = '导入测试' * 40  # 每行约 500 字节，几百行就能超过编码探测读取的长度
+
+
+def csv_bytes(rows, start=date(2024, 1, 1)):
+    lines = ['日期,体重(kg),步数,睡眠(h),备注']
+    lines += [f"{start + timedelta(days=i)},{60 + i % 10},{1000 * (i % 15)},{5 + i % 4},{NOTE}" for i in range(rows)]
+    return ('\n'.join(lines) + '\n').encode('utf-8-sig')
+
+
+def rollup_snapshot(user_id):
+    return [sorted((r.day, r.record_count, r.weight_sum, r.steps_sum, r.sleep_sum)
+                   for r in HealthDailyRollup.query.filter_by(user_id=user_id)),
+            sorted((r.period, r.period_start, r.record_count, round(r.weight_sum, 3), r.steps_sum,
+                    round(r.sleep_sum, 3)) for r in HealthPeriodRollup.query.filter_by(user_id=user_id))]
+
+
+def test_import_refreshes_rollups(make_user):
+    """分批导入时增量刷新的汇总与全量重建一致 (跨多个周、月)"""
+    user_id = make_user(weight=60).id
+    result = RecordService.import_csv(user_id, io.BytesIO(csv_bytes(90)), batch_size=20)
+    assert (result['status'], result['imported']) == ('success', 90)
+
+    # 再导入覆盖其中一段
+    RecordService.import_csv(user_id, io.BytesIO(csv_bytes(10, start=date(2024, 2, 1))), batch_size=20)
+    refreshed = rollup_snapshot(user_id)
+    RollupService._rebuild_users([user_id])
+    db.session.commit()
+    assert refreshed == rollup_snapshot(user_id)
+
+
+def test_failed_import_reports_committed_rows(make_user):
+    """文件后面有无法解码的字节：已经提交的批次连同汇总一起保留，错误结果里带上导入条数"""
+    user_id = make_user(weight=60).id
+    data = csv_bytes(200)
+    assert len(data) > SNIFF_BYTES
+    result = RecordService.import_csv(user_id, io.BytesIO(data + b'2025-01-01,\xff\xfe,1\n'), batch_size=50)
+
+    # 解码是按块预读的，出错时最后一批可能还没提交；报告的条数必须与实际写入的一致
+    imported = result['imported']
+    assert result['status'] == 'error' and imported >= 150
+    assert f'出错前已导入 {imported} 条记录' in result['message']
+    assert HealthRecord.query.filter_by(user_id=user_id).count() == imported
+    assert HealthDailyRollup.query.filter_by(user_id=user_id).count() == imported
@@ -0,0 +1,25 @@
+# tests/test_indexes.py
+"""热点查询的执行计划 (SQLite 的 EXPLAIN QUERY PLAN)：必须走索引，不能出现全表扫描或临时排序"""
+from app.extensions import db
+from app.models import HealthRecord, HealthPlan, PlanTask, PostLike, Comment, Post
+import pytest
+
+# 仪表盘、记录页、计划页、社区页最常用的查询 (参数取任意值即可，只看执行计划)
+HOT_QUERIES = {
+    'health_record 按用户取最近记录': lambda: HealthRecord.query.filter_by(user_id=1)
+        .order_by(HealthRecord.date.desc()).limit(14),
+    'health_plan 按用户取最新计划': lambda: HealthPlan.query.filter_by(user_id=1)
+        .order_by(HealthPlan.created_at.desc()).limit(1),
+    'plan_task 按计划取任务': lambda: PlanTask.query.filter_by(plan_id=1),
+    'post_like 判断是否点赞': lambda: PostLike.query.filter_by(post_id=1, user_id=1),
+    'comment 按帖子取评论': lambda: Comment.query.filter_by(post_id=1).order_by(Comment.created_at.asc()),
+    'post 社区首页排序': lambda: Post.query.order_by(Post.is_announcement.desc(), Post.created_at.desc()).limit(10),
+}
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_index(app, name):
+    sql = str(HOT_QUERIES[name]().statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    details = [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+    assert all('USING' in d or not d.startswith('SCAN') for d in details), details
+    assert not any('TEMP B-TREE' in d for d in details), details
@@ -0,0 +1,80 @@
+# tests/test_jobs.py
+from app.extensions import db
+from app.services import job_service
+from app.services.job_service import JobService
+import pytest
+import threading
+import time
+
+
+@pytest.fixture(autouse=True)
+def executor(monkeypatch):
+    """每个测试按自己的 AI_JOB_WORKERS 新建线程池，结束时等待任务执行完"""
+    monkeypatch.setattr(job_service, '_executor', None)
+    yield
+    if job_service._executor:
+        job_service._executor.shutdown(wait=True)
+
+
+def wait_for(job_id, user_id, statuses, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        db.session.expire_all()
+        job = JobService.get(job_id, user_id)
+        if job.status in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"任务 {job_id} 没有进入 {statuses}")
+
+
+def test_queued_jobs_are_not_timed_out(app, make_user):
+    """排队时间不计入执行超时：队列里等待超过 AI_JOB_TIMEOUT 的任务仍然会执行完成"""
+    app.config.update(AI_JOB_WORKERS=1, AI_JOB_TIMEOUT=0.3)
+    user_id = make_user().id
+
+    def work(n):
+        time.sleep(0.2)
+        return {'n': n}
+
+    job_ids = [JobService.submit(user_id, 'chat', work, n).id for n in range(4)]
+    for job_id in job_ids:
+        job = wait_for(job_id, user_id, ('done', 'error'))
+        assert job.status == 'done' and job.started_at is not None
+
+
+def test_timed_out_job_keeps_error(app, make_user):
+    """执行超时被标记为失败的任务，执行线程稍后写回的结果不会覆盖它"""
+    app.config.update(AI_JOB_TIMEOUT=0.2)
+    user_id = make_user().id
+    finished = threading.Event()
+
+    def slow():
+        time.sleep(0.6)
+        finished.set()
+        return {'late': True}
+
+    job_id = JobService.submit(user_id, 'chat', slow).id
+    wait_for(job_id, user_id, ('running',))
+    time.sleep(0.3)
+    assert JobService.get(job_id, user_id).status == 'error'
+
+    assert finished.wait(5)
+    time.sleep(0.2)
+    db.session.expire_all()
+    job = JobService.get(job_id, user_id)
+    assert job.status == 'error' and job.get_result()['message'] == '任务超时，请稍后重试'
+
+
+def test_expired_queued_job_is_not_run(app, make_user):
+    """排队超过 AI_JOB_QUEUE_TIMEOUT 的任务标记为失败，轮到它时也不再执行"""
+    app.config.update(AI_JOB_WORKERS=1, AI_JOB_QUEUE_TIMEOUT=0)
+    user_id = make_user().id
+    ran = []
+
+    first = JobService.submit(user_id, 'chat', lambda: time.sleep(0.3) or {}).id
+    queued = JobService.submit(user_id, 'chat', lambda: ran.append(1) or {}).id
+    assert JobService.get(queued, user_id).status == 'error'
+
+    wait_for(first, user_id, ('done',))
+    time.sleep(0.2)
+    assert ran == []
@@ -0,0 +1,104 @@
+# tests/test_json_extract.py
+from app.services.json_extract import extract_json_object, validate, parse_ai_json
+from app.services.plan_service import CHAT_RESPONSE_SCHEMA
+from app.services.assessment_service import ASSESSMENT_RESPONSE_SCHEMA
+import json
+import pytest
+import random
+
+# 模型输出中常见的前后缀 (含正文花括号、引号、代码块标记、没闭合的 {)
+PREFIXES = ['', '好的，以下是结果：\n', '```json\n', '模板里的 {name} 会被替换。\n', '他说"你好"，然后：',
+            '多余的 } 号 ', '左花括号 { 没有闭合，', '嵌套 {a {b} c} 说明\n']
+SUFFIXES = ['', '\n```', '\n希望对你有帮助 {笑}', ' }', '\n如有疑问 {"随时": 联系}', '\n"']
+STRING_CHARS = 'ab中文{}[]":,\\\n\t😀 '
+
+ROUNDS = 5000
+
+
+def random_string(rng):
+    return ''.join(rng.choice(STRING_CHARS) for _ in range(rng.randint(0, 12)))
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(['str', 'num', 'bool', 'null', 'list', 'dict'] if depth < 4 else ['str', 'num'])
+    if kind == 'str':
+        return random_string(rng)
+    if kind == 'num':
+        return rng.choice([0, -1, 3.5, 10 ** 6])
+    if kind == 'bool':
+        return rng.random() < 0.5
+    if kind == 'null':
+        return None
+    if kind == 'list':
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return random_object(rng, depth + 1)
+
+
+def random_object(rng, depth=0):
+    return {random_string(rng): random_value(rng, depth) for _ in range(rng.randint(0, 5))}
+
+
+def nested_objects(value):
+    """value 内部嵌套的全部对象 (不含 value 本身)"""
+    children = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+    for child in children:
+        if isinstance(child, dict):
+            yield child
+        yield from nested_objects(child)
+
+
+def test_fuzz_complete_output():
+    """随机对象 + 随机前后缀：必须原样提取"""
+    rng = random.Random(20240601)
+    for n in range(ROUNDS):
+        obj = random_object(rng)
+        body = json.dumps(obj, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+        text = rng.choice(PREFIXES) + body + rng.choice(SUFFIXES)
+        assert extract_json_object(text) == obj, f"#{n}: {text[:80]!r}"
+
+
+def test_fuzz_truncated_output():
+    """截断后外层对象没闭合，只能取到其中完整的内层对象 (或者字符串里的 {})，不能取到别的东西"""
+    rng = random.Random(20240602)
+    for n in range(ROUNDS):
+        obj = random_object(rng)
+        body = json.dumps(obj, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+        truncated = rng.choice(PREFIXES) + body[:rng.randint(0, len(body) - 1)]
+        result = extract_json_object(truncated)
+        assert result is None or result == {} or result in nested_objects(obj), f"#{n}: {truncated[:80]!r}"
+
+
+def test_fuzz_garbage_input():
+    """随机垃圾输入不能抛异常，取到的只能是对象"""
+    rng = random.Random(20240603)
+    for _ in range(ROUNDS):
+        garbage = ''.join(rng.choice('{}[]":,\\ab ') for _ in range(rng.randint(0, 60)))
+        result = extract_json_object(garbage)
+        assert result is None or isinstance(result, dict), repr(garbage)
+
+
+@pytest.mark.parametrize('actual, expected', [
+    pytest.param(parse_ai_json('{"reply": "hi", "tasks": [{"title": "走路"}, "喝水", 3]}', CHAT_RESPONSE_SCHEMA),
+                 {'reply': 'hi', 'tasks': [{'title': '走路'}, '喝水']}, id='聊天：正常回复'),
+    pytest.param(parse_ai_json('{"tasks": "不是列表"}', CHAT_RESPONSE_SCHEMA),
+                 {'reply': '无法解析回复内容', 'tasks': []}, id='聊天：缺少 reply'),
+    pytest.param(parse_ai_json('{"reply": "第一行\n第二行"}', CHAT_RESPONSE_SCHEMA),
+                 {'reply': '第一行\n第二行', 'tasks': []}, id='聊天：字符串中有未转义换行'),
+    pytest.param(parse_ai_json('{"summary": "ok"}', ASSESSMENT_RESPONSE_SCHEMA), None, id='评估：缺少 suggestions'),
+    pytest.param(parse_ai_json('{"suggestions": ["a", 1], "comments": [], "summary": 5}', ASSESSMENT_RESPONSE_SCHEMA),
+                 {'comments': {}, 'suggestions': ['a'], 'summary': ''}, id='评估：可选字段类型不对'),
+    pytest.param(parse_ai_json('今天多喝水。', CHAT_RESPONSE_SCHEMA), None, id='没有 JSON'),
+    pytest.param(extract_json_object('{"reply": "写到一半\n```json\n{"reply": "hi"}\n```'),
+                 {'reply': 'hi'}, id='前面有没闭合的对象'),
+    pytest.param(extract_json_object('注意 {"这里少了引号 {"reply": "hi", "tasks": []}'),
+                 {'reply': 'hi', 'tasks': []}, id='正文引号打乱配对'),
+    pytest.param(validate([1, 2], CHAT_RESPONSE_SCHEMA), None, id='顶层是数组'),
+])
+def test_schemas(actual, expected):
+    assert actual == expected
+
+
+def test_many_unclosed_braces():
+    """大量没闭合的 { 后面跟着完整对象：仍然能取到 (退化成平方复杂度时这里会明显变慢)"""
+    reply = {'reply': '建议' * 2000, 'tasks': [{'title': f'任务{i}'} for i in range(200)]}
+    assert extract_json_object('{"' * 20000 + json.dumps(reply, ensure_ascii=False)) == reply
@@ -0,0 +1,100 @@
+# tests/test_scoring.py
+from app.services.scoring_service import ScoringService, METRIC_BANDS, LEVEL_SCORES, DIMENSIONS
+from types import SimpleNamespace
+import pytest
+
+RECORD_FIELDS = ('weight', 'body_fat', 'steps', 'calories', 'heart_rate', 'blood_pressure_high',
+                 'blood_pressure_low', 'blood_glucose', 'sleep_hours', 'water_intake')
+
+EXCELLENT = dict(weight=65, body_fat=15, steps=10000, calories=500, heart_rate=70, blood_pressure_high=110,
+                 blood_pressure_low=70, blood_glucose=5.0, sleep_hours=8, water_intake=2000)
+
+
+def score(gender='男', height=170, **values):
+    user = SimpleNamespace(gender=gender, height=height)
+    record = SimpleNamespace(**{field: values.get(field) for field in RECORD_FIELDS})
+    return ScoringService.score(user, record)
+
+
+@pytest.mark.parametrize('name', METRIC_BANDS)
+def test_band_tables(name):
+    """分段表结构：下界严格递增、等级合法"""
+    bands = METRIC_BANDS[name]
+    bounds = [band[0] for band in bands]
+    assert bounds == sorted(set(bounds))
+    assert all(band[1] in LEVEL_SCORES for band in bands)
+
+
+def test_dimension_weights_sum_to_one():
+    assert sum(weight for _, _, weight, _ in DIMENSIONS) == pytest.approx(1)
+
+
+# 各分段表的边界取值：下界属于本段
+@pytest.mark.parametrize('table, value, expected', [
+    ('bmi', 15.9, '异常'), ('bmi', 16, '需改善'), ('bmi', 18.4, '需改善'), ('bmi', 18.5, '优秀'),
+    ('bmi', 23.9, '优秀'), ('bmi', 24, '需改善'), ('bmi', 27.9, '需改善'), ('bmi', 28, '异常'),
+    ('body_fat_male', 5.9, '需改善'), ('body_fat_male', 6, '优秀'), ('body_fat_male', 18, '良好'),
+    ('body_fat_male', 25, '需改善'), ('body_fat_male', 29.9, '需改善'), ('body_fat_male', 30, '异常'),
+    ('body_fat_female', 13.9, '需改善'), ('body_fat_female', 14, '优秀'), ('body_fat_female', 25, '良好'),
+    ('body_fat_female', 32, '需改善'), ('body_fat_female', 38, '异常'),
+    ('body_fat', 9.9, '需改善'), ('body_fat', 10, '优秀'), ('body_fat', 22, '良好'), ('body_fat', 34, '异常'),
+    ('steps', 0, '需改善'), ('steps', 4999, '需改善'), ('steps', 5000, '良好'), ('steps', 7999, '良好'),
+    ('steps', 8000, '优秀'),
+    ('calories', 199, '需改善'), ('calories', 200, '良好'), ('calories', 400, '优秀'),
+    ('heart_rate', 39, '异常'), ('heart_rate', 40, '需改善'), ('heart_rate', 50, '良好'), ('heart_rate', 60, '优秀'),
+    ('heart_rate', 79, '优秀'), ('heart_rate', 80, '良好'), ('heart_rate', 99, '良好'), ('heart_rate', 100, '异常'),
+    ('systolic', 89, '需改善'), ('systolic', 90, '优秀'), ('systolic', 120, '良好'), ('systolic', 140, '需改善'),
+    ('systolic', 160, '异常'),
+    ('diastolic', 59, '需改善'), ('diastolic', 60, '优秀'), ('diastolic', 80, '良好'), ('diastolic', 90, '需改善'),
+    ('diastolic', 100, '异常'),
+    ('blood_glucose', 3.8, '异常'), ('blood_glucose', 3.9, '优秀'), ('blood_glucose', 5.6, '良好'),
+    ('blood_glucose', 6.1, '需改善'), ('blood_glucose', 6.9, '需改善'), ('blood_glucose', 7.0, '异常'),
+    ('sleep', 5.9, '需改善'), ('sleep', 6, '良好'), ('sleep', 7, '优秀'), ('sleep', 8.9, '优秀'),
+    ('sleep', 9, '良好'), ('sleep', 10, '需改善'),
+    ('water', 999, '需改善'), ('water', 1000, '良好'), ('water', 1499, '良好'), ('water', 1500, '优秀'),
+])
+def test_boundaries(table, value, expected):
+    assert ScoringService.classify(table, value)[0] == expected
+
+
+@pytest.mark.parametrize('values, expected', [
+    pytest.param(EXCELLENT, 100, id='全部优秀'),
+    # 只有 BMI：其他维度不参与，分数等于 BMI 的等级分
+    pytest.param(dict(weight=75), LEVEL_SCORES['需改善'], id='只有 BMI (超重)'),
+    # 身体成分 100，运动 (65+85)/2=75，其余维度没有数据：(100*0.3 + 75*0.25) / 0.55 = 88.6
+    pytest.param(dict(weight=65, steps=3000, calories=300), 89, id='缺失维度重新归一'),
+    # 生活习惯 (65+65)/2=65，其他全优：100 - 35*0.1 = 96.5 -> 96 (四舍六入五成双)
+    pytest.param({**EXCELLENT, 'sleep_hours': 5, 'water_intake': 500}, 96, id='生活习惯较差'),
+])
+def test_health_score(values, expected):
+    assert score(**values)['health_score'] == expected
+
+
+def test_blood_pressure_takes_worse_reading():
+    assert score(weight=65, blood_pressure_high=130, blood_pressure_low=95)['assessments']['blood_pressure'] == \
+        {'value': '130/95', 'level': '需改善', 'comment': '舒张压偏高'}
+
+
+def test_diastolic_only():
+    assert score(weight=65, blood_pressure_low=85)['assessments']['blood_pressure']['value'] == '--/85'
+
+
+@pytest.mark.parametrize('gender, body_fat, expected', [('男', 20, '良好'), ('女', 20, '优秀'), (None, 25, '良好')])
+def test_body_fat_by_gender(gender, body_fat, expected):
+    assert score(gender, weight=65, body_fat=body_fat)['assessments']['body_fat']['level'] == expected
+
+
+def test_zero_steps_still_scored():
+    assert score(weight=65, steps=0)['assessments']['steps']['level'] == '需改善'
+
+
+def test_missing_metrics_left_out():
+    result = score(weight=65)
+    assert list(result['assessments']) == ['bmi']
+    assert result['dimension_scores']['cardio']['score'] is None
+
+
+def test_no_bmi_without_height():
+    result = score(height=None, weight=65)
+    assert result['health_score'] == 0
+    assert result['assessments'] == {}
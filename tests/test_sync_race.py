@@ -0,0 +1,57 @@
+# tests/test_sync_race.py
+from app.extensions import db
+from app.models import HealthRecord
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from sqlalchemy import func
+
+WORKERS = 8
+
+
+def race(send):
+    """WORKERS 个线程同时发请求，返回各自的 HTTP 状态码"""
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(send, range(WORKERS)))
+
+
+def test_concurrent_single_sync_keeps_one_record(make_user, login):
+    """每个设备上报的累计步数不同，最终今天只有一条记录，步数取最大值"""
+    user_id = make_user(height=170, weight=60).id
+    today = date.today()
+    for n in range(3):
+        codes = race(lambda i: login(user_id).post(
+            '/api/upload_health_data', json={'steps': 1000 * n + 100 * i, 'heart_rate': 60 + i}).status_code)
+        assert codes == [200] * WORKERS
+
+        db.session.expire_all()
+        rows = HealthRecord.query.filter_by(user_id=user_id, date=today).all()
+        assert len(rows) == 1
+        assert rows[0].steps == 1000 * n + 100 * (WORKERS - 1)
+
+
+def test_concurrent_batch_sync_keeps_one_record_per_day(make_user, login):
+    """多个设备同时上传重叠的多天读数 (批次号各不相同)"""
+    user_id = make_user(height=170, weight=60).id
+    days = [date.today() - timedelta(days=i) for i in range(5)]
+    codes = race(lambda i: login(user_id).post('/api/upload_health_data/batch', json={
+        'batch_id': f'race-{i}',
+        'readings': [{'date': str(day), 'steps': 20000 + 10 * i, 'sleep': 7} for day in days]
+    }).status_code)
+    assert codes == [200] * WORKERS
+
+    counts = dict(db.session.query(HealthRecord.date, func.count(HealthRecord.id))
+                  .filter(HealthRecord.user_id == user_id).group_by(HealthRecord.date).all())
+    steps = dict(db.session.query(HealthRecord.date, HealthRecord.steps).filter(HealthRecord.user_id == user_id).all())
+    assert counts == {day: 1 for day in days}
+    assert steps == {day: 20000 + 10 * (WORKERS - 1) for day in days}
+
+
+def test_manual_entry_keeps_synced_fields(make_user, login):
+    """手动录入只覆盖填写了的字段，设备同步的步数和睡眠保留"""
+    user_id = make_user(height=170, weight=60).id
+    client = login(user_id)
+    client.post('/api/upload_health_data', json={'steps': 9000, 'sleep': 7})
+    client.post('/record', data={'date': str(date.today()), 'weight': '61'})
+
+    record = HealthRecord.query.filter_by(user_id=user_id).one()
+    assert (record.weight, record.steps, record.sleep_hours) == (61, 9000, 7)
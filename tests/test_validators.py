@@ -0,0 +1,50 @@
+# tests/test_validators.py
+"""提示文字与原来各处手写的校验一致；按列批量校验与逐行校验结果一致"""
+from app.services.validators import validate_rows, validate_form, validate_device, check_record, form_error_message
+from types import SimpleNamespace
+import pytest
+
+
+@pytest.mark.parametrize('actual, expected', [
+    pytest.param(form_error_message(validate_form({'weight': ' '})[1]), '输入无效，请重新输入：体重为必填项',
+                 id='表单：体重必填'),
+    pytest.param(form_error_message(validate_form({
+        'weight': '0', 'body_fat': '61', 'steps': '-1', 'water_intake': '10001', 'sleep_hours': '25',
+        'heart_rate': '70.5', 'bp_high': '300', 'bp_low': '120'})[1]),
+        '输入无效，请重新输入：体重必须大于0；体脂率必须在 3-60% 之间；步数不能为负数；饮水量不能超过 10000 ml；'
+        '睡眠时长必须在 0-24 小时之间；心率必须是整数；高压必须在 60-250 mmHg 之间', id='表单：多个错误'),
+    pytest.param(validate_form({'weight': '60', 'bp_high': '80', 'bp_low': '90'})[1], ['高压必须大于低压'],
+                 id='表单：血压关系'),
+    pytest.param(validate_form({'weight': '60', 'steps': '', 'sleep_hours': ''})[0],
+                 {'weight': 60.0, 'body_fat': None, 'steps': 0, 'calories': 0, 'water_intake': None,
+                  'blood_glucose': None, 'sleep_hours': None, 'heart_rate': None, 'blood_pressure_high': None,
+                  'blood_pressure_low': None}, id='表单：留空取默认值'),
+    pytest.param(validate_device({'steps': 100001, 'heart_rate': 'x', 'sleep': None})[1],
+                 ['步数数据异常', '睡眠时长格式错误', '心率格式错误'], id='设备：范围和格式'),
+    pytest.param(validate_device({'blood_pressure_high': 80, 'blood_pressure_low': 90})[1],
+                 ['血压数据异常：高压必须大于低压'], id='设备：血压关系'),
+    pytest.param(validate_device({'steps': 12.7, 'sleep': '7.5'}), ({'steps': 12, 'sleep_hours': 7.5}, []),
+                 id='设备：只返回上传的字段'),
+    pytest.param(validate_device({'body_fat': float('nan')})[1], ['体脂率格式错误'], id='设备：NaN 为格式错误'),
+    pytest.param(check_record(SimpleNamespace(
+        steps=None, calories=None, heart_rate=20, blood_pressure_high=90, blood_pressure_low=95, weight=None,
+        body_fat=None, blood_glucose=None, sleep_hours=30, water_intake=None)),
+        ['心率数据异常：20 bpm（正常范围：30-250）', '血压数据异常：高压(90)必须大于低压(95)',
+         '睡眠时长异常：30 小时（正常范围：0-24）'], id='记录检查'),
+])
+def test_messages(actual, expected):
+    assert actual == expected
+
+
+def test_batch_matches_row_by_row():
+    rows = [
+        {'weight': '60', 'steps': '8000', 'bp_high': '120', 'bp_low': '80'},
+        {'weight': 'abc'},
+        {'weight': '70', 'steps': '-5'},
+        {'weight': '65', 'bp_high': '80', 'bp_low': '90'},
+        {'weight': '', 'sleep_hours': '7'},
+    ]
+    values, errors = validate_rows(rows)
+    single = [validate_form(row) for row in rows]
+    assert errors == {i: e for i, (_, e) in enumerate(single) if e}
+    assert [values[i] for i, (_, e) in enumerate(single) if not e] == [v for v, e in single if not e]